@@ -0,0 +1,185 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Dict, Optional
+from pydantic import ValidationError
+from models import ServiceConfig
+from storage import storage
+from registry import registry, MockDefinition
+from mocks import register_mock
+
+try:
+    import yaml
+except ImportError:  # YAML files need PyYAML; JSON always works
+    yaml = None
+
+try:
+    from watchfiles import awatch
+except ImportError:  # Fall back to mtime polling
+    awatch = None
+
+# Optional file with service configs and extra declarative mocks, watched for changes
+MOCKS_CONFIG_FILE = os.getenv("MOCKS_CONFIG_FILE")
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "1.0"))
+
+
+class ConfigFile:
+    """
+    Service configs and declarative mocks kept in a JSON or YAML file.
+
+    {"configs": {"<service>": ServiceConfig, ...}, "mocks": [MockDefinition.from_dict entries]}
+
+    Edits to the file are picked up by the watcher started with start() and applied in one step: the new
+    configs replace the storage snapshot as a whole, so handlers never see a
+    half-applied file. Config changes made through the API or the bot are
+    written back, so they survive a restart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._digest: Optional[str] = None  # Content last loaded or written
+        self._mocks: Dict[str, dict] = {}  # Mocks declared by the file, by name
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_yaml(self) -> bool:
+        return self.path.endswith((".yaml", ".yml"))
+
+    def _parse(self, text: str) -> dict:
+        if self.is_yaml:
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML config files")
+            try:
+                data = yaml.safe_load(text)
+            except yaml.YAMLError as e:
+                raise ValueError(str(e))
+        else:
+            data = json.loads(text) if text.strip() else {}
+        if data is not None and not isinstance(data, dict):
+            raise ValueError("Config file must contain a mapping")
+        return data or {}
+
+    def _dump(self, data: dict) -> str:
+        if self.is_yaml:
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML config files")
+            return yaml.safe_dump(data, allow_unicode=True, sort_keys=False)
+        return json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+
+    def load(self) -> bool:
+        """Apply the file if its content changed since the last load or save; False if unchanged"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return False
+
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        if digest == self._digest:
+            return False
+
+        # Validate everything before touching live state
+        data = self._parse(text)
+        configs = {service: ServiceConfig.model_validate(config) for service, config in (data.get("configs") or {}).items()}
+        mocks = {entry["name"]: entry for entry in data.get("mocks") or []}
+        definitions = [MockDefinition.from_dict(entry) for name, entry in mocks.items() if self._mocks.get(name) != entry]
+
+        for definition in definitions:
+            if definition.name not in self._mocks and registry.get(definition.name):
+                raise ValueError(f"Mock {definition.name} is built in and cannot be redefined")
+
+        # Routes as they will be after the load: built-in mocks, unchanged and changed file mocks
+        routes = {d.route: d.name for d in registry.definitions() if d.name not in self._mocks}
+        changed = {definition.name: definition for definition in definitions}
+        for name in mocks:
+            route = changed[name].route if name in changed else registry.get(name).route
+            if routes.setdefault(route, name) != name:
+                raise ValueError(f"Mock {name} uses route {route}, already used by mock {routes[route]}")
+            reserved = registry.reserved_by(route)
+            if reserved is not None:
+                raise ValueError(f"Mock {name} uses route {route}, which would take over the service route {reserved}")
+
+        for name in self._mocks.keys() - mocks.keys():
+            registry.unregister(name)
+        for definition in definitions:
+            register_mock(definition, replace=definition.name in self._mocks)
+        self._mocks = mocks
+
+        unknown = [service for service in configs if service not in storage.get_all_configs()]
+        for service in unknown:
+            print(f"⚠️ Ignoring config for unknown service {service} in {self.path}")
+            del configs[service]
+        storage.replace_configs(configs)
+
+        self._digest = digest
+        print(f"📄 Loaded {len(configs)} configs and {len(mocks)} mocks from {self.path}")
+        return True
+
+    def save(self):
+        """Write the current configs back, keeping the file's mock definitions"""
+        data = {
+            "configs": {
+                service: config.model_dump(mode="json")
+                for service, config in storage.get_all_configs().items()
+            },
+            "mocks": list(self._mocks.values())
+        }
+        text = self._dump(data)
+
+        # Write to a temp file and rename, so a watcher never reads a partial file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+        self._digest = hashlib.sha256(text.encode()).hexdigest()
+
+    def _on_config_update(self, changes: Dict[str, ServiceConfig]):
+        try:
+            self.save()
+        except Exception as e:
+            print(f"❌ Error saving config to {self.path}: {e}")
+
+    def _reload(self):
+        try:
+            self.load()
+        except (ValueError, KeyError, TypeError, ValidationError, RuntimeError) as e:
+            # Keep serving the previous snapshot until the file is fixed
+            print(f"❌ Invalid config file {self.path}, keeping current config: {e}")
+
+    async def _watch(self):
+        if awatch is not None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            target = os.path.abspath(self.path)
+            async for changes in awatch(directory):
+                if any(os.path.abspath(path) == target for _, path in changes):
+                    self._reload()
+        else:
+            mtime = None
+            while True:
+                try:
+                    current = os.stat(self.path).st_mtime_ns
+                except FileNotFoundError:
+                    current = None
+                if current != mtime:
+                    mtime = current
+                    self._reload()
+                await asyncio.sleep(CONFIG_POLL_INTERVAL)
+
+    async def start(self):
+        """Persist API/bot changes and start watching the file"""
+        storage.on_config_update(self._on_config_update)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global config file, None unless MOCKS_CONFIG_FILE is set
+config_file = ConfigFile(MOCKS_CONFIG_FILE) if MOCKS_CONFIG_FILE else None
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import threading
+from typing import Awaitable, Callable, Optional
+import uvicorn
+from starlette.responses import JSONResponse
+
+try:
+    import uvloop
+    new_event_loop = uvloop.new_event_loop
+except ImportError:  # Plain asyncio loop for the lane
+    new_event_loop = asyncio.new_event_loop
+
+# Serve admin and control routes on this port from a second event loop in its own thread
+# (unset: everything shares the main port and loop, as before)
+ADMIN_PORT = int(os.getenv("ADMIN_PORT") or 0) or None
+ADMIN_HOST = os.getenv("ADMIN_HOST", "0.0.0.0")
+
+
+class ControlApp:
+    """
+    The app as served on the admin port: mock routes answer 404 there, so
+    load test traffic sent to the wrong port cannot reach the control lane.
+    """
+
+    def __init__(self, app, is_mock_path: Callable[[str], bool]):
+        self.app = app
+        self.is_mock_path = is_mock_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.is_mock_path(scope["path"]):
+            response = JSONResponse({"detail": "Mock routes are served on the main port"}, status_code=404)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class ControlLane:
+    """
+    A second event loop, in its own thread, for admin and control traffic.
+
+    Mock requests and everything they start run on the main loop, which a load
+    test can saturate: its ready queue is FIFO, so a config change or a manual
+    resolution would wait behind every queued mock callback. The lane serves
+    the same app on ADMIN_PORT and runs the Telegram bot and its outbox, so
+    config, logs, stats, manual resolutions and the bot keep their own loop
+    however busy the mock loop is. Shared state is either published atomically
+    (config snapshots), locked (the log and its statistics) or handed to the
+    owning loop (manual waiters); handlers that mutate mock state in place
+    (config changes, which restart sequences, reseeding, fiscal shifts,
+    snapshots) run on the main loop through on_main().
+    """
+
+    def __init__(self, port: Optional[int]):
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.main_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.main_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[uvicorn.Server] = None
+        self._serving = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.port is not None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def start(self, app, is_mock_path: Callable[[str], bool]):
+        """Start the lane's loop thread and serve app on ADMIN_PORT from it"""
+        if not self.enabled or self.running:
+            return
+        self.main_loop = asyncio.get_running_loop()
+        self.main_thread_id = threading.get_ident()
+        self.loop = new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="control-lane", daemon=True)
+        self._thread.start()
+
+        # Startup and shutdown belong to the main server, and so does the logging setup (access log included)
+        config = uvicorn.Config(
+            ControlApp(app, is_mock_path), host=ADMIN_HOST, port=self.port, lifespan="off", log_config=None
+        )
+        self._server = uvicorn.Server(config)
+        self._serving = asyncio.run_coroutine_threadsafe(self._server.serve(), self.loop)
+        while not self._server.started and not self._serving.done() and self._thread.is_alive():
+            await asyncio.sleep(0.01)
+        if not self._server.started:
+            # Port taken or the like (uvicorn exits the lane's loop): fail startup like the main server
+            await self.stop()
+            raise RuntimeError(f"Control lane could not serve port {self.port}")
+        print(f"🛂 Control lane serving admin routes on port {self.port}")
+
+    async def stop(self):
+        if not self.running:
+            return
+        if self._server and self._thread.is_alive():
+            self._server.should_exit = True
+            try:
+                await asyncio.wrap_future(self._serving)
+            except Exception:
+                pass
+        self._server = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        await asyncio.to_thread(self._thread.join)
+        self.loop.close()
+        self._thread = None
+        self.loop = None
+
+    async def run(self, coro: Awaitable):
+        """Await coro on the lane (the main loop if the lane is off), e.g. starting the bot"""
+        if not self.running:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def on_main(self, fn: Callable, *args):
+        """Call fn(*args) on the main loop (awaiting it if it is async), for admin handlers that change mock state in place"""
+        async def call():
+            result = fn(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+
+        if not self.running or asyncio.get_running_loop() is self.main_loop:
+            return await call()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(call(), self.main_loop))
+
+
+# Global control lane, disabled unless ADMIN_PORT is set
+control = ControlLane(ADMIN_PORT)
@@ -0,0 +1,110 @@
+import os
+import json
+from typing import Dict, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from starlette.responses import JSONResponse, Response
+from registry import registry, MockDefinition
+from mocks import dispatch
+from faults import MockFault, FaultResponse
+
+# Serve mock routes through the lean path; set to 0 to route them through the full FastAPI stack
+MOCK_FAST_PATH = os.getenv("MOCK_FAST_PATH", "1") == "1"
+
+# Mounted mock routes: path -> mock name (filled by main.add_mock_routes)
+mock_paths: Dict[str, str] = {}
+
+
+def header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            # Most bodies arrive in one chunk; joining is linear for the rest
+            return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+async def serve(definition: MockDefinition, body: bytes, traceparent: Optional[str] = None) -> Response:
+    """Validate, dispatch and encode one mock request, with FastAPI's error formats"""
+    try:
+        data = json.loads(body) if body else None
+    except ValueError as e:
+        if definition.request_model is not None:
+            error = {
+                "type": "json_invalid",
+                "loc": ["body", getattr(e, "pos", 0)],
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": getattr(e, "msg", str(e))}
+            }
+            return JSONResponse({"detail": [error]}, status_code=422)
+        data = None
+
+    model = None
+    if definition.request_model is not None:
+        if not body:
+            error = {"type": "missing", "loc": ["body"], "msg": "Field required", "input": None}
+            return JSONResponse({"detail": [error]}, status_code=422)
+        try:
+            model = definition.request_model.model_validate(data)
+        except ValidationError as e:
+            errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            return JSONResponse({"detail": jsonable_encoder(errors)}, status_code=422)
+    elif data is None:
+        # Tolerant: default to empty dict if the body is not JSON
+        data = {}
+
+    try:
+        response = await dispatch(definition, data, model, traceparent)
+    except MockFault as e:
+        return FaultResponse(e.fault, e.body)
+    except HTTPException as e:
+        return JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+    except RequestValidationError as e:
+        return JSONResponse({"detail": jsonable_encoder(e.errors())}, status_code=422)
+    except Exception as e:
+        return JSONResponse({"detail": str(e)}, status_code=500)
+
+    if isinstance(response, Response):
+        return response
+    return JSONResponse(response)
+
+
+class MockFastPath:
+    """
+    ASGI middleware answering POST requests to mock routes itself.
+
+    Added as the outermost middleware, so kiosk traffic skips CORS, FastAPI
+    routing, dependency injection and response_model validation (the mock
+    builders already produce plain dicts in the response model's shape). All
+    other routes, including admin and config ones, get the full stack. The
+    FastAPI mock routes stay registered for the OpenAPI docs and are used
+    when MOCK_FAST_PATH=0.
+    """
+
+    def __init__(self, app, enabled: bool = MOCK_FAST_PATH):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if self.enabled and scope["type"] == "http" and scope["method"] == "POST":
+            path = scope["path"]
+            name = mock_paths.get(path)
+            if name is not None:
+                definition = registry.get(name)
+                if definition is not None and definition.route == path:
+                    response = await serve(definition, await read_body(receive), header(scope, b"traceparent"))
+                    await response(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,132 @@
+import os
+import json
+import struct
+import socket
+import asyncio
+from typing import Optional
+from starlette.responses import Response
+from models import FaultType
+from health import census
+from streaming import send_paced
+
+# SLOW_DRIP: bytes per chunk and seconds between chunks
+FAULT_DRIP_BYTES = int(os.getenv("FAULT_DRIP_BYTES", "16"))
+FAULT_DRIP_INTERVAL = float(os.getenv("FAULT_DRIP_INTERVAL", "0.5"))
+# HANG: give up on a client that never times out after this many seconds
+FAULT_HANG_MAX_SECONDS = float(os.getenv("FAULT_HANG_MAX_SECONDS", "600"))
+
+
+class MockFault(Exception):
+    """Raised by dispatch when the decided response is to be delivered with a fault"""
+
+    def __init__(self, fault: FaultType, body: dict):
+        super().__init__(fault.value)
+        self.fault = fault
+        self.body = body
+
+
+def server_transport(send):
+    """
+    The server's transport behind an ASGI send callable, or None.
+
+    ASGI has no way to abort a connection. uvicorn's send is a method of the
+    request cycle, which holds the transport; middleware wraps it in closures.
+    """
+    pending, seen = [send], set()
+    while pending and len(seen) < 32:
+        fn = pending.pop()
+        if id(fn) in seen:
+            continue
+        seen.add(id(fn))
+        transport = getattr(getattr(fn, "__self__", None), "transport", None)
+        if transport is not None and hasattr(transport, "abort"):
+            return transport
+        for cell in getattr(fn, "__closure__", None) or ():
+            try:
+                value = cell.cell_contents
+            except ValueError:
+                continue
+            if callable(value):
+                pending.append(value)
+    return None
+
+
+class FaultResponse(Response):
+    """
+    A response delivered with a fault, as an ASGI app.
+
+    Every fault runs inside the request's own coroutine: a hanging or dripping
+    response holds that suspended coroutine and its connection, nothing else.
+    """
+
+    def __init__(self, fault: FaultType, body: dict, status_code: int = 200):
+        self.fault = fault
+        self.status_code = status_code
+        self.body = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode()
+        self.background = None
+
+    def _start(self, content_type: bytes, length: int) -> dict:
+        return {
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": [(b"content-type", content_type), (b"content-length", str(length).encode())]
+        }
+
+    async def __call__(self, scope, receive, send):
+        fault = self.fault
+        body = self.body
+        json_type = b"application/json"
+
+        if fault == FaultType.RESET:
+            transport = server_transport(send)
+            if transport is not None:
+                sock = transport.get_extra_info("socket")
+                if sock is not None:
+                    # Zero linger turns the close into a TCP RST
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                transport.abort()
+                await asyncio.sleep(0)  # Let the server see the connection as lost
+                return
+            # Not served by uvicorn: the closest ASGI gets is headers and no body
+            await send(self._start(json_type, len(body)))
+
+        elif fault == FaultType.TRUNCATED:
+            await send(self._start(json_type, len(body)))
+            await send({"type": "http.response.body", "body": body[:len(body) // 2], "more_body": True})
+            # Returning with the body incomplete makes the server close the connection
+
+        elif fault == FaultType.INVALID_JSON:
+            # Single-quoted keys and strings, like a Python dict repr
+            broken = body.replace(b'"', b"'")
+            await send(self._start(json_type, len(broken)))
+            await send({"type": "http.response.body", "body": broken})
+
+        elif fault == FaultType.WRONG_CONTENT_TYPE:
+            await send(self._start(b"text/html; charset=utf-8", len(body)))
+            await send({"type": "http.response.body", "body": body})
+
+        elif fault == FaultType.SLOW_DRIP:
+            await send(self._start(json_type, len(body)))
+            with census.track("dripping"):
+                await send_paced(send, [body], FAULT_DRIP_BYTES, FAULT_DRIP_INTERVAL)
+
+        elif fault == FaultType.HANG:
+            # Wait for the client to disconnect; the request body has already been read
+            with census.track("hanging"):
+                try:
+                    await asyncio.wait_for(_disconnected(receive), FAULT_HANG_MAX_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def parse_fault(value: str) -> Optional[FaultType]:
+    """FaultType named by a sequence entry or manual response, or None"""
+    try:
+        return FaultType(value)
+    except ValueError:
+        return None
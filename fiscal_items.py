@@ -0,0 +1,185 @@
+"""
+Receipt item math for the new fiscal format, done the way a fiscal register does it.
+
+Amounts are kept in kopecks. An item's amount must be price x quantity (to the
+kopeck); its VAT is amount x rate / (100 + rate), rounded half up. Receipt VAT
+is computed per rate from the rate's total, not summed from the items, so it
+can differ from the item VATs by rounding, as on a real receipt.
+"""
+import math
+from typing import Dict, Optional
+
+# VAT tags of the new fiscal format and their rates in percent (None: without VAT).
+# The vat1xx tags are the calculated rates (20/120...) of prepayments, with the same math
+VAT_RATES: Dict[str, Optional[int]] = {
+    "vat20": 20, "vat10": 10, "vat7": 7, "vat5": 5, "vat0": 0,
+    "vat120": 20, "vat110": 10, "vat107": 7, "vat105": 5,
+    "none": None
+}
+DEFAULT_VAT = "none"
+
+# Cash payments may exceed the total (the register gives change); other payments may not
+CASH_PAYMENT_TYPES = frozenset({"cash", "0", 0})
+
+# Driver error codes and messages of the new format's error object
+ERROR_INVALID_ITEM = 3801
+ERROR_ITEM_SUM = 3802
+ERROR_VAT_TYPE = 3803
+ERROR_ITEM_VAT = 3804
+ERROR_TOTAL = 3805
+ERROR_PAYMENT_LESS = 3806
+ERROR_PAYMENT_MORE = 3807
+
+# Largest receipt total the register takes, in kopecks (keeps its shift and grand totals in range)
+MAX_TOTAL = 10 ** 12
+
+
+class ReceiptError(Exception):
+    """A receipt the register refuses to print"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": self.message}
+
+
+def _kopecks(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(value)
+    value = float(value) * 100
+    if not math.isfinite(value):
+        raise ValueError(value)
+    return int(value + 0.5) if value >= 0 else -int(0.5 - value)
+
+
+def _quantity(value) -> float:
+    if value is None:
+        return 1.0
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(value)
+    quantity = float(value)
+    if not math.isfinite(quantity) or quantity <= 0:
+        raise ValueError(value)
+    return quantity
+
+
+def _vat(amount: int, rate: Optional[int]) -> int:
+    """VAT included in amount (kopecks) at rate percent, rounded half up"""
+    if not rate:
+        return 0
+    return (2 * amount * rate + 100 + rate) // (2 * (100 + rate))
+
+
+def _vat_fields(item: dict):
+    """(tag, declared VAT sum) of an item's vat, given as "vat20" or {"type": "vat20", "sum": 1.5}"""
+    vat = item.get("vat", item.get("tax", DEFAULT_VAT))
+    declared = None
+    if isinstance(vat, dict):
+        vat, declared = vat.get("type", DEFAULT_VAT), vat.get("sum")
+    if not isinstance(vat, str):
+        raise ValueError(vat)
+    return vat, declared
+
+
+def calculate_receipt(request: dict) -> Optional[dict]:
+    """
+    Item and VAT totals of a new-format receipt, or None if it has no items.
+
+    Works column by column: each field is pulled out of all items in one pass,
+    then the amounts, VATs and per-rate totals are computed over the columns,
+    so a basket of hundreds of lines costs a few list passes, not a model per item.
+    Raises ReceiptError, with the register's error code, if the items, the total
+    or the payments do not add up.
+    """
+    items = request.get("items")
+    if not isinstance(items, list) or not items:
+        return None
+
+    try:
+        names = [item.get("name", item.get("description")) for item in items]
+        prices = [_kopecks(item.get("price")) for item in items]
+        quantities = [_quantity(item.get("quantity")) for item in items]
+        declared = [_kopecks(item.get("amount", item.get("sum"))) for item in items]
+        vat_fields = [_vat_fields(item) for item in items]
+        vat_types = [tag for tag, _ in vat_fields]
+        declared_vats = [_kopecks(value) for _, value in vat_fields]
+        # Amount: price x quantity (the product of two finite values can still overflow)
+        expected = [
+            None if price is None else int(price * quantity + 0.5)
+            for price, quantity in zip(prices, quantities)
+        ]
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        raise ReceiptError(ERROR_INVALID_ITEM, "Неверные данные позиции")
+
+    unknown = next((n for n, tag in enumerate(vat_types, 1) if tag not in VAT_RATES), None)
+    if unknown is not None:
+        raise ReceiptError(ERROR_VAT_TYPE, f"Неверная ставка НДС в позиции {unknown}")
+
+    # A declared amount must match price x quantity to the kopeck
+    for n, (amount, computed) in enumerate(zip(declared, expected), 1):
+        if amount is not None and computed is not None and abs(amount - computed) > 1:
+            raise ReceiptError(ERROR_ITEM_SUM, f"Неверная сумма позиции {n}")
+    amounts = [
+        amount if amount is not None else (computed or 0)
+        for amount, computed in zip(declared, expected)
+    ]
+
+    rates = [VAT_RATES[tag] for tag in vat_types]
+    item_vats = list(map(_vat, amounts, rates))
+    for n, (vat, declared_vat) in enumerate(zip(item_vats, declared_vats), 1):
+        if declared_vat is not None and abs(vat - declared_vat) > 1:
+            raise ReceiptError(ERROR_ITEM_VAT, f"Неверная сумма НДС позиции {n}")
+
+    by_rate: Dict[str, int] = {}
+    for tag, amount in zip(vat_types, amounts):
+        by_rate[tag] = by_rate.get(tag, 0) + amount
+    total = sum(amounts)
+
+    declared_total = request.get("total")
+    if declared_total is not None:
+        try:
+            mismatch = abs(_kopecks(declared_total) - total) > 1
+        except (TypeError, ValueError, OverflowError):
+            mismatch = True
+        if mismatch:
+            raise ReceiptError(ERROR_TOTAL, "Итог чека не совпадает с суммой позиций")
+
+    payments = request.get("payments")
+    if isinstance(payments, list) and payments:
+        try:
+            paid = sum(_kopecks(p.get("sum", 0)) or 0 for p in payments)
+            cash = any(p.get("type") in CASH_PAYMENT_TYPES for p in payments)
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            raise ReceiptError(ERROR_INVALID_ITEM, "Неверные данные оплаты")
+        if paid < total:
+            raise ReceiptError(ERROR_PAYMENT_LESS, "Сумма оплат меньше итога чека")
+        if paid > total and not cash:
+            raise ReceiptError(ERROR_PAYMENT_MORE, "Сумма безналичных оплат превышает итог чека")
+
+    return {
+        "total": total / 100,
+        "items": [
+            {"name": name, "quantity": quantity, "amount": amount / 100, "vat": {"type": tag, "sum": vat / 100}}
+            for name, quantity, amount, tag, vat in zip(names, quantities, amounts, vat_types, item_vats)
+        ],
+        "vats": [
+            {"type": tag, "sum": amount / 100, "vatSum": _vat(amount, VAT_RATES[tag]) / 100}
+            for tag, amount in by_rate.items()
+        ]
+    }
+
+
+def register_total(total) -> float:
+    """A receipt total as the register takes it: a finite amount of at most MAX_TOTAL kopecks"""
+    try:
+        kopecks = _kopecks(total)
+    except (TypeError, ValueError, OverflowError):
+        kopecks = None
+    if kopecks is None or abs(kopecks) > MAX_TOTAL:
+        raise ReceiptError(ERROR_TOTAL, "Недопустимый итог чека")
+    return float(total)
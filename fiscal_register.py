@@ -0,0 +1,135 @@
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from idgen import ids
+
+
+class FiscalRegisterBank:
+    """
+    Simulated fiscal registers (ККТ with ФН), one per kiosk_id.
+
+    State is kept column-wise in typed arrays indexed by a per-kiosk slot, so a
+    register costs a few dozen bytes instead of a Python object with a dict.
+    Every method runs without awaiting, so each receipt advances the counters
+    atomically with respect to other requests.
+
+    Counters follow the real device: fiscalDocumentNumber grows with every
+    document (shift open, receipt, shift close report), fiscalReceiptNumber
+    restarts with each shift and shiftNumber grows on every shift open.
+    Amounts are kept in kopecks.
+    """
+
+    def __init__(self):
+        self._slots: Dict[str, int] = {}
+        self.fn_number = array("q")
+        self.registration_number = array("q")
+        self.shift_number = array("i")
+        self.document_number = array("i")
+        self.receipt_number = array("i")
+        self.shift_open = array("b")
+        self.shift_opened_at = array("d")
+        self.shift_total = array("q")
+        self.grand_total = array("q")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, kiosk_id: str) -> int:
+        slot = self._slots.get(kiosk_id)
+        if slot is None:
+            slot = self._slots[kiosk_id] = len(self._slots)
+            self.fn_number.append(ids.randint("fiscal.fn_number", 1000000000000000, 9999999999999999))
+            self.registration_number.append(ids.randint("fiscal.registration_number", 1, 9999999999999999))
+            self.shift_number.append(0)
+            self.document_number.append(0)
+            self.receipt_number.append(0)
+            self.shift_open.append(0)
+            self.shift_opened_at.append(0.0)
+            self.shift_total.append(0)
+            self.grand_total.append(0)
+        return slot
+
+    def _open_shift(self, slot: int, now: datetime):
+        self.shift_number[slot] += 1
+        self.document_number[slot] += 1
+        self.receipt_number[slot] = 0
+        self.shift_total[slot] = 0
+        self.shift_open[slot] = 1
+        self.shift_opened_at[slot] = now.timestamp()
+
+    def open_shift(self, kiosk_id: str) -> Optional[dict]:
+        """Open a new shift; None if it is already open"""
+        slot = self._slot(kiosk_id)
+        if self.shift_open[slot]:
+            return None
+        self._open_shift(slot, datetime.now(timezone.utc))
+        return self.state(kiosk_id)
+
+    def close_shift(self, kiosk_id: str) -> Optional[dict]:
+        """Close the current shift (issues the shift close report); None if no shift is open"""
+        slot = self._slot(kiosk_id)
+        if not self.shift_open[slot]:
+            return None
+        self.document_number[slot] += 1
+        self.shift_open[slot] = 0
+        return self.state(kiosk_id)
+
+    def register_receipt(self, kiosk_id: str, total: float, now: datetime) -> dict:
+        """
+        Issue a receipt and return its fiscal parameters.
+
+        A closed shift is opened automatically first, as kiosk drivers do.
+        """
+        slot = self._slot(kiosk_id)
+        if not self.shift_open[slot]:
+            self._open_shift(slot, now)
+
+        amount = round(total * 100)
+        self.document_number[slot] += 1
+        self.receipt_number[slot] += 1
+        self.shift_total[slot] += amount
+        self.grand_total[slot] += amount
+
+        return {
+            "fnNumber": str(self.fn_number[slot]),
+            "registrationNumber": f"{self.registration_number[slot]:016d}",
+            "fiscalDocumentNumber": self.document_number[slot],
+            "fiscalReceiptNumber": self.receipt_number[slot],
+            "shiftNumber": self.shift_number[slot]
+        }
+
+    _COLUMNS = (
+        "fn_number", "registration_number", "shift_number", "document_number", "receipt_number",
+        "shift_open", "shift_opened_at", "shift_total", "grand_total"
+    )
+
+    def dump_state(self) -> dict:
+        """All registers for a state snapshot: kiosk ids in slot order and one list per column"""
+        return {
+            "kiosks": list(self._slots),
+            **{name: getattr(self, name).tolist() for name in self._COLUMNS}
+        }
+
+    def load_state(self, state: dict):
+        self._slots = {kiosk_id: slot for slot, kiosk_id in enumerate(state["kiosks"])}
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, state[name]))
+
+    def state(self, kiosk_id: str) -> Optional[dict]:
+        slot = self._slots.get(kiosk_id)
+        if slot is None:
+            return None
+        opened_at = self.shift_opened_at[slot]
+        return {
+            "kiosk_id": kiosk_id,
+            "fn_number": str(self.fn_number[slot]),
+            "registration_number": f"{self.registration_number[slot]:016d}",
+            "shift_number": self.shift_number[slot],
+            "shift_open": bool(self.shift_open[slot]),
+            "shift_opened_at": datetime.fromtimestamp(opened_at, timezone.utc).isoformat() if opened_at else None,
+            "fiscal_document_number": self.document_number[slot],
+            "receipts_in_shift": self.receipt_number[slot],
+            "shift_total": self.shift_total[slot] / 100,
+            "grand_total": self.grand_total[slot] / 100
+        }
@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))  # seconds between lag probes
+HEALTH_MAX_LAG_MS = float(os.getenv("HEALTH_MAX_LAG_MS", "0"))  # /health answers 503 above this (0: never)
+
+
+class Census:
+    """
+    Live work by category, kept as counters updated where work starts and
+    ends, so reading it never walks asyncio.all_tasks().
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def add(self, category: str, delta: int = 1):
+        self.counts[category] = self.counts.get(category, 0) + delta
+
+    @contextmanager
+    def track(self, category: str):
+        self.add(category)
+        try:
+            yield
+        finally:
+            self.add(category, -1)
+
+    def get(self, category: str) -> int:
+        return self.counts.get(category, 0)
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag: how late a timer scheduled every LOOP_LAG_INTERVAL fires.
+
+    Keeps the latest value, a moving average and the maximum since the previous
+    read, so a poller sees spikes that happened between its polls. It is the
+    loop's only heartbeat: other monitors (the slow callback watchdog)
+    subscribe to its probes instead of running timers of their own.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self.average = 0.0
+        self.max_since_read = 0.0
+        self.expected = 0.0  # When the pending probe is due (monotonic)
+        self._listeners: List[Callable[[float], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle = None
+
+    def subscribe(self, listener: Callable[[float], None], interval: float):
+        """Call listener(lag) on every probe, and probe at least every interval seconds"""
+        self._listeners.append(listener)
+        self.interval = min(self.interval, interval)
+
+    def unsubscribe(self, listener: Callable[[float], None]):
+        self._listeners.remove(listener)
+
+    async def start(self):
+        if self._handle is None:
+            self._loop = asyncio.get_running_loop()
+            self._schedule()
+
+    async def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self.expected = time.monotonic() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._probe)
+
+    def _probe(self):
+        self.lag = max(0.0, time.monotonic() - self.expected)
+        self.average = self.average * 0.9 + self.lag * 0.1
+        self.max_since_read = max(self.max_since_read, self.lag)
+        for listener in self._listeners:
+            listener(self.lag)
+        self._schedule()
+
+    def read(self) -> Dict[str, float]:
+        values = {
+            "current_ms": round(self.lag * 1000, 2),
+            "average_ms": round(self.average * 1000, 2),
+            "max_ms": round(self.max_since_read * 1000, 2)
+        }
+        self.max_since_read = self.lag
+        return values
+
+
+# Global instances
+census = Census()
+loop_lag = LoopLagMonitor()
@@ -0,0 +1,145 @@
+import os
+import random
+import uuid
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# Optional global seed; set it to get reproducible identifiers across runs
+MOCKS_RANDOM_SEED = os.getenv("MOCKS_RANDOM_SEED")
+ID_BATCH_SIZE = int(os.getenv("ID_BATCH_SIZE", "1024"))
+
+
+class _Namespace:
+    """Generator and pre-filled buffers for one namespace, keyed by (low, high), ("float", "float") or ("uuid", "uuid")"""
+    __slots__ = ("rng", "buffers")
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.buffers: Dict[Tuple, List] = {}
+
+
+class IdProvider:
+    """
+    Pooled source of random identifiers and numbers.
+
+    Every namespace (e.g. "payment.rrn") has its own generator, seeded from the
+    global seed and the namespace name, so values in one namespace do not shift
+    when another namespace is used more or less. Values are generated in batches
+    from one block of random bytes and handed out with a list pop; each integer
+    range and value kind keeps its own buffer, so alternating ranges in one
+    namespace does not throw a batch away on every call. Integers are
+    reduced modulo the range from 64 random bits; the bias is negligible for
+    mock identifiers.
+    """
+
+    def __init__(self, seed: Optional[str] = None, batch_size: int = ID_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._seed = seed
+        self._seeds: Dict[str, str] = {}  # Per-namespace overrides
+        self._namespaces: Dict[str, _Namespace] = {}
+
+    def seed(self, seed: Optional[str], namespace: Optional[str] = None):
+        """Reseed all namespaces, or just one; None restores OS randomness"""
+        if namespace is None:
+            self._seed = seed
+            self._seeds.clear()
+            self._namespaces.clear()
+        else:
+            if seed is None:
+                self._seeds.pop(namespace, None)
+            else:
+                self._seeds[namespace] = seed
+            self._namespaces.pop(namespace, None)
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            seed = self._seeds.get(namespace, self._seed)
+            # String seeds are hashed with SHA-512, so this is stable across processes
+            rng = random.Random(f"{seed}:{namespace}") if seed is not None else random.Random()
+            ns = self._namespaces[namespace] = _Namespace(rng)
+        return ns
+
+    def randint(self, namespace: str, a: int, b: int) -> int:
+        """Random integer N such that a <= N <= b"""
+        ns = self._namespaces.get(namespace) or self._namespace(namespace)
+        buffer = ns.buffers.get((a, b))
+        if buffer:
+            return buffer.pop()
+
+        span = b - a + 1
+        buffer = ns.buffers[a, b] = [a + x % span for x in array("Q", ns.rng.randbytes(8 * self.batch_size))]
+        return buffer.pop()
+
+    def random(self, namespace: str) -> float:
+        """Random float in [0.0, 1.0)"""
+        ns = self._namespaces.get(namespace) or self._namespace(namespace)
+        buffer = ns.buffers.get(("float", "float"))
+        if buffer:
+            return buffer.pop()
+
+        rnd = ns.rng.random
+        buffer = ns.buffers["float", "float"] = [rnd() for _ in range(self.batch_size)]
+        return buffer.pop()
+
+    def uuid4(self, namespace: str) -> str:
+        """Random (version 4) UUID string"""
+        ns = self._namespaces.get(namespace) or self._namespace(namespace)
+        buffer = ns.buffers.get(("uuid", "uuid"))
+        if not buffer:
+            block = ns.rng.randbytes(16 * self.batch_size)
+            buffer = ns.buffers["uuid", "uuid"] = [block[i:i + 16] for i in range(0, len(block), 16)]
+        return str(uuid.UUID(bytes=buffer.pop(), version=4))
+
+    def shuffle(self, namespace: str, items: list):
+        """Shuffle a list in place with the namespace generator"""
+        self._namespace(namespace).rng.shuffle(items)
+
+    def dump_state(self) -> dict:
+        """Seeds, and each seeded namespace's generator state and unused buffers, for a state snapshot"""
+        namespaces = {}
+        for namespace, ns in self._namespaces.items():
+            if self._seeds.get(namespace, self._seed) is None:
+                continue  # OS randomness: there is no sequence to continue
+            version, internal, gauss_next = ns.rng.getstate()
+            buffers = [
+                [low, high, [value.hex() for value in buffer] if low == "uuid" else buffer]
+                for (low, high), buffer in ns.buffers.items()
+            ]
+            namespaces[namespace] = [version, list(internal), gauss_next, buffers]
+        return {"seed": self._seed, "seeds": self._seeds, "namespaces": namespaces}
+
+    @staticmethod
+    def parse_state(state: dict) -> tuple:
+        """A dump_state() result rebuilt as (seed, seeds, namespaces) for set_state(); raises if it is malformed"""
+        namespaces = {}
+        for namespace, entry in state["namespaces"].items():
+            if len(entry) == 6:
+                # Snapshots from before the per-range buffers hold one (low, high, buffer)
+                version, internal, gauss_next, low, high, buffer = entry
+                buffers = [[low, high, buffer]]
+            else:
+                version, internal, gauss_next, buffers = entry
+            rng = random.Random()
+            rng.setstate((version, tuple(internal), gauss_next))
+            ns = namespaces[namespace] = _Namespace(rng)
+            for low, high, buffer in buffers:
+                if low is not None:
+                    ns.buffers[low, high] = [bytes.fromhex(value) for value in buffer] if low == "uuid" else list(buffer)
+        return state["seed"], dict(state["seeds"]), namespaces
+
+    def set_state(self, seed: Optional[str], seeds: Dict[str, str], namespaces: Dict[str, _Namespace]):
+        """
+        Continue the seeded sequences of a parsed snapshot, instead of starting
+        them over and handing out the same values again.
+        """
+        self._seed = seed
+        self._seeds = seeds
+        self._namespaces = namespaces
+
+    def load_state(self, state: dict):
+        self.set_state(*self.parse_state(state))
+
+
+# Global provider instance
+ids = IdProvider(MOCKS_RANDOM_SEED)
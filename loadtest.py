@@ -0,0 +1,401 @@
+"""
+Load test for the mock endpoints.
+
+Simulates kiosks talking to a running service with a minimal HTTP/1.1 client
+on raw asyncio streams, so the client adds as little overhead as possible:
+
+    python loadtest.py --url http://127.0.0.1:8000/mocks/printer --scenario short
+
+Scenarios:
+    short      every request on a new connection (Connection: close), like most kiosk drivers
+    keepalive  every client reuses one connection
+    idle       --idle connections each send a request every --idle-interval seconds
+               while --concurrency clients run the keepalive load
+
+With --profiles it starts the service once per server profile and runs every
+scenario against it, printing a Markdown table:
+
+    python loadtest.py --profiles default low-latency --duration 10
+
+--repeat runs every profile that many times, round by round so drift on the
+machine hits all profiles alike, and reports the mean req/s with its standard
+deviation across runs, and the median latencies.
+
+With --in-process it calls the ASGI app directly, without sockets, and compares
+the per-request cost of the mock fast path with the full FastAPI stack:
+
+    python loadtest.py --in-process --requests 20000
+
+With --log-entries it compares the in-memory log record with the pydantic
+LogEntry model: construction time and memory per entry:
+
+    python loadtest.py --log-entries 100000
+"""
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+from urllib.parse import urlsplit
+from typing import List, Optional
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.connects = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+
+def build_request(host: str, path: str, body: bytes, keep_alive: bool) -> bytes:
+    connection = "keep-alive" if keep_alive else "close"
+    return (
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {connection}\r\n\r\n"
+    ).encode() + body
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    """Read one response; returns the status code"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+class Connection:
+    """Keep-alive connection that reconnects when the server has closed it"""
+
+    def __init__(self, host: str, port: int, stats: Stats):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, payload: bytes) -> int:
+        for attempt in range(2):
+            if self.writer is None or self.reader.at_eof():
+                await self.close()
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.stats.connects += 1
+            try:
+                self.writer.write(payload)
+                await self.writer.drain()
+                return await read_response(self.reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Closed by the server's keep-alive timeout between requests
+                await self.close()
+                if attempt:
+                    raise
+        return 0
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+async def short_client(host: str, port: int, payload: bytes, deadline: float, stats: Stats):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            stats.connects += 1
+            writer.write(payload)
+            await writer.drain()
+            status = await read_response(reader)
+            writer.close()
+            await writer.wait_closed()
+        except (OSError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            continue
+        if status == 200:
+            stats.latencies.append(time.perf_counter() - started)
+        else:
+            stats.errors += 1
+
+
+async def keepalive_client(host: str, port: int, payload: bytes, deadline: float, stats: Stats,
+                           interval: float = 0.0):
+    connection = Connection(host, port, stats)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await connection.request(payload)
+            except (OSError, asyncio.IncompleteReadError):
+                stats.errors += 1
+                await connection.close()
+                continue
+            if status == 200:
+                stats.latencies.append(time.perf_counter() - started)
+            else:
+                stats.errors += 1
+            if interval:
+                await asyncio.sleep(interval)
+    finally:
+        await connection.close()
+
+
+async def run_scenario(url: str, scenario: str, concurrency: int, duration: float,
+                       idle: int = 0, idle_interval: float = 10.0, body: Optional[dict] = None) -> dict:
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/"
+    data = json.dumps(body if body is not None else {"order_id": 1, "kiosk_id": "loadtest"}).encode()
+    deadline = time.perf_counter() + duration
+
+    stats, idle_stats = Stats(), Stats()
+    if scenario == "short":
+        payload = build_request(parts.netloc, path, data, keep_alive=False)
+        clients = [short_client(host, port, payload, deadline, stats) for _ in range(concurrency)]
+    else:
+        payload = build_request(parts.netloc, path, data, keep_alive=True)
+        clients = [keepalive_client(host, port, payload, deadline, stats) for _ in range(concurrency)]
+        if scenario == "idle":
+            clients += [
+                keepalive_client(host, port, payload, deadline, idle_stats, idle_interval)
+                for _ in range(idle)
+            ]
+
+    started = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "scenario": scenario,
+        "requests": len(stats.latencies),
+        "rps": round(len(stats.latencies) / elapsed, 1),
+        "p50_ms": round(stats.percentile(0.50), 2),
+        "p99_ms": round(stats.percentile(0.99), 2),
+        "errors": stats.errors + idle_stats.errors
+    }
+    if scenario == "idle":
+        # Connections opened beyond the first one per idle client had been closed by the server
+        result["idle_reconnects"] = max(0, idle_stats.connects - idle)
+    return result
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Service did not start on {host}:{port}")
+
+
+def benchmark_profiles(args) -> List[dict]:
+    """Start the service per profile (bot disabled) and run every scenario against it"""
+    parts = urlsplit(args.url)
+    rows = []
+    for profile in [profile for _ in range(args.repeat) for profile in args.profiles]:
+        env = dict(os.environ, SERVER_PROFILE=profile, PORT=str(parts.port or 8000), TELEGRAM_BOT_TOKEN="")
+        server = subprocess.Popen(
+            [sys.executable, "main.py"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port(parts.hostname, parts.port or 8000)
+            time.sleep(1.5)  # Lifespan startup
+            for scenario in ("short", "keepalive", "idle"):
+                result = asyncio.run(run_scenario(
+                    args.url, scenario, args.concurrency, args.duration, args.idle, args.idle_interval, args.body
+                ))
+                rows.append({"profile": profile, **result})
+                print(json.dumps(rows[-1]), file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait()
+    return rows
+
+
+async def asgi_benchmark(path: str, requests: int, body: Optional[dict] = None) -> List[dict]:
+    """Per-request cost of one mock route in process, through the fast path and the full stack"""
+    os.environ["TELEGRAM_BOT_TOKEN"] = ""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    from fastpath import MockFastPath
+
+    data = json.dumps(body if body is not None else {"order_id": 1, "kiosk_id": "loadtest"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(data)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000)
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"{path} answered {message['status']}")
+
+    stack = main.app.build_middleware_stack()
+    fast_path = stack
+    while not isinstance(fast_path, MockFastPath):
+        fast_path = fast_path.app
+
+    rows = []
+    for label, enabled in (("full stack", False), ("fast path", True)):
+        fast_path.enabled = enabled
+        for _ in range(requests // 10):  # Warm up
+            await stack(dict(scope), receive, send)
+        started = time.perf_counter()
+        for _ in range(requests):
+            await stack(dict(scope), receive, send)
+        elapsed = time.perf_counter() - started
+        rows.append({"path": path, "stack": label, "us_per_request": round(elapsed / requests * 1e6, 1)})
+    return rows
+
+
+def log_benchmark(count: int) -> List[dict]:
+    """Construction time and retained memory per log entry, LogEntry model vs LogRecord"""
+    import gc
+    import tracemalloc
+    from datetime import datetime, timezone
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from models import LogEntry
+    from log_record import LogRecord
+
+    now = datetime.now(timezone.utc)
+    request = {"order_id": 1, "kiosk_id": "loadtest", "amount": 1500}
+    response = {"status": "SUCCESS", "payment_id": "1809", "rrn": "123456789012"}
+
+    def model(i: int):
+        return LogEntry(
+            timestamp=now.isoformat(), service="payment", request=request, response=response,
+            mode="AUTO_SUCCESS", status="SUCCESS", config_version=1, duration_ms=0.05
+        )
+
+    def record(i: int):
+        return LogRecord(
+            at=now.timestamp(), service="payment", mode="AUTO_SUCCESS", status="SUCCESS",
+            request=request, response=response, config_version=1, duration_ms=0.05
+        )
+
+    rows = []
+    for label, build in (("LogEntry (pydantic)", model), ("LogRecord (slots)", record)):
+        build(0)
+        started = time.perf_counter()
+        for i in range(count):
+            build(i)
+        elapsed = time.perf_counter() - started
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build(i) for i in range(count)]
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del kept
+
+        rows.append({
+            "type": label,
+            "us_per_entry": round(elapsed / count * 1e6, 2),
+            "bytes_per_entry": round(retained / count)
+        })
+    return rows
+
+
+def summarize(rows: List[dict]) -> List[dict]:
+    """One row per profile and scenario over repeated runs: req/s mean and standard deviation, medians of the rest"""
+    runs = {}
+    for row in rows:
+        runs.setdefault((row["profile"], row["scenario"]), []).append(row)
+    summary = []
+    for (profile, scenario), results in runs.items():
+        rps = [result["rps"] for result in results]
+        summary.append({
+            "profile": profile,
+            "scenario": scenario,
+            "runs": len(results),
+            "rps": round(statistics.mean(rps)),
+            "rps_sd": round(statistics.stdev(rps)) if len(rps) > 1 else 0,
+            "p50_ms": round(statistics.median(result["p50_ms"] for result in results), 1),
+            "p99_ms": round(statistics.median(result["p99_ms"] for result in results), 1),
+            "errors": sum(result["errors"] for result in results),
+            "idle_reconnects": round(statistics.median(result["idle_reconnects"] for result in results))
+            if scenario == "idle" else ""
+        })
+    return summary
+
+
+def print_table(rows: List[dict]):
+    columns = ["profile", "scenario", "rps", "p50_ms", "p99_ms", "errors", "idle_reconnects"]
+    if rows and "rps_sd" in rows[0]:
+        columns[2:3] = ["runs", "rps", "rps_sd"]
+    print("| " + " | ".join(columns) + " |")
+    print("|" + "---|" * len(columns))
+    for row in rows:
+        print("| " + " | ".join(str(row.get(column, "")) for column in columns) + " |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the mock endpoints")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mocks/printer")
+    parser.add_argument("--scenario", choices=["short", "keepalive", "idle"], default="short")
+    parser.add_argument("--concurrency", type=int, default=50, help="Active clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--idle", type=int, default=500, help="Idle connections (idle scenario)")
+    parser.add_argument("--idle-interval", type=float, default=10.0, help="Seconds between idle client requests")
+    parser.add_argument("--profiles", nargs="+", help="Benchmark these server profiles (starts the service)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per profile (--profiles)")
+    parser.add_argument("--body", type=json.loads, help="JSON request body (default: a small order)")
+    parser.add_argument("--in-process", action="store_true", help="Compare the mock fast path with the full stack")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per stack (--in-process)")
+    parser.add_argument("--log-entries", type=int, help="Compare log entry representations over this many entries")
+    args = parser.parse_args()
+
+    if args.log_entries:
+        print("| type | µs/entry | bytes/entry |")
+        print("|---|---|---|")
+        for row in log_benchmark(args.log_entries):
+            print(f"| {row['type']} | {row['us_per_entry']} | {row['bytes_per_entry']} |")
+    elif args.in_process:
+        rows = asyncio.run(asgi_benchmark(urlsplit(args.url).path, args.requests, args.body))
+        print("| path | stack | µs/request |")
+        print("|---|---|---|")
+        for row in rows:
+            print(f"| {row['path']} | {row['stack']} | {row['us_per_request']} |")
+    elif args.profiles:
+        rows = benchmark_profiles(args)
+        print_table(summarize(rows) if args.repeat > 1 else rows)
+    else:
+        result = asyncio.run(run_scenario(
+            args.url, args.scenario, args.concurrency, args.duration, args.idle, args.idle_interval, args.body
+        ))
+        print_table([{"profile": "-", **result}])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Columnar export of the request log for offline analysis.
+
+The service streams its log from GET /mocks/logs/export as Arrow IPC, Parquet
+(both need pyarrow) or CSV. The CLI downloads it from a running service:
+
+    python log_export.py --url http://127.0.0.1:8000 --format parquet --output logs.parquet
+
+Keep more than the default 1000 entries with LOG_CAPACITY, e.g. LOG_CAPACITY=100000
+for a load test. Load the file with pandas.read_parquet, pyarrow.ipc.open_stream,
+DuckDB or Polars.
+"""
+import os
+import io
+import csv
+import json
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Optional: without pyarrow only CSV is available
+    pa = None
+
+from log_record import LogRecord, SERVICES, MODES, STATUSES
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "8192"))
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "csv": "text/csv"
+}
+EXTENSIONS = {"arrow": "arrows", "parquet": "parquet", "csv": "csv"}
+
+CODES = {"service": SERVICES, "mode": MODES, "status": STATUSES}
+
+COLUMNS = (
+    "timestamp", "service", "mode", "status", "config_version", "duration_ms",
+    "kiosk_id", "order_id", "amount", "request", "response"
+)
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("service", pa.dictionary(pa.int32(), pa.string())),
+        ("mode", pa.dictionary(pa.int32(), pa.string())),
+        ("status", pa.dictionary(pa.int32(), pa.string())),
+        ("config_version", pa.int64()),
+        ("duration_ms", pa.float64()),
+        ("kiosk_id", pa.string()),
+        ("order_id", pa.int64()),
+        ("amount", pa.int64()),
+        ("request", pa.string()),
+        ("response", pa.string())
+    ])
+
+
+def available_formats() -> List[str]:
+    return ["arrow", "parquet", "csv"] if pa is not None else ["csv"]
+
+
+def default_format() -> str:
+    return "arrow" if pa is not None else "csv"
+
+
+def _int(value) -> Optional[int]:
+    # Mock bodies are tolerant: keep a typed column and drop values of another type
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def column_batches(logs: Sequence[LogRecord], batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[Dict[str, list]]:
+    """
+    The log as batches of columns: one list per column, filled entry by entry.
+
+    No per-row dict is built. timestamp holds epoch seconds and service, mode and
+    status hold the record codes, converted per format. request and response are
+    kept as JSON text, with the fields used for grouping (kiosk_id, order_id,
+    and amount, which is the payment sum or the refund amount) lifted into columns.
+    """
+    dumps = json.dumps
+    for start in range(0, len(logs), batch_rows):
+        timestamp, service, mode, status, version, duration = [], [], [], [], [], []
+        kiosk_id, order_id, amount, request, response = [], [], [], [], []
+        for log in logs[start:start + batch_rows]:
+            timestamp.append(log.at)
+            service.append(log.service_code)
+            mode.append(log.mode_code)
+            status.append(log.status_code)
+            version.append(log.config_version)
+            duration.append(log.duration_ms)
+            body = log.request
+            kiosk = body.get("kiosk_id")
+            kiosk_id.append(None if kiosk is None else str(kiosk))
+            order_id.append(_int(body.get("order_id")))
+            amount.append(_int(body.get("amount", body.get("sum"))))
+            request.append(dumps(body, default=str))
+            response.append(dumps(log.response, default=str))
+        yield {
+            "timestamp": timestamp, "service": service, "mode": mode, "status": status,
+            "config_version": version, "duration_ms": duration, "kiosk_id": kiosk_id,
+            "order_id": order_id, "amount": amount, "request": request, "response": response
+        }
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only sink handing out what was written since the last take()"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _record_batch(columns: Dict[str, list]):
+    arrays = []
+    for field in SCHEMA:
+        values = columns[field.name]
+        if field.name == "timestamp":
+            micros = pa.compute.round(pa.compute.multiply(pa.array(values, pa.float64()), 1e6))
+            array = micros.cast(pa.int64()).cast(field.type)
+        elif field.name in CODES:
+            # The record codes are the dictionary indices as they are
+            names = pa.array(CODES[field.name].names, pa.string())
+            array = pa.DictionaryArray.from_arrays(pa.array(values, pa.int32()), names)
+        else:
+            array = pa.array(values, field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def _text_rows(columns: Dict[str, list]) -> Iterator[tuple]:
+    columns = dict(columns)
+    columns["timestamp"] = [datetime.fromtimestamp(at, timezone.utc).isoformat() for at in columns["timestamp"]]
+    for name, codes in CODES.items():
+        names = codes.names
+        columns[name] = [names[code] for code in columns[name]]
+    return zip(*(columns[name] for name in COLUMNS))
+
+
+def export(logs: Sequence[LogRecord], fmt: str) -> Iterator[bytes]:
+    """Encode the log in fmt, yielding the output batch by batch"""
+    if fmt not in available_formats():
+        raise ValueError(f"Format '{fmt}' is not available (supported: {', '.join(available_formats())})")
+
+    if fmt == "csv":
+        sink = io.StringIO()
+        writer = csv.writer(sink)
+        writer.writerow(COLUMNS)
+        for columns in column_batches(logs):
+            writer.writerows(_text_rows(columns))
+            yield sink.getvalue().encode()
+            sink.seek(0)
+            sink.truncate()
+        if sink.tell():
+            yield sink.getvalue().encode()
+        return
+
+    sink = _Chunks()
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, SCHEMA)
+    else:
+        writer = pa.parquet.ParquetWriter(sink, SCHEMA, compression="zstd")
+    try:
+        for columns in column_batches(logs):
+            if fmt == "arrow":
+                writer.write_batch(_record_batch(columns))
+            else:
+                writer.write_table(pa.Table.from_batches([_record_batch(columns)]))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def main():
+    import httpx
+
+    parser = argparse.ArgumentParser(description="Download the request log of a running service in a columnar format")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Service base URL")
+    parser.add_argument("--format", choices=list(MEDIA_TYPES), help="Default: arrow if the service has pyarrow, else csv")
+    parser.add_argument("--service", help="Only this service's entries")
+    parser.add_argument("--output", "-o", help="Output file (default: logs.<extension>)")
+    args = parser.parse_args()
+
+    params = {key: value for key, value in (("format", args.format), ("service", args.service)) if value}
+    with httpx.stream("GET", args.url.rstrip("/") + "/mocks/logs/export", params=params, timeout=None) as response:
+        if response.status_code != 200:
+            response.read()
+            parser.exit(1, f"Export failed ({response.status_code}): {response.text}\n")
+        fmt = response.headers.get("x-export-format", args.format or "csv")
+        output = args.output or f"logs.{EXTENSIONS[fmt]}"
+        with open(output, "wb") as f:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+    print(f"{response.headers.get('x-export-rows', '?')} log entries written to {output} ({fmt})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from models import LogEntry
+
+
+class Codes:
+    """Small integer codes for a growing set of names (services, modes, statuses)"""
+    __slots__ = ("names", "_index")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def code(self, name: str) -> int:
+        code = self._index.get(name)
+        if code is None:
+            code = self._index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def find(self, name: str) -> Optional[int]:
+        """Code of name if it has been seen, without adding it"""
+        return self._index.get(name)
+
+
+SERVICES = Codes()
+MODES = Codes()
+STATUSES = Codes()
+
+
+class LogRecord:
+    """
+    One request log entry as kept in memory.
+
+    Service, mode and status are codes into SERVICES/MODES/STATUSES, the time is
+    an epoch float, and request and response are references to the dicts the
+    request already produced. No validation or copying happens on the request
+    path; the public LogEntry model is built only when an API returns the log.
+    """
+    __slots__ = ("at", "service_code", "mode_code", "status_code", "config_version", "duration_ms",
+                 "request", "response")
+
+    def __init__(self, at: float, service: str, mode: str, status: str, request: Dict[str, Any],
+                 response: Dict[str, Any], config_version: Optional[int] = None,
+                 duration_ms: Optional[float] = None):
+        self.at = at
+        self.service_code = SERVICES.code(service)
+        self.mode_code = MODES.code(mode)
+        self.status_code = STATUSES.code(status)
+        self.config_version = config_version
+        self.duration_ms = duration_ms
+        self.request = request
+        self.response = response
+
+    @property
+    def service(self) -> str:
+        return SERVICES.names[self.service_code]
+
+    @property
+    def mode(self) -> str:
+        return MODES.names[self.mode_code]
+
+    @property
+    def status(self) -> str:
+        return STATUSES.names[self.status_code]
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.at, timezone.utc)
+
+    @property
+    def timestamp(self) -> str:
+        return self.time.isoformat()
+
+    def to_entry(self) -> LogEntry:
+        return LogEntry(
+            timestamp=self.timestamp,
+            service=self.service,
+            request=self.request,
+            response=self.response,
+            mode=self.mode,
+            status=self.status,
+            config_version=self.config_version,
+            duration_ms=self.duration_ms
+        )
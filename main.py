@@ -1,22 +1,40 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
-from typing import Union
+from typing import Dict, Optional, Set
+from datetime import datetime, timezone
 import uvicorn
 
+from fastapi.exceptions import RequestValidationError
 from models import (
-    PaymentRequest, PaymentResponse,
-    FiscalRequest, FiscalSuccessResponse, FiscalFailureResponse,
-    KDSRequest, KDSSuccessResponse, KDSFailureResponse,
-    ConfigUpdateRequest, LogEntry, ServiceConfig
+    PaymentResponse, ServiceConfig, BulkResolveRequest, SeedRequest,
+    RefundRequest, TransactionState
 )
 from mocks import (
-    handle_payment_request, handle_qr_first_provider_request,
-    handle_fiscal_request, handle_kds_request,
-    handle_new_fiscal_request, handle_printer_request, set_bot_application
+    dispatch, set_bot_application, PAYMENT_MOCKS, background_task_count,
+    send_bulk_resolution_summary, close_callback_client,
+    payment_status_response, refund_payment, cancel_payment
 )
+from registry import registry, MockDefinition
+from config_file import config_file
+from snapshot import snapshots
+from fastpath import MockFastPath, mock_paths
+from control import control
+from faults import MockFault, FaultResponse, parse_fault
+from tracing import exporter as trace_exporter
+from profiler import profiler, slow_callbacks, to_collapsed, to_speedscope
+from health import census, loop_lag, HEALTH_MAX_LAG_MS
+from log_export import export, available_formats, default_format, MEDIA_TYPES, EXTENSIONS
+from telegram_outbox import outbox
+from notifications import notifier
+from transactions import TransactionError
 from storage import storage
-from telegram_bot import start_bot, stop_bot, get_bot_application
+from idgen import ids
+from telegram_bot import (
+    start_bot, stop_bot, get_bot_application,
+    is_webhook_mode, verify_webhook_secret, process_webhook_update, WEBHOOK_PATH
+)
 import asyncio
 
 
@@ -25,7 +43,20 @@ async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown"""
     # Startup
     print("🚀 Starting Unified Mocks Service...")
-    await start_bot()
+    if config_file:
+        await config_file.start()
+    if snapshots.path:
+        # A config file, when used, stays authoritative for the configs
+        snapshots.restore_file(configs=config_file is None)
+        await snapshots.start()
+    await trace_exporter.start()
+    await slow_callbacks.start()
+    await loop_lag.start()
+    await control.start(app, is_mock_path)
+    # On the control lane when ADMIN_PORT is set, so the bot stays responsive under mock load
+    await control.run(start_bot())
+    # Summaries are sent from the outbox's loop
+    await control.run(notifier.start())
 
     # Give bot a moment to fully initialize
     await asyncio.sleep(1)
@@ -44,7 +75,17 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("🛑 Stopping Unified Mocks Service...")
-    await stop_bot()
+    await control.run(notifier.stop())
+    await control.run(stop_bot())
+    await control.stop()
+    await close_callback_client()
+    await trace_exporter.stop()
+    await slow_callbacks.stop()
+    await loop_lag.stop()
+    if snapshots.path:
+        await snapshots.stop()
+    if config_file:
+        await config_file.stop()
     print("✅ Service stopped")
 
 
@@ -64,6 +105,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last, so it runs first: mock routes bypass CORS and the FastAPI route machinery
+app.add_middleware(MockFastPath)
+
+
+@app.exception_handler(MockFault)
+async def mock_fault_handler(request: Request, exc: MockFault):
+    """Deliver a faulted mock response when mock routes go through the full stack (MOCK_FAST_PATH=0)"""
+    return FaultResponse(exc.fault, exc.body)
+
 
 @app.get("/")
 async def root():
@@ -72,134 +122,186 @@ async def root():
         "service": "Unified Mocks Service",
         "version": "1.0.0",
         "endpoints": {
-            "payment": "/mocks/payment",
-            "qr_first_provider": "/mocks/QRFirtsProvider",
-            "fiscal": "/mocks/fiscal (old format)",
-            "fiscal_receipt": "/mocks/fiscal_receipt (new format - tolerant)",
-            "printer": "/mocks/printer",
-            "kds": "/mocks/kds",
+            **{definition.name: definition.route for definition in registry.definitions()},
             "config": "/mocks/config",
-            "logs": "/mocks/logs"
+            "logs": "/mocks/logs",
+            "logs_export": "/mocks/logs/export",
+            "stats": "/mocks/stats",
+            "snapshot": "/mocks/snapshot",
+            "manual_pending": "/mocks/manual/pending",
+            "manual_resolve": "/mocks/manual/resolve"
         }
     }
 
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
-    return {"status": "ok"}
-
-
-# Payment Mock Endpoint
-@app.post("/mocks/payment", response_model=PaymentResponse)
-async def payment_mock(request: PaymentRequest):
     """
-    Payment Edge Mock Endpoint
+    Health check with event loop lag and a census of live work
 
-    Simulates payment terminal behavior with configurable responses.
+    Every figure is read from counters kept up to date as work starts and ends,
+    so the endpoint is cheap enough to poll every second. If HEALTH_MAX_LAG_MS
+    is set, answers 503 with status "degraded" while the loop lags more than that.
     """
-    try:
-        response = await handle_payment_request(request)
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    lag = loop_lag.read()
+    notifications = outbox.stats()
+    degraded = 0 < HEALTH_MAX_LAG_MS < max(lag["current_ms"], lag["average_ms"])
+
+    body = {
+        "status": "degraded" if degraded else "ok",
+        "event_loop_lag": lag,
+        "tasks": {
+            "requests": census.get("requests"),
+            "delayed": census.get("delayed") + census.get("async_pending"),
+            "manual_waiting": len(storage.manual_waiters),
+            "notifications": notifications["queued"] + notifications["in_flight"],
+            "faults": census.get("hanging") + census.get("dripping"),
+            "streaming": census.get("streaming"),
+            "background": background_task_count()
+        },
+        "pending_requests": len(storage.pending_requests),
+        "logs": {
+            "size": len(storage.logs),
+            "capacity": storage.logs.maxlen,
+            "fill": round(len(storage.logs) / storage.logs.maxlen, 3)
+        },
+        "config_version": storage.get_snapshot().version,
+        "last_snapshot": snapshots.last
+    }
+    return JSONResponse(body, status_code=503 if degraded else 200)
 
 
-# QR First Provider Mock Endpoint
-@app.post("/mocks/QRFirtsProvider", response_model=PaymentResponse)
-async def qr_first_provider_mock(request: PaymentRequest):
+# Telegram Webhook Endpoint
+@app.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
     """
-    QR First Provider Mock Endpoint
+    Telegram Webhook Endpoint
 
-    Simulates a new QR-based payment method with configurable responses.
-    Behaves like the Payment Edge mock (success / failure / manual / sequence / delay),
-    controllable via Telegram and the /mocks/config endpoint.
+    Receives bot updates when TELEGRAM_WEBHOOK_URL is set (replaces long polling).
     """
-    try:
-        response = await handle_qr_first_provider_request(request)
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not is_webhook_mode():
+        raise HTTPException(status_code=404, detail="Webhook mode disabled")
 
+    if not verify_webhook_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token")):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
 
-# Fiscal Mock Endpoint (old format)
-@app.post("/mocks/fiscal", response_model=Union[FiscalSuccessResponse, FiscalFailureResponse])
-async def fiscal_mock(request: FiscalRequest):
-    """
-    Fiscal Edge Mock Endpoint (OLD FORMAT)
-
-    Simulates fiscal printer behavior with configurable responses.
-    """
     try:
-        response = await handle_fiscal_request(request)
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid update payload")
 
+    if not await process_webhook_update(data):
+        raise HTTPException(status_code=503, detail="Bot not running")
 
-# NEW Fiscal Mock Endpoint (tolerant to any format)
-@app.post("/mocks/fiscal_receipt")
-async def fiscal_receipt_mock(request: Request):
-    """
-    Fiscal Receipt Mock Endpoint (NEW FORMAT - Tolerant)
+    return {"ok": True}
 
-    Accepts ANY JSON format and returns response matching real API.
-    Logs all incoming requests regardless of format.
-    """
+
+# Mock endpoints, generated from the mock registry
+async def serve_mock(definition: MockDefinition, body, model=None, traceparent: Optional[str] = None):
     try:
-        # Parse body as JSON, default to empty dict if fails
-        try:
-            body = await request.json()
-        except Exception:
-            body = {}
-
-        response = await handle_new_fiscal_request(body)
-        return response
-    except HTTPException:
+        return await dispatch(definition, body, model, traceparent)
+    except (HTTPException, RequestValidationError, MockFault):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Printer Mock Endpoint
-@app.post("/mocks/printer")
-async def printer_mock(request: Request):
-    """
-    Printer Mock Endpoint (Tolerant)
+async def service_status(service: str):
+    snapshot = storage.get_snapshot()
+    config = snapshot.get(service)
+    return {
+        "service": service,
+        "mode": config.mode.value,
+        "timeout_seconds": config.timeout_seconds,
+        "default_response": config.default_response,
+        "config_version": snapshot.version
+    }
 
-    Accepts ANY JSON format and returns response matching real API.
-    Logs all incoming requests regardless of format.
-    """
-    try:
-        # Parse body as JSON, default to empty dict if fails
-        try:
-            body = await request.json()
-        except Exception:
-            body = {}
-
-        response = await handle_printer_request(body)
-        return response
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
+# Mock name -> mounted route; definitions reloaded from the config file keep their endpoint
+_mounted_routes: Dict[str, str] = {}
 
-# KDS Mock Endpoint
-@app.post("/mocks/kds")
-async def kds_mock(request: Request):
-    """
-    KDS (Kitchen Display System) Mock Endpoint
 
-    Simulates kitchen display system behavior with configurable responses.
-    Tolerant to any input JSON format.
-    """
-    try:
-        body = await request.json()
-        response = await handle_kds_request(body)
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def current_definition(name: str, route: str) -> MockDefinition:
+    """Definition currently registered for a mounted route (it may have been replaced or removed)"""
+    definition = registry.get(name)
+    if definition is None or definition.route != route:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return definition
+
+
+def add_mock_routes(definition: MockDefinition):
+    """POST <route> for every mock, plus GET <route>/status for the primary mock of each service"""
+    name, route = definition.name, definition.route
+    if _mounted_routes.get(name) == route:
+        return
+    _mounted_routes[name] = route
+    mock_paths[route] = name
+
+    if definition.request_model is not None:
+        async def endpoint(request: definition.request_model, traceparent: Optional[str] = Header(None)):
+            return await serve_mock(current_definition(name, route), None, request, traceparent)
+    else:
+        async def endpoint(request: Request, traceparent: Optional[str] = Header(None)):
+            # Tolerant: parse body as JSON, default to empty dict if it fails
+            try:
+                body = await request.json()
+            except Exception:
+                body = {}
+            return await serve_mock(current_definition(name, route), body, traceparent=traceparent)
+
+    app.add_api_route(
+        definition.route,
+        endpoint,
+        methods=["POST"],
+        response_model=definition.response_model,
+        name=f"{definition.name}_mock",
+        summary=f"{definition.label} mock",
+        description=definition.description
+    )
+
+    if registry.service(definition.service) is definition:
+        async def status_endpoint():
+            return await service_status(definition.service)
+
+        app.add_api_route(
+            f"{definition.route}/status",
+            status_endpoint,
+            methods=["GET"],
+            name=f"{definition.service}_status",
+            summary=f"Get {definition.label} service status"
+        )
+
+
+registry.on_register(add_mock_routes)
+
+
+# Fiscal register state per kiosk (new format)
+@app.get("/mocks/fiscal_receipt/registers/{kiosk_id}")
+async def fiscal_register_state(kiosk_id: str):
+    """Get the simulated fiscal register (FN number, shift, counters, totals) of a kiosk"""
+    state = storage.fiscal_registers.state(kiosk_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No fiscal register for kiosk {kiosk_id}")
+    return state
+
+
+@app.post("/mocks/fiscal_receipt/registers/{kiosk_id}/shift/open")
+async def fiscal_shift_open(kiosk_id: str):
+    """Open a new shift on the kiosk's fiscal register"""
+    state = await control.on_main(storage.fiscal_registers.open_shift, kiosk_id)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Shift is already open")
+    return state
+
+
+@app.post("/mocks/fiscal_receipt/registers/{kiosk_id}/shift/close")
+async def fiscal_shift_close(kiosk_id: str):
+    """Close the current shift on the kiosk's fiscal register"""
+    state = await control.on_main(storage.fiscal_registers.close_shift, kiosk_id)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Shift is not open")
+    return state
 
 
 # Configuration Endpoints
@@ -214,46 +316,131 @@ async def get_config():
             "mode": config.mode.value,
             "timeout_seconds": config.timeout_seconds,
             "default_response": config.default_response,
-            "sequence_config": config.sequence_config.dict() if config.sequence_config else None
+            "sequence_config": {
+                **config.sequence_config.dict(),
+                "remaining": storage.get_sequence_remaining(service)
+            } if config.sequence_config else None,
+            "async_lifecycle": config.async_lifecycle,
+            "fault": config.fault.value if config.fault else None,
+            "fault_rate": config.fault_rate,
+            "stream_chunk_bytes": config.stream_chunk_bytes,
+            "stream_chunk_interval": config.stream_chunk_interval,
+            "notify": config.notify.value if config.notify else None,
+            "notify_effective": notifier.policy(config, config.mode.value).value,
+            "notify_sample": config.notify_sample
         }
         for service, config in configs.items()
     }
 
 
 @app.post("/mocks/config")
-async def update_config(request: ConfigUpdateRequest):
+async def update_config(request: Dict[str, Optional[ServiceConfig]]):
     """
     Update configuration for services
-    """
-    updated = []
 
-    if request.payment:
-        storage.update_config("payment", request.payment)
-        updated.append("payment")
+    Body maps service names (as in GET /mocks/config) to their new configuration.
+    """
+    unknown = [service for service in request if storage.get_config(service) is None]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown services: {', '.join(unknown)}")
 
-    if request.qr_first_provider:
-        storage.update_config("qr_first_provider", request.qr_first_provider)
-        updated.append("qr_first_provider")
+    changes = {service: config for service, config in request.items() if config}
+    snapshot = await control.on_main(storage.update_configs, changes)
+    updated = list(changes)
 
-    if request.fiscal:
-        storage.update_config("fiscal", request.fiscal)
-        updated.append("fiscal")
+    return {
+        "status": "ok",
+        "updated": updated,
+        "version": snapshot.version,
+        "message": f"Configuration updated for: {', '.join(updated)}"
+    }
 
-    if request.kds:
-        storage.update_config("kds", request.kds)
-        updated.append("kds")
 
-    if request.printer:
-        storage.update_config("printer", request.printer)
-        updated.append("printer")
+@app.post("/mocks/seed")
+async def reseed(request: SeedRequest):
+    """
+    Reseed generated identifiers (auth codes, RRNs, fiscal numbers, request IDs, sequences)
 
+    The same seed gives the same values in each namespace, so test runs are reproducible.
+    """
+    seed = str(request.seed) if request.seed is not None else None
+    await control.on_main(ids.seed, seed, request.namespace)
     return {
         "status": "ok",
-        "updated": updated,
-        "message": f"Configuration updated for: {', '.join(updated)}"
+        "seed": seed,
+        "namespace": request.namespace
     }
 
 
+@app.get("/mocks/snapshot")
+async def download_snapshot():
+    """
+    Take a snapshot of the full mock state now and download it
+
+    Counters, sequences, logs, statistics, transactions and fiscal registers;
+    POST the file back to /mocks/snapshot to restore it.
+    """
+    try:
+        data = await control.on_main(snapshots.download)
+    except (OSError, RuntimeError) as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot failed: {e}")
+    filename = f"mocks-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.snapshot"
+    return Response(
+        data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.post("/mocks/snapshot")
+async def upload_snapshot(request: Request):
+    """
+    Restore the full mock state from a snapshot sent as the request body
+
+    Configs are restored too, unless MOCKS_CONFIG_FILE is in use.
+    """
+    try:
+        restored = await control.on_main(snapshots.restore, await request.body(), config_file is None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+    return {"status": "ok", "restored": restored}
+
+
+# Diagnostics Endpoints
+@app.get("/mocks/profile")
+async def profile_event_loop(seconds: float = 5, interval_ms: float = 10, format: str = "collapsed"):
+    """
+    Sample the event loop for up to 60 seconds and return where its time went
+
+    format=collapsed returns collapsed stacks (flamegraph.pl / speedscope / inferno input),
+    format=speedscope a file for https://www.speedscope.app.
+    """
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or speedscope")
+    if seconds <= 0 or interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="seconds and interval_ms must be positive")
+
+    try:
+        # The mock loop's thread, also when asked on the control lane
+        counts, elapsed = await profiler.profile(seconds, interval_ms / 1000, control.main_thread_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        name = f"unified-mocks {datetime.now(timezone.utc).isoformat()} ({elapsed:.1f}s)"
+        return JSONResponse(
+            to_speedscope(counts, interval_ms / 1000, name),
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'}
+        )
+    return PlainTextResponse(to_collapsed(counts))
+
+
+@app.get("/mocks/slow-callbacks")
+async def get_slow_callbacks():
+    """Recent callbacks that blocked the event loop longer than SLOW_CALLBACK_MS, with their stacks"""
+    return slow_callbacks.stats()
+
+
 # Logs Endpoint
 @app.get("/mocks/logs")
 async def get_logs(limit: int = 100):
@@ -267,77 +454,220 @@ async def get_logs(limit: int = 100):
     logs = storage.get_logs(limit)
 
     return {
-        "logs": [log.dict() for log in logs]
+        "logs": [log.to_entry().model_dump() for log in logs]
     }
 
 
-# Service-specific status endpoints
-@app.get("/mocks/payment/status")
-async def payment_status():
-    """Get Payment service status"""
-    config = storage.get_config("payment")
-    return {
-        "service": "payment",
-        "mode": config.mode.value,
-        "timeout_seconds": config.timeout_seconds,
-        "default_response": config.default_response
-    }
+@app.get("/mocks/stats")
+async def get_stats():
+    """
+    Aggregated statistics of all logged requests
 
+    Counts by service, mode and kiosk; request rate and success ratio per service
+    over the last 1m/5m/1h; payment amount totals by status. Maintained as entries
+    are logged, so reading is cheap.
+    """
+    return storage.stats.snapshot()
 
-@app.get("/mocks/QRFirtsProvider/status")
-async def qr_first_provider_status():
-    """Get QR First Provider service status"""
-    config = storage.get_config("qr_first_provider")
-    return {
-        "service": "qr_first_provider",
-        "mode": config.mode.value,
-        "timeout_seconds": config.timeout_seconds,
-        "default_response": config.default_response
-    }
 
+@app.get("/mocks/logs/export")
+async def export_logs(format: Optional[str] = None, service: Optional[str] = None):
+    """
+    Stream the whole log (up to LOG_CAPACITY entries) in a columnar format
 
-@app.get("/mocks/fiscal/status")
-async def fiscal_status():
-    """Get Fiscal service status"""
-    config = storage.get_config("fiscal")
-    return {
-        "service": "fiscal",
-        "mode": config.mode.value,
-        "timeout_seconds": config.timeout_seconds,
-        "default_response": config.default_response
-    }
+    Parameters:
+    - format: arrow (Arrow IPC stream), parquet or csv; default arrow, or csv without pyarrow
+    - service: Only this service's entries
+    """
+    fmt = format or default_format()
+    if fmt not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format '{fmt}' is not available (supported: {', '.join(available_formats())})"
+        )
+
+    logs = storage.get_logs(limit=None)
+    if service:
+        logs = [log for log in logs if log.service == service]
+
+    # A sync iterator: Starlette encodes the batches in its thread pool, off the event loop
+    return StreamingResponse(
+        export(logs, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="logs.{EXTENSIONS[fmt]}"',
+            "X-Export-Format": fmt,
+            "X-Export-Rows": str(len(logs))
+        }
+    )
 
 
-@app.get("/mocks/kds/status")
-async def kds_status():
-    """Get KDS service status"""
-    config = storage.get_config("kds")
+# Manual Mode Endpoints
+@app.get("/mocks/manual/pending")
+async def get_pending_requests(service: str = None):
+    """
+    Get pending manual requests, oldest first
+
+    Parameters:
+    - service: Only return requests for this service
+    """
+    now = datetime.now(timezone.utc)
     return {
-        "service": "kds",
-        "mode": config.mode.value,
-        "timeout_seconds": config.timeout_seconds,
-        "default_response": config.default_response
+        "pending": [
+            {
+                "request_id": p.request_id,
+                "service": p.service,
+                "created_at": p.created_at.isoformat(),
+                "age_seconds": round((now - p.created_at).total_seconds(), 1),
+                "request_data": p.request_data
+            }
+            for p in storage.get_pending_requests(service)
+        ]
     }
 
 
-@app.get("/mocks/printer/status")
-async def printer_status():
-    """Get Printer service status"""
-    config = storage.get_config("printer")
+@app.post("/mocks/manual/resolve")
+async def resolve_pending_requests(request: BulkResolveRequest):
+    """
+    Resolve pending manual requests in one action
+
+    Resolves all pending requests, those of one service, or the oldest N,
+    and edits the admins' /pending message with the result (or sends one summary).
+    """
+    if request.response not in ["SUCCESS", "OK", "FAILURE", "UNAVAILABLE"] and not parse_fault(request.response):
+        raise HTTPException(status_code=400, detail=f"Unknown response: {request.response}")
+    if request.service and request.service not in storage.get_all_configs():
+        raise HTTPException(status_code=404, detail=f"Unknown service: {request.service}")
+    if request.oldest is not None and request.oldest < 1:
+        raise HTTPException(status_code=400, detail="oldest must be positive")
+
+    resolved = storage.resolve_pending_requests(
+        request.response, service=request.service, oldest=request.oldest
+    )
+    if resolved:
+        await send_bulk_resolution_summary(resolved, request.response)
+
+    by_service = {}
+    for p in resolved:
+        by_service[p.service] = by_service.get(p.service, 0) + 1
+
     return {
-        "service": "printer",
-        "mode": config.mode.value,
-        "timeout_seconds": config.timeout_seconds,
-        "default_response": config.default_response
+        "status": "ok",
+        "resolved": len(resolved),
+        "by_service": by_service,
+        "request_ids": [p.request_id for p in resolved]
     }
 
 
+# Payment transaction endpoints (declared after the /status routes so they don't shadow them)
+def find_transaction(service: str, payment_id: int):
+    txn = storage.transactions.get(service, payment_id)
+    if txn is None:
+        raise HTTPException(status_code=404, detail=f"Payment {payment_id} not found")
+    return txn
+
+
+def get_payment_result(service: str, payment_id: int):
+    txn = find_transaction(service, payment_id)
+    if txn.state == TransactionState.UNAVAILABLE:
+        raise HTTPException(status_code=503, detail="Service Unavailable")
+    return payment_status_response(txn)
+
+
+def search_transactions(service: str, order_id: int = None, rrn: str = None):
+    if order_id is not None:
+        found = storage.transactions.find_by_order(service, order_id)
+    elif rrn is not None:
+        txn = storage.transactions.find_by_rrn(service, rrn)
+        found = [txn] if txn else []
+    else:
+        raise HTTPException(status_code=400, detail="order_id or rrn is required")
+    return {"transactions": [txn.to_dict() for txn in found]}
+
+
+async def refund_transaction(service: str, payment_id: int, request: RefundRequest):
+    txn = find_transaction(service, payment_id)
+    try:
+        await refund_payment(service, txn, request.amount)
+    except TransactionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return txn.to_dict()
+
+
+async def cancel_transaction(service: str, payment_id: int):
+    txn = find_transaction(service, payment_id)
+    try:
+        await cancel_payment(service, txn)
+    except TransactionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return txn.to_dict()
+
+
+# Payment mock routes with transaction endpoints below them
+_transaction_routes: Set[str] = set()
+
+
+def add_transaction_routes(definition: MockDefinition):
+    """Status, lookup, refund and cancel endpoints of a payment mock"""
+    service = definition.service
+    _transaction_routes.add(definition.route)
+
+    async def transactions(order_id: int = None, rrn: str = None):
+        return search_transactions(service, order_id, rrn)
+
+    async def result(payment_id: int):
+        return get_payment_result(service, payment_id)
+
+    async def refund(payment_id: int, request: RefundRequest = RefundRequest()):
+        return await refund_transaction(service, payment_id, request)
+
+    async def cancel(payment_id: int):
+        return await cancel_transaction(service, payment_id)
+
+    app.add_api_route(f"{definition.route}/transactions", transactions, methods=["GET"],
+                      name=f"{service}_transactions", summary="Find transactions by order_id or RRN")
+    app.add_api_route(f"{definition.route}/{{payment_id}}", result, methods=["GET"], response_model=PaymentResponse,
+                      name=f"{service}_result",
+                      summary="Payment status: PENDING until an async payment finishes, then SUCCESS / DECLINED / REFUNDED / CANCELLED")
+    app.add_api_route(f"{definition.route}/{{payment_id}}/refund", refund, methods=["POST"],
+                      name=f"{service}_refund", summary="Refund an authorized payment, fully or partially")
+    app.add_api_route(f"{definition.route}/{{payment_id}}/cancel", cancel, methods=["POST"],
+                      name=f"{service}_cancel", summary="Cancel a pending or authorized payment")
+
+
+for _name in PAYMENT_MOCKS:
+    add_transaction_routes(registry.get(_name))
+
+
+def is_mock_path(path: str) -> bool:
+    """Whether path is a mock route (or its status and transaction routes), not served on ADMIN_PORT"""
+    if path in mock_paths:
+        return True
+    route, _, rest = path.rpartition("/")
+    if rest == "status" and route in mock_paths:
+        return True
+    return any(path.startswith(route + "/") for route in _transaction_routes)
+
+# Mocks may not take over any other route: the admin API, health, webhook, docs and transaction routes
+for _route in app.routes:
+    _base, _, _rest = getattr(_route, "path", "").rpartition("/")
+    if hasattr(_route, "path_regex") and _route.path not in mock_paths and not (_rest == "status" and _base in mock_paths):
+        registry.reserve(_route.path_regex, _route.path)
+
+# Configs and extra mocks from MOCKS_CONFIG_FILE; later edits are applied by the watcher
+if config_file:
+    config_file.load()
+
+
 if __name__ == "__main__":
     import os
+    from server_profiles import server_config, SERVER_PROFILE
     port = int(os.getenv("PORT", 8000))
+    print(f"⚙️ Server profile: {SERVER_PROFILE}")
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=False
+        reload=False,
+        **server_config()
     )
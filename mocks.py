@@ -1,18 +1,29 @@
 from datetime import datetime, timezone
-import uuid
-import random
+import time
 import asyncio
-from typing import Union
+import httpx
+from typing import Optional, Tuple, Union
 from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from models import (
     PaymentRequest, PaymentResponse,
-    FiscalRequest, FiscalSuccessResponse, FiscalFailureResponse, FiscalReceipt, FiscalReceiptItem,
-    KDSRequest, KDSSuccessResponse, KDSFailureResponse,
-    ServiceMode, LogEntry, PendingRequest, ResponseStatus,
-    NewFiscalParams, NewFiscalError, NewFiscalSuccessResponse, NewFiscalFailureResponse,
-    PrinterSuccessResponse, PrinterFailureResponse
+    FiscalRequest, FiscalSuccessResponse, FiscalFailureResponse,
+    ServiceMode, PendingRequest, ResponseStatus, TransactionState, FaultType
 )
 from storage import storage
+from log_record import LogRecord
+from transactions import Transaction
+from registry import registry, MockDefinition, MockContext
+from idgen import ids
+from telegram_outbox import outbox, PRIORITY_MANUAL, PRIORITY_LOG
+from control import control
+from notifications import notifier
+from tracing import start_trace, span
+from health import census
+from faults import MockFault, parse_fault
+from streaming import TextTemplate, StreamedJSONResponse
+from fiscal_items import calculate_receipt, register_total, ReceiptError
 
 # Global reference to bot for sending messages
 _bot_app = None
@@ -28,142 +39,64 @@ def generate_session_id(order_id: int) -> str:
     return f"{order_id}-{timestamp}"
 
 
-def generate_field_90_raw(amount: int, response_code: str, response_message: str, auth_code: str = None, rrn: str = None) -> str:
-    now = datetime.now(timezone.utc)
-    timestamp = now.strftime("%Y%m%d%H%M%S")
-
-    if response_code == "00":  # Success
-        return f'''<?xml version="1.0" encoding="UTF-8" standalone="no"?><response><field id="0">{amount}</field><field id="4">643</field><field id="6">{timestamp}</field><field id="13">{auth_code}</field><field id="14">{rrn}</field><field id="15">{response_code}</field><field id="19">{response_message}</field><field id="21">{timestamp}</field><field id="23">0</field><field id="25">1</field><field id="26">0</field><field id="27">00092240</field><field id="28">11111111</field><field id="39">00</field></response>'''
-    else:  # Failure
-        return f'''<?xml version="1.0" encoding="UTF-8" standalone="no"?><response><field id="0">{amount}</field><field id="4">643</field><field id="6">{timestamp}</field><field id="15">{response_code}</field><field id="19">{response_message}</field><field id="21">{timestamp}</field><field id="23">0</field><field id="25">1</field><field id="26">0</field><field id="27">00092240</field><field id="28">0</field><field id="39">53</field></response>'''
-
-
-def generate_receipt_text() -> str:
-    return """<html><body>
+FIELD_90_SUCCESS = TextTemplate(
+    '''<?xml version="1.0" encoding="UTF-8" standalone="no"?><response><field id="0">{amount}</field><field id="4">643</field><field id="6">{timestamp}</field><field id="13">{auth_code}</field><field id="14">{rrn}</field><field id="15">{response_code}</field><field id="19">{response_message}</field><field id="21">{timestamp}</field><field id="23">0</field><field id="25">1</field><field id="26">0</field><field id="27">00092240</field><field id="28">11111111</field><field id="39">00</field></response>'''
+)
+FIELD_90_FAILURE = TextTemplate(
+    '''<?xml version="1.0" encoding="UTF-8" standalone="no"?><response><field id="0">{amount}</field><field id="4">643</field><field id="6">{timestamp}</field><field id="15">{response_code}</field><field id="19">{response_message}</field><field id="21">{timestamp}</field><field id="23">0</field><field id="25">1</field><field id="26">0</field><field id="27">00092240</field><field id="28">0</field><field id="39">53</field></response>'''
+)
+RECEIPT = TextTemplate("""<html><body>
     <div style='font-family: monospace;'>
     ===========================<br>
     ТЕСТОВЫЙ ЧЕК<br>
     ===========================<br>
-    Дата: """ + datetime.now(timezone.utc).strftime("%d.%m.%Y %H:%M") + """<br>
+    Дата: {date}<br>
     Терминал: 00092240<br>
     ===========================<br>
     ОПЛАТА ОДОБРЕНА<br>
     ===========================<br>
-    </div></body></html>"""
-
-
-async def handle_payment_request(request: PaymentRequest) -> PaymentResponse:
-    config = storage.get_config("payment")
-
-    # Apply delay if configured
-    if config.delay_seconds > 0:
-        await asyncio.sleep(config.delay_seconds)
+    </div></body></html>""")
 
-    # Determine response type based on mode
-    response_status = await determine_response("payment", config, request.dict())
 
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
-
-    should_succeed = response_status == ResponseStatus.SUCCESS
-
-    payment_id = storage.get_next_payment_id()
-    session_id = generate_session_id(request.order_id)
+def generate_field_90_raw(amount: int, response_code: str, response_message: str, auth_code: str = None, rrn: str = None) -> str:
     now = datetime.now(timezone.utc)
-    payment_date = now.isoformat()
-    completed_at = now.isoformat()
+    timestamp = now.strftime("%Y%m%d%H%M%S")
 
-    if should_succeed:
-        auth_code = str(random.randint(100000, 999999))
-        rrn = f"{random.randint(1, 999999):012d}"
-        response = PaymentResponse(
-            payment_id=payment_id,
-            order_id=request.order_id,
-            session_id=session_id,
-            status="SUCCESS",
-            auth_code=auth_code,
-            rrn=rrn,
-            transaction_id="0",
-            terminal_id="00092240",
-            merchant_id="11111111",
-            response_code="00",
-            response_message="ОДОБРЕНО",
-            amount=request.sum,
-            currency_code="643",
-            payment_date=payment_date,
-            completed_at=completed_at,
-            receipt_available=True,
-            field_90_raw=generate_field_90_raw(request.sum, "00", "ОДОБРЕНО", auth_code, rrn),
-            customer_receipt=generate_receipt_text(),
-            merchant_receipt=generate_receipt_text()
+    if response_code == "00":  # Success
+        return FIELD_90_SUCCESS.render(
+            amount=amount, timestamp=timestamp, auth_code=auth_code, rrn=rrn,
+            response_code=response_code, response_message=response_message
         )
-    else:
-        response = PaymentResponse(
-            payment_id=payment_id,
-            order_id=request.order_id,
-            session_id=session_id,
-            status="DECLINED",
-            auth_code=None,
-            rrn=None,
-            transaction_id="0",
-            terminal_id="00092240",
-            merchant_id="0",
-            response_code="ER3",
-            response_message="ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~",
-            amount=request.sum,
-            currency_code="643",
-            payment_date=payment_date,
-            completed_at=completed_at,
-            receipt_available=False,
-            field_90_raw=generate_field_90_raw(request.sum, "ER3", "ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~"),
-            customer_receipt=None,
-            merchant_receipt=None
+    else:  # Failure
+        return FIELD_90_FAILURE.render(
+            amount=amount, timestamp=timestamp, response_code=response_code, response_message=response_message
         )
 
-    # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="payment",
-        request=request.dict(),
-        response=response.dict(),
-        mode=config.mode.value,
-        status=response.status
-    )
-    storage.add_log(log)
-
-    # Send instant notification
-    await send_log_notification(log)
-
-    return response
-
-
-async def handle_qr_first_provider_request(request: PaymentRequest) -> PaymentResponse:
-    config = storage.get_config("qr_first_provider")
-
-    # Apply delay if configured
-    if config.delay_seconds > 0:
-        await asyncio.sleep(config.delay_seconds)
-
-    # Determine response type based on mode
-    response_status = await determine_response("qr_first_provider", config, request.dict())
-
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
-
-    should_succeed = response_status == ResponseStatus.SUCCESS
 
-    payment_id = storage.get_next_qr_payment_id()
-    session_id = generate_session_id(request.order_id)
-    now = datetime.now(timezone.utc)
-    payment_date = now.isoformat()
-    completed_at = now.isoformat()
+def generate_receipt_text() -> str:
+    return RECEIPT.render(date=datetime.now(timezone.utc).strftime("%d.%m.%Y %H:%M"))
+
+
+def build_payment_response(
+    request: PaymentRequest,
+    payment_id: int,
+    session_id: str,
+    should_succeed: bool,
+    namespace: str,
+    payment_date: str,
+    completed_at: str
+) -> PaymentResponse:
+    """
+    Build the final payment terminal response (approved or declined)
 
+    Constructed without validation: the fields are well-typed by construction,
+    and the receipt and field 90 texts keep their preencoded JSON fragments.
+    """
     if should_succeed:
-        auth_code = str(random.randint(100000, 999999))
-        rrn = f"{random.randint(1, 999999):012d}"
-        response = PaymentResponse(
+        auth_code = str(ids.randint(f"{namespace}.auth_code", 100000, 999999))
+        # Random part, then the payment_id's last six digits: unique among the kept transactions
+        rrn = f"{ids.randint(f'{namespace}.rrn', 1, 999999):06d}{payment_id % 1000000:06d}"
+        return PaymentResponse.model_construct(
             payment_id=payment_id,
             order_id=request.order_id,
             session_id=session_id,
@@ -184,110 +117,143 @@ async def handle_qr_first_provider_request(request: PaymentRequest) -> PaymentRe
             customer_receipt=generate_receipt_text(),
             merchant_receipt=generate_receipt_text()
         )
-    else:
-        response = PaymentResponse(
-            payment_id=payment_id,
-            order_id=request.order_id,
-            session_id=session_id,
-            status="DECLINED",
-            auth_code=None,
-            rrn=None,
-            transaction_id="0",
-            terminal_id="00092240",
-            merchant_id="0",
-            response_code="ER3",
-            response_message="ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~",
-            amount=request.sum,
-            currency_code="643",
-            payment_date=payment_date,
-            completed_at=completed_at,
-            receipt_available=False,
-            field_90_raw=generate_field_90_raw(request.sum, "ER3", "ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~"),
-            customer_receipt=None,
-            merchant_receipt=None
-        )
 
-    # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="qr_first_provider",
-        request=request.dict(),
-        response=response.dict(),
-        mode=config.mode.value,
-        status=response.status
+    return PaymentResponse.model_construct(
+        payment_id=payment_id,
+        order_id=request.order_id,
+        session_id=session_id,
+        status="DECLINED",
+        auth_code=None,
+        rrn=None,
+        transaction_id="0",
+        terminal_id="00092240",
+        merchant_id="0",
+        response_code="ER3",
+        response_message="ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~",
+        amount=request.sum,
+        currency_code="643",
+        payment_date=payment_date,
+        completed_at=completed_at,
+        receipt_available=False,
+        field_90_raw=generate_field_90_raw(request.sum, "ER3", "ОПЕРАЦИЯ ПРЕРВАНА^TERMINATED.JPG~"),
+        customer_receipt=None,
+        merchant_receipt=None
     )
-    storage.add_log(log)
 
-    # Send instant notification
-    await send_log_notification(log)
 
-    return response
+def build_pending_payment_response(request: PaymentRequest, payment_id: int, session_id: str, payment_date: str) -> PaymentResponse:
+    """Response returned right away in async lifecycle mode, before the terminal finishes"""
+    return PaymentResponse(
+        payment_id=payment_id,
+        order_id=request.order_id,
+        session_id=session_id,
+        status="PENDING",
+        auth_code=None,
+        rrn=None,
+        transaction_id="0",
+        terminal_id="00092240",
+        merchant_id="0",
+        response_code="",
+        response_message="В ОБРАБОТКЕ",
+        amount=request.sum,
+        currency_code="643",
+        payment_date=payment_date,
+        completed_at="",
+        receipt_available=False,
+        field_90_raw="",
+        customer_receipt=None,
+        merchant_receipt=None
+    )
 
 
-async def handle_fiscal_request(request: FiscalRequest) -> Union[FiscalSuccessResponse, FiscalFailureResponse]:
-    config = storage.get_config("fiscal")
+# Response builders used by the built-in mock definitions
 
-    # Determine response type based on mode
-    response_status = await determine_response("fiscal", config, request.dict())
+def payment_session_id(ctx: MockContext) -> str:
+    """Session ID is fixed when the payment starts, so pending and final responses share it"""
+    if "session_id" not in ctx.values:
+        ctx.values["session_id"] = generate_session_id(ctx.model.order_id)
+    return ctx.values["session_id"]
 
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
 
-    should_succeed = response_status == ResponseStatus.SUCCESS
+def payment_success(ctx: MockContext) -> dict:
+    return build_payment_response(
+        ctx.model, ctx.id("payment_id"), payment_session_id(ctx), True,
+        ctx.definition.name, ctx.started_at.isoformat(), ctx.now.isoformat()
+    ).dict()
 
-    now = datetime.now(timezone.utc)
 
-    if should_succeed:
-        items = [
-            FiscalReceiptItem(
-                item_id=item.item_id,
-                description=item.item_description,
-                quantity=item.quantity,
-                price_net=item.item_price_net,
-                vat=item.item_vat_value,
-                price_gross=item.item_price_gross
-            )
-            for item in request.items
-        ]
+def payment_failure(ctx: MockContext) -> dict:
+    return build_payment_response(
+        ctx.model, ctx.id("payment_id"), payment_session_id(ctx), False,
+        ctx.definition.name, ctx.started_at.isoformat(), ctx.now.isoformat()
+    ).dict()
+
+
+def payment_pending(ctx: MockContext) -> dict:
+    return build_pending_payment_response(
+        ctx.model, ctx.id("payment_id"), payment_session_id(ctx), ctx.started_at.isoformat()
+    ).dict()
 
-        receipt = FiscalReceipt(
-            ofd_reg_number="1234567890",
-            fiscal_document_number=storage.get_next_fiscal_doc_number(),
-            fn_number="TEST-FN-0000000000000",
-            order_id=request.order_id,
-            issued_at=now.isoformat(),
-            items=items,
-            total_net=request.total_net,
-            total_vat=request.total_vat,
-            total_gross=request.total_gross,
-            message="Fiscal receipt generated (test)"
-        )
 
-        response = FiscalSuccessResponse(fiscal_receipt=receipt)
-        status = "OK"
+def record_payment(ctx: MockContext, response: dict, status: ResponseStatus) -> bool:
+    """Record the payment in the transaction store; False if an async payment was cancelled meanwhile"""
+    if status == ResponseStatus.SUCCESS:
+        state = TransactionState.AUTHORIZED
+    elif status == ResponseStatus.FAILURE:
+        state = TransactionState.DECLINED
+    elif status == ResponseStatus.UNAVAILABLE:
+        state = TransactionState.UNAVAILABLE
     else:
-        response = FiscalFailureResponse(
-            error_code="FISCAL_ERR_01",
-            error_message="Fiscalization failed: OFD communication error (simulated)"
+        state = TransactionState.PENDING
+
+    txn = ctx.values.get("transaction")
+    if txn is None:
+        txn = Transaction(
+            ctx.service, ctx.id("payment_id"), ctx.model.order_id, ctx.model.sum,
+            state, response, rrn=response.get("rrn") if response else None
         )
-        status = "NOT_OK"
+        ctx.values["transaction"] = txn
+        storage.transactions.add(txn)
+        return True
 
-    # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="fiscal",
-        request=request.dict(),
-        response=response.dict(),
-        mode=config.mode.value,
-        status=status
-    )
-    storage.add_log(log)
+    return storage.transactions.complete(txn, state, response, rrn=response.get("rrn") if response else None)
 
-    # Send instant notification
-    await send_log_notification(log)
 
-    return response
+def fiscal_success(ctx: MockContext) -> dict:
+    """
+    Old fiscal format: echo the validated items into the receipt.
+
+    ctx.request is the validated request as a dict, so the items are renamed
+    into plain dicts instead of building a FiscalReceiptItem model per line.
+    """
+    request = ctx.request
+    items = [
+        {
+            "item_id": item["item_id"],
+            "description": item["item_description"],
+            "quantity": item["quantity"],
+            "price_net": item["item_price_net"],
+            "vat": item["item_vat_value"],
+            "price_gross": item["item_price_gross"]
+        }
+        for item in request["items"]
+    ]
+
+    return {
+        "status": "OK",
+        "fiscal_receipt": {
+            "ofd_reg_number": "1234567890",
+            "fiscal_document_number": ctx.id("fiscal_document_number"),
+            "fn_number": "TEST-FN-0000000000000",
+            "order_id": request["order_id"],
+            "issued_at": ctx.now.isoformat(),
+            "items": items,
+            "total_net": request["total_net"],
+            "total_vat": request["total_vat"],
+            "total_gross": request["total_gross"],
+            "message": "Fiscal receipt generated (test)"
+        }
+    }
 
 
 def extract_total_from_request(request_data: dict) -> float:
@@ -313,53 +279,114 @@ def extract_total_from_request(request_data: dict) -> float:
         return float(request_data["total"])
 
     # Default random total
-    return round(random.uniform(100, 1000), 2)
+    return round(100 + ids.random("fiscal.total") * 900, 2)
 
 
-async def handle_new_fiscal_request(request_data: dict) -> dict:
-    """
-    Handle fiscal request in new format (tolerant to any input).
-    Returns response matching real API format.
-    """
-    config = storage.get_config("fiscal")
-
-    # Apply delay if configured
-    if config.delay_seconds > 0:
-        await asyncio.sleep(config.delay_seconds)
-
-    # Determine response type based on mode
-    response_status = await determine_response("fiscal", config, request_data)
+def receipt_total(request_data: dict) -> float:
+    """Total of a receipt without items; ReceiptError if the register cannot take it"""
+    try:
+        total = extract_total_from_request(request_data)
+    except (TypeError, ValueError, OverflowError):
+        total = None
+    return register_total(total)
 
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
-
-    should_succeed = response_status == ResponseStatus.SUCCESS
-
-    now = datetime.now(timezone.utc)
 
-    # Extract total from request (tolerant parsing)
-    total = extract_total_from_request(request_data)
+def fiscal_receipt_success(ctx: MockContext) -> dict:
+    """
+    New fiscal format: check the receipt's item and VAT math, then advance the
+    kiosk's fiscal register (counters, shift, totals).
 
-    if should_succeed:
-        response = {
-            "success": True,
-            "error": None,
-            "fiscalParams": {
-                "total": total,
-                "fnNumber": f"{random.randint(1000000000000000, 9999999999999999)}",
-                "registrationNumber": f"{random.randint(1, 9999999999999999):016d}",
-                "fiscalDocumentNumber": random.randint(1, 9999),
-                "fiscalReceiptNumber": random.randint(1, 999),
-                "fiscalDocumentSign": str(random.randint(1000000000, 9999999999)),
-                "fiscalDocumentDateTime": now.strftime("%Y-%m-%dT%H:%M:%S"),
-                "shiftNumber": random.randint(1, 100),
-                "fnsUrl": "www.nalog.gov.ru"
-            }
-        }
-        status = "SUCCESS"
-    else:
-        response = {
+    A receipt that does not add up is refused with the register's error code
+    and logged as INVALID_RECEIPT; the register is not advanced.
+    """
+    request = ctx.request if isinstance(ctx.request, dict) else {}
+    try:
+        receipt = calculate_receipt(request)
+        total = register_total(receipt["total"]) if receipt is not None else receipt_total(request)
+    except ReceiptError as e:
+        ctx.values["status"] = "INVALID_RECEIPT"
+        return {"success": False, "error": e.to_dict(), "fiscalParams": None}
+
+    kiosk_id = str(ctx.field("kiosk_id") or ctx.field("kioskId") or "default")
+    register = storage.fiscal_registers.register_receipt(kiosk_id, total, ctx.now)
+    fiscal_params = {
+        "total": total,
+        "fnNumber": register["fnNumber"],
+        "registrationNumber": register["registrationNumber"],
+        "fiscalDocumentNumber": register["fiscalDocumentNumber"],
+        "fiscalReceiptNumber": register["fiscalReceiptNumber"],
+        "fiscalDocumentSign": str(ids.randint("fiscal.document_sign", 1000000000, 9999999999)),
+        "fiscalDocumentDateTime": ctx.now.strftime("%Y-%m-%dT%H:%M:%S"),
+        "shiftNumber": register["shiftNumber"],
+        "fnsUrl": "www.nalog.gov.ru"
+    }
+    if receipt is not None:
+        fiscal_params["items"] = receipt["items"]
+        fiscal_params["vats"] = receipt["vats"]
+    return {"success": True, "error": None, "fiscalParams": fiscal_params}
+
+
+# Mocks backed by the payment transaction store
+PAYMENT_MOCKS = ("payment", "qr_first_provider")
+
+# Built-in mock definitions, in the order services are listed in status, config and the bot
+BUILTIN_MOCKS = [
+    MockDefinition(
+        name="payment",
+        route="/mocks/payment",
+        label="💳 Payment",
+        description="Payment Edge Mock: simulates payment terminal behavior with configurable responses.",
+        request_model=PaymentRequest,
+        response_model=PaymentResponse,
+        success=payment_success,
+        failure=payment_failure,
+        pending=payment_pending,
+        failure_status="DECLINED",
+        ids={
+            "payment_id": storage.get_next_payment_id
+        },
+        on_result=record_payment
+    ),
+    MockDefinition(
+        name="qr_first_provider",
+        route="/mocks/QRFirtsProvider",
+        label="📲 QR First Provider",
+        description="QR First Provider Mock: QR-based payment method, behaves like the Payment Edge mock.",
+        request_model=PaymentRequest,
+        response_model=PaymentResponse,
+        success=payment_success,
+        failure=payment_failure,
+        pending=payment_pending,
+        failure_status="DECLINED",
+        ids={
+            "payment_id": storage.get_next_qr_payment_id
+        },
+        on_result=record_payment
+    ),
+    MockDefinition(
+        name="fiscal",
+        route="/mocks/fiscal",
+        label="🧾 Fiscal",
+        description="Fiscal Edge Mock (OLD FORMAT): simulates fiscal printer behavior with configurable responses.",
+        request_model=FiscalRequest,
+        response_model=Union[FiscalSuccessResponse, FiscalFailureResponse],
+        success=fiscal_success,
+        failure={
+            "status": "NOT_OK",
+            "error_code": "FISCAL_ERR_01",
+            "error_message": "Fiscalization failed: OFD communication error (simulated)"
+        },
+        success_status="OK",
+        failure_status="NOT_OK",
+        ids={"fiscal_document_number": storage.get_next_fiscal_doc_number}
+    ),
+    MockDefinition(
+        name="fiscal_receipt",
+        service="fiscal",
+        route="/mocks/fiscal_receipt",
+        description="Fiscal Receipt Mock (NEW FORMAT - Tolerant): accepts any JSON and returns the real API format.",
+        success=fiscal_receipt_success,
+        failure={
             "success": False,
             "error": {
                 "code": 44,
@@ -367,185 +394,372 @@ async def handle_new_fiscal_request(request_data: dict) -> dict:
             },
             "fiscalParams": None
         }
-        status = "FAILURE"
-
-    # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="fiscal",
-        request=request_data,
-        response=response,
-        mode=config.mode.value,
-        status=status
+    ),
+    MockDefinition(
+        name="kds",
+        route="/mocks/kds",
+        label="🍽 KDS",
+        description="KDS (Kitchen Display System) Mock: tolerant to any input JSON format.",
+        success={
+            "status": "OK",
+            "kds_ticket_id": "${id.kds_ticket_id}",
+            "received_at": "${now}"
+        },
+        failure={
+            "status": "NOT_OK",
+            "error_code": "KDS_ERR_01",
+            "error_message": "KDS reject: kitchen busy (simulated)"
+        },
+        success_status="OK",
+        failure_status="NOT_OK",
+        default_response="OK",
+        ids={"kds_ticket_id": storage.get_next_kds_ticket_id}
+    ),
+    MockDefinition(
+        name="printer",
+        route="/mocks/printer",
+        label="🖨 Printer",
+        description="Printer Mock (Tolerant): accepts any JSON and returns the real API format.",
+        success={
+            "success": True,
+            "error": None
+        },
+        failure={
+            "success": False,
+            "error": "Printer communication error"
+        }
     )
-    storage.add_log(log)
+]
 
-    # Send instant notification
-    await send_log_notification(log)
 
-    return response
+def register_mock(definition: MockDefinition, replace: bool = False):
+    """Register a mock definition and create its service config if it is new"""
+    registry.register(definition, replace)
+    storage.ensure_config(definition.service, definition.default_response)
+
+
+for _definition in BUILTIN_MOCKS:
+    register_mock(_definition)
+
 
+# Single dispatcher shared by all mock endpoints
 
-async def handle_printer_request(request_data: dict) -> dict:
+def parse_request(definition: MockDefinition, body, model=None):
+    """Validate the body against the definition's request model; tolerant mocks take it as is"""
+    if model is not None:
+        return model.dict(), model
+    if definition.request_model is None:
+        return body, None
+    try:
+        model = definition.request_model.model_validate(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return model.dict(), model
+
+
+async def dispatch(definition: MockDefinition, body, model=None, traceparent: Optional[str] = None):
     """
-    Handle printer request (tolerant to any input).
-    Returns response matching real API format.
+    Serve one mock request: delay, decide the outcome by mode, render the
+    compiled success/failure template, run the result hook, log and notify.
+
+    Returns the response dict, or a StreamedJSONResponse when the service is
+    configured to stream (FastAPI passes Response objects through).
+
+    body is the raw JSON body; model an already validated request model, if any.
+    traceparent is the caller's W3C trace context header; each stage is a span.
     """
-    config = storage.get_config("printer")
+    root = start_trace(f"POST {definition.route}", traceparent, **{"mock.name": definition.name})
+    with root, census.track("requests"):
+        with span("parse"):
+            request_data, model = parse_request(definition, body, model)
+        ctx = MockContext(definition, storage.get_snapshot(), request_data, model, datetime.now(timezone.utc))
+        config = ctx.config
+        root.set("mock.mode", config.mode.value)
+        root.set("config.version", ctx.config_version)
+
+        if config.async_lifecycle and definition.render_pending is not None:
+            with span("start_async"):
+                return start_async_request(ctx)
+
+        # Apply delay if configured
+        if config.delay_seconds > 0:
+            with span("delay", seconds=config.delay_seconds), census.track("delayed"):
+                await asyncio.sleep(config.delay_seconds)
+
+        # Determine response type based on mode
+        with span("determine_response"):
+            response_status, fault = split_outcome(
+                definition.service, config, await determine_response(definition.service, config, request_data)
+            )
+        root.set("mock.outcome", fault.value if fault else response_status.value)
 
-    # Apply delay if configured
-    if config.delay_seconds > 0:
-        await asyncio.sleep(config.delay_seconds)
+        # Check for service unavailable
+        if response_status == ResponseStatus.UNAVAILABLE:
+            raise HTTPException(status_code=503, detail="Service Unavailable")
 
-    # Determine response type based on mode
-    response_status = await determine_response("printer", config, request_data)
+        ctx.now = datetime.now(timezone.utc)
+        with span("render"):
+            response, status = render_result(ctx, response_status)
+        if definition.on_result:
+            with span("on_result"):
+                definition.on_result(ctx, response, response_status)
 
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
+        if fault is not None:
+            await log_result(ctx, response, fault.value)
+            raise MockFault(fault, response)
 
-    should_succeed = response_status == ResponseStatus.SUCCESS
+        await log_result(ctx, response, status)
+        if config.stream_chunk_bytes:
+            return StreamedJSONResponse(response, config.stream_chunk_bytes, config.stream_chunk_interval)
+        return response
 
-    now = datetime.now(timezone.utc)
 
-    if should_succeed:
-        response = {
-            "success": True,
-            "error": None
-        }
-        status = "SUCCESS"
-    else:
-        response = {
-            "success": False,
-            "error": "Printer communication error"
-        }
-        status = "FAILURE"
+def split_outcome(service: str, config, outcome) -> Tuple[ResponseStatus, Optional[FaultType]]:
+    """
+    (response status, delivery fault) for an outcome from determine_response.
+
+    A fault chosen by the mode (a SEQUENCE entry or manual response) delivers a
+    success response; otherwise the service's fault is applied at fault_rate.
+    """
+    if isinstance(outcome, FaultType):
+        return ResponseStatus.SUCCESS, outcome
+    if config.fault is not None and outcome != ResponseStatus.UNAVAILABLE:
+        if config.fault_rate >= 1.0 or ids.random(f"fault.{service}") < config.fault_rate:
+            return outcome, config.fault
+    return outcome, None
+
 
+def render_result(ctx: MockContext, response_status: ResponseStatus):
+    """Returns (response, logged status) for a decided outcome"""
+    definition = ctx.definition
+    if response_status == ResponseStatus.SUCCESS:
+        response = definition.render_success(ctx)
+        # A success builder may refuse the request itself (e.g. a receipt that does not add up)
+        return response, ctx.values.get("status", definition.success_status)
+    return definition.render_failure(ctx), definition.failure_status
+
+
+async def log_result(ctx: MockContext, response: dict, status: str):
     # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="printer",
-        request=request_data,
+    log = LogRecord(
+        at=ctx.now.timestamp(),
+        service=ctx.service,
+        mode=ctx.config.mode.value,
+        status=status,
+        request=ctx.request if isinstance(ctx.request, dict) else {"body": ctx.request},
         response=response,
-        mode=config.mode.value,
-        status=status
+        config_version=ctx.config_version,
+        duration_ms=round((ctx.now - ctx.started_at).total_seconds() * 1000, 3)
     )
-    storage.add_log(log)
+    with span("log"):
+        storage.add_log(log)
 
     # Send instant notification
-    await send_log_notification(log)
+    with span("notify"):
+        await send_log_notification(log)
 
-    return response
 
-
-async def handle_kds_request(request_data: dict) -> dict:
+def start_async_request(ctx: MockContext) -> dict:
     """
-    Handle KDS request (tolerant to any input).
-    Returns response matching real KDS API format.
+    Answer with the pending template right away and let a timer finish the request.
+
+    No coroutine is held while the simulated device works: a loop timer fires
+    after delay_seconds and only then starts the completion task, whose result is
+    stored by the on_result hook and pushed to callback_url if the request has one.
     """
-    config = storage.get_config("kds")
+    definition = ctx.definition
+    pending = definition.render_pending(ctx)
+    if definition.on_result:
+        definition.on_result(ctx, pending, None)
+
+    census.add("async_pending")
+    asyncio.get_running_loop().call_later(
+        ctx.config.delay_seconds,
+        lambda: spawn_background(complete_async_request(ctx))
+    )
 
-    # Apply delay if configured
-    if config.delay_seconds > 0:
-        await asyncio.sleep(config.delay_seconds)
+    return pending
 
-    # Determine response type based on mode
-    response_status = await determine_response("kds", config, request_data)
 
-    # Check for service unavailable
-    if response_status == ResponseStatus.UNAVAILABLE:
-        raise HTTPException(status_code=503, detail="Service Unavailable")
+async def complete_async_request(ctx: MockContext):
+    """Timer callback of the async lifecycle: decide the outcome, store it, log it and push the callback"""
+    census.add("async_pending", -1)
+    definition = ctx.definition
+    txn = ctx.values.get("transaction")
+    if txn is not None and txn.state != TransactionState.PENDING:
+        # Cancelled by the kiosk while the terminal was working
+        return
 
-    should_succeed = response_status == ResponseStatus.SUCCESS
+    # Runs in the context copied when the timer was set, so these spans join the request's trace
+    with span("complete_async"):
+        with span("determine_response"):
+            outcome = await determine_response(definition.service, ctx.config, ctx.request)
+        # The status is polled or called back, so delivery faults do not apply here
+        response_status = ResponseStatus.SUCCESS if isinstance(outcome, FaultType) else outcome
+        ctx.now = datetime.now(timezone.utc)
 
-    now = datetime.now(timezone.utc)
+        if response_status == ResponseStatus.UNAVAILABLE:
+            # Device unreachable: polling gets 503, no callback is sent
+            if definition.on_result:
+                definition.on_result(ctx, None, response_status)
+            return
 
-    if should_succeed:
-        response = {
-            "status": "OK",
-            "kds_ticket_id": storage.get_next_kds_ticket_id(),
-            "received_at": now.isoformat()
-        }
-        status = "OK"
-    else:
-        response = {
-            "status": "NOT_OK",
-            "error_code": "KDS_ERR_01",
-            "error_message": "KDS reject: kitchen busy (simulated)"
-        }
-        status = "NOT_OK"
+        with span("render"):
+            response, status = render_result(ctx, response_status)
+        if definition.on_result:
+            with span("on_result"):
+                if not definition.on_result(ctx, response, response_status):
+                    return
 
-    # Log the request
-    log = LogEntry(
-        timestamp=now.isoformat(),
-        service="kds",
+        await log_result(ctx, response, status)
+
+        callback_url = ctx.field("callback_url")
+        if callback_url:
+            with span("callback"):
+                await send_result_callback(callback_url, response)
+
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks = set()
+
+
+def spawn_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def background_task_count() -> int:
+    return len(_background_tasks)
+
+
+_callback_client = None
+
+
+async def send_result_callback(url: str, payload: dict):
+    """POST the final async result to the kiosk's callback URL over a shared pooled client"""
+    global _callback_client
+    if _callback_client is None:
+        _callback_client = httpx.AsyncClient(timeout=10)
+
+    try:
+        await _callback_client.post(url, json=payload)
+    except Exception as e:
+        print(f"❌ Error sending payment callback to {url}: {e}")
+
+
+async def close_callback_client():
+    global _callback_client
+    if _callback_client is not None:
+        await _callback_client.aclose()
+        _callback_client = None
+
+
+# Payment status as seen by the kiosk for each transaction state
+TRANSACTION_STATUS = {
+    TransactionState.AUTHORIZED: "SUCCESS",
+    TransactionState.DECLINED: "DECLINED",
+    TransactionState.PENDING: "PENDING",
+    TransactionState.PARTIALLY_REFUNDED: "PARTIALLY_REFUNDED",
+    TransactionState.REFUNDED: "REFUNDED",
+    TransactionState.CANCELLED: "CANCELLED"
+}
+
+
+def payment_status_response(txn: Transaction) -> dict:
+    """Stored payment response with its status reflecting refunds and cancels"""
+    status = TRANSACTION_STATUS[txn.state]
+    if txn.response["status"] == status:
+        return txn.response
+    return {**txn.response, "status": status}
+
+
+async def refund_payment(service: str, txn: Transaction, amount: int = None) -> Transaction:
+    """Refund an authorized payment (raises TransactionError on an invalid transition)"""
+    refunded_before = txn.refunded_amount
+    storage.transactions.refund(txn, amount)
+    # A full refund is sent without an amount: log what was refunded, for the stats and the export
+    amount = txn.refunded_amount - refunded_before
+    await log_transaction_change(service, txn, {"payment_id": txn.payment_id, "operation": "refund", "amount": amount})
+    return txn
+
+
+async def cancel_payment(service: str, txn: Transaction) -> Transaction:
+    """Cancel a pending or authorized payment (raises TransactionError on an invalid transition)"""
+    storage.transactions.cancel(txn)
+    await log_transaction_change(service, txn, {"payment_id": txn.payment_id, "operation": "cancel"})
+    return txn
+
+
+async def log_transaction_change(service: str, txn: Transaction, request_data: dict):
+    snapshot = storage.get_snapshot()
+    log = LogRecord(
+        at=time.time(),
+        service=service,
+        mode=snapshot.get(service).mode.value,
+        status=txn.state.value,
         request=request_data,
-        response=response,
-        mode=config.mode.value,
-        status=status
+        response=txn.to_dict(),
+        config_version=snapshot.version
     )
     storage.add_log(log)
-
-    # Send instant notification
     await send_log_notification(log)
 
-    return response
 
-    return response
+def manual_response_status(response: str) -> Union[ResponseStatus, FaultType]:
+    """Map a manual (or default) response string to ResponseStatus, or the FaultType it names"""
+    fault = parse_fault(response)
+    if fault is not None:
+        return fault
+    if response == "UNAVAILABLE":
+        return ResponseStatus.UNAVAILABLE
+    elif response in ["SUCCESS", "OK"]:
+        return ResponseStatus.SUCCESS
+    return ResponseStatus.FAILURE
 
 
-async def determine_response(service: str, config, request_data: dict = None) -> ResponseStatus:
-    """Determine if the response should be successful based on the service mode"""
+async def determine_response(service: str, config, request_data: dict = None) -> Union[ResponseStatus, FaultType]:
+    """Determine if the response should be successful based on the service mode, or the fault to deliver it with"""
     if config.mode == ServiceMode.AUTO_SUCCESS:
         return ResponseStatus.SUCCESS
     elif config.mode == ServiceMode.AUTO_FAILURE:
         return ResponseStatus.FAILURE
     elif config.mode == ServiceMode.SEQUENCE:
-        response = storage.get_next_sequence_response(service)
-        return ResponseStatus.SUCCESS if response == "SUCCESS" else ResponseStatus.FAILURE
+        response = storage.get_next_sequence_response(service, config)
+        if response == "SUCCESS":
+            return ResponseStatus.SUCCESS
+        return parse_fault(response) or ResponseStatus.FAILURE
     elif config.mode == ServiceMode.MANUAL:
         # Create pending request for manual handling
-        request_id = str(uuid.uuid4())
+        request_id = ids.uuid4("manual.request_id")
         pending = PendingRequest(
             request_id=request_id,
             service=service,
             request_data=request_data or {},
             created_at=datetime.now(timezone.utc)
         )
-        storage.add_pending_request(pending)
+        waiter = storage.add_pending_request(pending)
 
         # Send notification to Telegram
         if _bot_app:
             await send_manual_request_notification(service, request_id, request_data or {})
 
         # Wait for response with timeout
-        timeout = config.timeout_seconds
-        start_time = datetime.now(timezone.utc)
-
-        while (datetime.now(timezone.utc) - start_time).total_seconds() < timeout:
-            # Check if response received
-            response_key = f"manual_response_{request_id}"
-            if response_key in storage.manual_responses:
-                response = storage.manual_responses[response_key]
-                del storage.manual_responses[response_key]
-                storage.remove_pending_request(request_id)
-
-                # Map response to ResponseStatus
-                if response == "UNAVAILABLE":
-                    return ResponseStatus.UNAVAILABLE
-                elif response in ["SUCCESS", "OK"]:
-                    return ResponseStatus.SUCCESS
-                else:
-                    return ResponseStatus.FAILURE
-
-            await asyncio.sleep(0.5)
-
-        # Timeout - use default response
-        storage.remove_pending_request(request_id)
-        if config.default_response in ["SUCCESS", "OK"]:
-            return ResponseStatus.SUCCESS
-        else:
-            return ResponseStatus.FAILURE
+        try:
+            response = await asyncio.wait_for(waiter, timeout=config.timeout_seconds)
+        except asyncio.TimeoutError:
+            # Timeout - use default response
+            storage.remove_pending_request(request_id)
+            if config.default_response in ["SUCCESS", "OK"]:
+                return ResponseStatus.SUCCESS
+            return parse_fault(config.default_response) or ResponseStatus.FAILURE
+        except asyncio.CancelledError:
+            # Client went away while waiting
+            storage.remove_pending_request(request_id)
+            raise
+
+        return manual_response_status(response)
 
     return ResponseStatus.SUCCESS
 
@@ -585,21 +799,19 @@ async def send_manual_request_notification(service: str, request_id: str, reques
         f"Choose response:"
     )
 
-    # Send to all admins
+    # Queue for all admins at once; the outbox delivers concurrently ahead of log notifications
     for admin_id in TELEGRAM_ADMIN_IDS:
-        try:
-            await _bot_app.bot.send_message(
-                chat_id=admin_id,
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode="Markdown"
-            )
-            print(f"✅ Sent manual request to admin {admin_id}")
-        except Exception as e:
-            print(f"❌ Error sending manual request notification to {admin_id}: {e}")
+        outbox.submit(
+            admin_id,
+            "send_message",
+            priority=PRIORITY_MANUAL,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode="Markdown"
+        )
 
 
-async def send_log_notification(log: LogEntry):
+async def send_log_notification(log: LogRecord):
     """Send log notification to admin via Telegram"""
     if not _bot_app:
         return
@@ -609,22 +821,34 @@ async def send_log_notification(log: LogEntry):
     if not TELEGRAM_ADMIN_IDS:
         return
 
-    emoji = "✅" if log.status in ["SUCCESS", "OK"] else "❌"
-    time = datetime.fromisoformat(log.timestamp).strftime("%H:%M:%S")
+    # Per the service's notification policy; entries not sent on their own are only counted
+    if not notifier.should_send(log):
+        return
 
+    emoji = "✅" if log.status in ["SUCCESS", "OK"] else "❌"
     text = (
         f"{emoji} *{log.service.upper()}* - {log.status}\n"
-        f"Time: `{time}`\n"
+        f"Time: `{log.time.strftime('%H:%M:%S')}`\n"
         f"Mode: `{log.mode}`"
     )
 
-    # Send to all admins
+    # Queue for all admins; dropped by the outbox if the log backlog is full
     for admin_id in TELEGRAM_ADMIN_IDS:
-        try:
-            await _bot_app.bot.send_message(
-                chat_id=admin_id,
-                text=text,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(f"Error sending log notification to {admin_id}: {e}")
+        outbox.submit(
+            admin_id,
+            "send_message",
+            priority=PRIORITY_LOG,
+            text=text,
+            parse_mode="Markdown"
+        )
+
+
+async def send_bulk_resolution_summary(resolved: list, response: str):
+    """Show a bulk manual resolution in the admins' pending list messages, without waiting for Telegram"""
+    if not _bot_app:
+        return
+
+    from telegram_bot import show_bulk_result
+
+    # On the bot's loop (the control lane's, if enabled), where its outbox futures live
+    spawn_background(control.run(show_bulk_result(resolved, response)))
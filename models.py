@@ -1,6 +1,6 @@
 from enum import Enum
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Union
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
@@ -17,24 +17,66 @@ class ResponseStatus(str, Enum):
     UNAVAILABLE = "UNAVAILABLE"
 
 
+class FaultType(str, Enum):
+    """Broken deliveries of a rendered response, injected at the ASGI level"""
+    RESET = "RESET"  # Connection reset, no response
+    TRUNCATED = "TRUNCATED"  # Full Content-Length, half the body, then the connection closes
+    INVALID_JSON = "INVALID_JSON"  # 200 with a body that does not parse
+    WRONG_CONTENT_TYPE = "WRONG_CONTENT_TYPE"  # Valid JSON served as text/html
+    SLOW_DRIP = "SLOW_DRIP"  # Body trickled out a few bytes at a time
+    HANG = "HANG"  # No response until the client gives up
+
+
+class NotifyPolicy(str, Enum):
+    """Which logged requests of a service are sent to Telegram"""
+    ALL = "ALL"  # Every request
+    FAILURES = "FAILURES"  # Only requests that did not succeed
+    SAMPLED = "SAMPLED"  # One in notify_sample requests
+    SUMMARY = "SUMMARY"  # Counts and rates in one periodic message (NOTIFY_SUMMARY_INTERVAL)
+    OFF = "OFF"
+
+
+class TransactionState(str, Enum):
+    PENDING = "PENDING"
+    AUTHORIZED = "AUTHORIZED"
+    DECLINED = "DECLINED"
+    UNAVAILABLE = "UNAVAILABLE"
+    PARTIALLY_REFUNDED = "PARTIALLY_REFUNDED"
+    REFUNDED = "REFUNDED"
+    CANCELLED = "CANCELLED"
+
+
 class SequenceConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     success_count: int
     failure_count: int
-    remaining: List[str] = []
+    fault_counts: Dict[FaultType, int] = {}  # Faults shuffled into the sequence with the outcomes
 
 
 class ServiceConfig(BaseModel):
+    # Published in immutable snapshots; change with model_copy(update=...) and storage.update_config
+    model_config = ConfigDict(frozen=True)
+
     mode: ServiceMode
     timeout_seconds: int = 30
     default_response: str = "SUCCESS"
     sequence_config: Optional[SequenceConfig] = None
     delay_seconds: int = 0
+    async_lifecycle: bool = False  # Payment mocks: answer PENDING at once, finish after delay_seconds
+    fault: Optional[FaultType] = None  # Deliver responses of any mode with this fault...
+    fault_rate: float = Field(1.0, ge=0.0, le=1.0)  # ...this share of the time
+    stream_chunk_bytes: int = Field(0, ge=0)  # >0: send responses chunked, in pieces of this size...
+    stream_chunk_interval: float = Field(0.0, ge=0.0)  # ...this many seconds apart (simulated slow link)
+    notify: Optional[NotifyPolicy] = None  # Telegram log notifications; None: the mode's default (NOTIFY_DEFAULTS)
+    notify_sample: int = Field(10, ge=1)  # SAMPLED: notify one in this many requests
 
 
 class PaymentRequest(BaseModel):
     kiosk_id: str
     order_id: int
     sum: int
+    callback_url: Optional[str] = None  # Async lifecycle: final result is POSTed here
 
 
 class PaymentResponse(BaseModel):
@@ -59,6 +101,10 @@ class PaymentResponse(BaseModel):
     merchant_receipt: Optional[str] = None
 
 
+class RefundRequest(BaseModel):
+    amount: Optional[int] = None  # None refunds the remaining amount
+
+
 # Old fiscal models (kept for backwards compatibility)
 class FiscalItem(BaseModel):
     item_id: int
@@ -184,14 +230,19 @@ class LogEntry(BaseModel):
     response: Dict[str, Any]
     mode: str
     status: str
+    config_version: Optional[int] = None  # Config snapshot that produced this result
+    duration_ms: Optional[float] = None  # From arrival to result, including the configured delay
+
+
+class BulkResolveRequest(BaseModel):
+    response: str = "SUCCESS"  # SUCCESS / FAILURE / UNAVAILABLE
+    service: Optional[str] = None  # Only this service's pending requests
+    oldest: Optional[int] = None  # Only the oldest N pending requests
 
 
-class ConfigUpdateRequest(BaseModel):
-    payment: Optional[ServiceConfig] = None
-    qr_first_provider: Optional[ServiceConfig] = None
-    fiscal: Optional[ServiceConfig] = None
-    kds: Optional[ServiceConfig] = None
-    printer: Optional[ServiceConfig] = None
+class SeedRequest(BaseModel):
+    seed: Optional[Union[int, str]] = None  # None restores OS randomness
+    namespace: Optional[str] = None  # e.g. "payment.rrn"; None reseeds all namespaces
 
 
 class PendingRequest(BaseModel):
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+from models import NotifyPolicy, ServiceConfig, ServiceMode
+from log_record import LogRecord
+from stats import SUCCESS_STATUSES
+from storage import storage
+from telegram_outbox import outbox, PRIORITY_LOG
+
+# Notification policy of each mode, for services whose config does not set notify
+NOTIFY_DEFAULTS = os.getenv("NOTIFY_DEFAULTS", "AUTO_SUCCESS=SUMMARY,AUTO_FAILURE=SUMMARY,SEQUENCE=SUMMARY,MANUAL=ALL")
+# Seconds between summary messages of SUMMARY services
+NOTIFY_SUMMARY_INTERVAL = float(os.getenv("NOTIFY_SUMMARY_INTERVAL", "60"))
+
+
+def parse_defaults(value: str) -> Dict[str, NotifyPolicy]:
+    """"MODE=POLICY,..." over the built-in defaults; every mode not listed notifies ALL"""
+    defaults = {mode.value: NotifyPolicy.ALL for mode in ServiceMode}
+    for item in value.split(","):
+        mode, _, policy = item.partition("=")
+        if mode.strip():
+            defaults[mode.strip()] = NotifyPolicy(policy.strip())
+    return defaults
+
+
+class _ServiceCounts:
+    __slots__ = ("seen", "statuses")
+
+    def __init__(self):
+        self.seen = 0  # Requests ever counted, for SAMPLED
+        self.statuses: Dict[str, int] = {}  # SUMMARY: requests by status since the last summary
+
+
+class LogNotifier:
+    """
+    Decides which log entries are sent to the Telegram admins.
+
+    Each service follows its config's notify policy, or its mode's default.
+    Nothing is queued for entries that are not sent: a sampled or summarized
+    entry only bumps a counter, and a SUMMARY service's counters are turned
+    into one message per NOTIFY_SUMMARY_INTERVAL, for all services together.
+    Counting (mock loop) and summarizing (the outbox's loop) share a lock.
+    """
+
+    def __init__(self, defaults: Dict[str, NotifyPolicy], interval: float = NOTIFY_SUMMARY_INTERVAL):
+        self.defaults = defaults
+        self.interval = interval
+        self.suppressed = 0  # Entries not sent individually
+        self._counts: Dict[str, _ServiceCounts] = {}
+        self._since = time.monotonic()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def policy(self, config: Optional[ServiceConfig], mode: str) -> NotifyPolicy:
+        if config is not None and config.notify is not None:
+            return config.notify
+        return self.defaults.get(mode, NotifyPolicy.ALL)
+
+    def should_send(self, log: LogRecord) -> bool:
+        """Count the entry; True if it is to be sent on its own"""
+        service = log.service
+        config = storage.get_config(service)
+        policy = self.policy(config, log.mode)
+        if policy == NotifyPolicy.ALL:
+            return True
+        if policy == NotifyPolicy.FAILURES:
+            send = log.status not in SUCCESS_STATUSES
+        elif policy == NotifyPolicy.SAMPLED:
+            with self._lock:
+                counts = self._service_counts(service)
+                counts.seen += 1
+                send = (counts.seen - 1) % config.notify_sample == 0
+        elif policy == NotifyPolicy.SUMMARY:
+            with self._lock:
+                statuses = self._service_counts(service).statuses
+                statuses[log.status] = statuses.get(log.status, 0) + 1
+            send = False
+        else:
+            send = False
+        if not send:
+            self.suppressed += 1
+        return send
+
+    def _service_counts(self, service: str) -> _ServiceCounts:
+        counts = self._counts.get(service)
+        if counts is None:
+            counts = self._counts[service] = _ServiceCounts()
+        return counts
+
+    def take_counts(self) -> Optional[Tuple[float, Dict[str, Dict[str, int]]]]:
+        """(seconds, {service: {status: count}}) since the previous call, which are reset; None if nothing was counted"""
+        now = time.monotonic()
+        with self._lock:
+            taken = {service: counts.statuses for service, counts in self._counts.items() if counts.statuses}
+            for counts in self._counts.values():
+                counts.statuses = {}
+            elapsed, self._since = now - self._since, now
+        return (elapsed, taken) if taken else None
+
+    def send_summary(self):
+        from telegram_bot import TELEGRAM_ADMIN_IDS, format_notification_summary
+
+        counted = self.take_counts()
+        if counted is None:
+            return
+        text = format_notification_summary(*counted)
+        for admin_id in TELEGRAM_ADMIN_IDS:
+            outbox.submit(admin_id, "send_message", priority=PRIORITY_LOG, text=text, parse_mode="Markdown")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.send_summary()
+            except Exception as e:
+                print(f"❌ Error sending notification summary: {e}")
+
+    async def start(self):
+        """Send summaries every interval seconds, on the calling loop (the outbox's)"""
+        if self.interval > 0 and self._task is None:
+            self._since = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global notifier
+notifier = LogNotifier(parse_defaults(NOTIFY_DEFAULTS))
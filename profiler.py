@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from health import LoopLagMonitor, loop_lag
+
+# Event loop blocked longer than this is reported as a slow callback (0 disables the watchdog)
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "100"))
+PROFILE_MAX_SECONDS = 60
+
+Frame = Tuple[str, str, int]  # (function, file, line)
+
+
+def thread_stack(thread_id: int) -> List[Frame]:
+    """Current stack of a thread, outermost frame first"""
+    frame = sys._current_frames().get(thread_id)
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def frame_label(frame: Frame) -> str:
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the event loop thread.
+
+    A helper thread reads the loop thread's stack every interval, so the loop
+    itself runs uninstrumented; the cost is one stack walk per sample. Time the
+    loop spends waiting for I/O shows up under the selector (or uvloop) frames.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def sample(self, thread_id: int, seconds: float, interval: float) -> Tuple[Dict[Tuple[Frame, ...], int], float]:
+        """Blocking: returns ({stack: samples}, elapsed seconds)"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running")
+            self.running = True
+
+        counts: Dict[Tuple[Frame, ...], int] = {}
+        started = time.monotonic()
+        deadline = started + min(seconds, PROFILE_MAX_SECONDS)
+        try:
+            while time.monotonic() < deadline:
+                stack = tuple(thread_stack(thread_id))
+                if stack:
+                    counts[stack] = counts.get(stack, 0) + 1
+                time.sleep(interval)
+        finally:
+            self.running = False
+        return counts, time.monotonic() - started
+
+    async def profile(
+        self, seconds: float, interval: float, thread_id: Optional[int] = None
+    ) -> Tuple[Dict[Tuple[Frame, ...], int], float]:
+        """Profile an event loop's thread (default: the calling one) for seconds without blocking it"""
+        thread_id = thread_id or threading.get_ident()
+        return await asyncio.get_running_loop().run_in_executor(None, self.sample, thread_id, seconds, interval)
+
+
+def to_collapsed(counts: Dict[Tuple[Frame, ...], int]) -> str:
+    """Brendan Gregg's collapsed stack format, input for flamegraph.pl, speedscope or inferno"""
+    return "".join(
+        ";".join(frame_label(frame) for frame in stack) + f" {count}\n"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    )
+
+
+def to_speedscope(counts: Dict[Tuple[Frame, ...], int], interval: float, name: str) -> dict:
+    """Sampled profile in the speedscope file format (https://www.speedscope.app)"""
+    frames: List[dict] = []
+    index: Dict[Frame, int] = {}
+    samples, weights = [], []
+    for stack, count in counts.items():
+        sample = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            sample.append(index[frame])
+        samples.append(sample)
+        weights.append(count * interval * 1000)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "unified-mocks",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }]
+    }
+
+
+class SlowCallbackMonitor:
+    """
+    Detects callbacks that block the event loop.
+
+    It follows the loop's heartbeat (health.LoopLagMonitor, which then probes
+    at least every threshold/2): a watchdog thread that sees a probe overdue
+    by more than the threshold captures the loop thread's stack and current task while the
+    callback is still running, so the culprit (a mock handler, a Telegram task
+    or anything else on the loop) is named. The late probe then records how
+    long the loop was blocked. Unlike asyncio debug mode this adds no
+    per-callback overhead.
+    """
+
+    def __init__(self, heartbeat: LoopLagMonitor, threshold_ms: float = SLOW_CALLBACK_MS):
+        self.heartbeat = heartbeat
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 2
+        self.events: deque = deque(maxlen=100)
+        self.count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._open_event: Optional[dict] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    async def start(self):
+        """Watch the calling loop; its heartbeat is started (or already running) on the same loop"""
+        if not self.enabled or self._watchdog is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self.heartbeat.subscribe(self._on_probe, self.interval)
+        self._watchdog = threading.Thread(target=self._watch, name="slow-callback-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._watchdog is None:
+            return
+        self._stop.set()
+        self.heartbeat.unsubscribe(self._on_probe)
+        self._watchdog.join()
+        self._watchdog = None
+
+    def _on_probe(self, lag: float):
+        event = self._open_event
+        if event is not None:
+            event["blocked_ms"] = round(lag * 1000, 1)
+            self._open_event = None
+        elif lag > self.threshold:
+            # Blocked, but the watchdog did not get to run meanwhile
+            self._record({"blocked_ms": round(lag * 1000, 1), "task": None, "stack": []})
+
+    def _record(self, event: dict):
+        event["detected_at"] = time.time()
+        self.events.append(event)
+        self.count += 1
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            late = time.monotonic() - self.heartbeat.expected
+            if late > self.threshold and self._open_event is None:
+                task = asyncio.current_task(self._loop)
+                event = {
+                    "blocked_ms": None,  # Filled in by the next heartbeat
+                    "task": task.get_name() if task else None,
+                    "stack": [frame_label(frame) for frame in thread_stack(self._thread_id)]
+                }
+                self._open_event = event
+                self._record(event)
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "count": self.count,
+            "events": list(self.events)
+        }
+
+
+# Global instances
+profiler = SamplingProfiler()
+slow_callbacks = SlowCallbackMonitor(loop_lag)
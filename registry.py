@@ -0,0 +1,272 @@
+import re
+import itertools
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Type
+from pydantic import BaseModel
+from idgen import ids as id_provider
+
+# "${expr}" placeholders inside template strings
+_PLACEHOLDER = re.compile(r"\$\{([^}]+)\}")
+
+
+class MockContext:
+    """Per-request values available to templates, builders and hooks"""
+    __slots__ = ("definition", "config", "config_version", "request", "model", "now", "started_at", "values")
+
+    def __init__(self, definition: "MockDefinition", snapshot, request: Any, model: Optional[BaseModel], now: datetime):
+        # The config snapshot captured when the request arrived, used for its whole life
+        self.definition = definition
+        self.config = snapshot.get(definition.service)
+        self.config_version = snapshot.version
+        self.request = request
+        self.model = model
+        self.now = now
+        self.started_at = now
+        self.values: Dict[str, Any] = {}
+
+    @property
+    def service(self) -> str:
+        return self.definition.service
+
+    def id(self, name: str):
+        """Value of the named ID generator, generated once per request"""
+        if name not in self.values:
+            self.values[name] = self.definition.ids[name]()
+        return self.values[name]
+
+    def field(self, path: str, default=None):
+        """Dotted lookup in the (tolerant) request body"""
+        value = self.request
+        for part in path.split("."):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+
+def _compile_expression(expr: str) -> Callable[[MockContext], Any]:
+    expr = expr.strip()
+    if expr == "now":
+        return lambda ctx: ctx.now.isoformat()
+    if expr.startswith("now:"):
+        fmt = expr[len("now:"):]
+        return lambda ctx: ctx.now.strftime(fmt)
+    if expr == "service":
+        return lambda ctx: ctx.service
+    if expr.startswith("id."):
+        name = expr[len("id."):]
+        return lambda ctx: ctx.id(name)
+    if expr.startswith("request."):
+        path = expr[len("request."):]
+        return lambda ctx: ctx.field(path)
+    raise ValueError(f"Unknown template expression: ${{{expr}}}")
+
+
+def _compile(node):
+    """Returns (is_dynamic, value or render function)"""
+    if callable(node):
+        return True, node
+
+    if isinstance(node, str):
+        matches = list(_PLACEHOLDER.finditer(node))
+        if not matches:
+            return False, node
+        if len(matches) == 1 and matches[0].group(0) == node:
+            # Whole string is one placeholder: keep the value's own type
+            return True, _compile_expression(matches[0].group(1))
+        parts = _PLACEHOLDER.split(node)
+        # split() alternates literal text and expressions
+        pieces = [(i % 2 == 1, _compile_expression(p) if i % 2 == 1 else p) for i, p in enumerate(parts)]
+        return True, lambda ctx: "".join(str(p(ctx)) if dyn else p for dyn, p in pieces)
+
+    if isinstance(node, dict):
+        entries = [(key, *_compile(value)) for key, value in node.items()]
+        if not any(dyn for _, dyn, _ in entries):
+            return False, node
+        return True, lambda ctx: {key: (v(ctx) if dyn else v) for key, dyn, v in entries}
+
+    if isinstance(node, list):
+        entries = [_compile(value) for value in node]
+        if not any(dyn for dyn, _ in entries):
+            return False, node
+        return True, lambda ctx: [v(ctx) if dyn else v for dyn, v in entries]
+
+    return False, node
+
+
+def compile_template(template) -> Callable[[MockContext], Any]:
+    """
+    Compile a response template once into a render function.
+
+    A template is either a callable(ctx) or a JSON-like structure whose strings
+    may contain ${now}, ${now:<strftime>}, ${service}, ${id.<name>} or
+    ${request.<dotted.path>}. Static subtrees are shared between renders and
+    only the dynamic leaves are evaluated per request.
+    """
+    dynamic, value = _compile(template)
+    if dynamic:
+        return value
+    return lambda ctx: dict(value) if isinstance(value, dict) else value
+
+
+def build_id_generator(name: str, spec) -> Callable[[], Any]:
+    """
+    ID generator from a declarative spec:
+    {"type": "counter", "start": 1, "format": "KDS-{:04d}"},
+    {"type": "random", "min": 1, "max": 999999, "format": "{:012d}"} or {"type": "uuid"}
+    """
+    if callable(spec):
+        return spec
+
+    kind = spec.get("type", "counter")
+    fmt = spec.get("format")
+    if kind == "counter":
+        counter = itertools.count(spec.get("start", 1))
+        produce = lambda: next(counter)
+    elif kind == "random":
+        low, high = spec.get("min", 0), spec.get("max", 999999)
+        produce = lambda: id_provider.randint(name, low, high)
+    elif kind == "uuid":
+        produce = lambda: id_provider.uuid4(name)
+    else:
+        raise ValueError(f"Unknown ID generator type: {kind}")
+
+    if fmt:
+        return lambda: fmt.format(produce())
+    return produce
+
+
+class MockDefinition:
+    """
+    One mock endpoint, declared once.
+
+    service is the configuration key (several routes may share one, like the
+    old and new fiscal formats); request_model None means tolerant JSON.
+    pending enables the async lifecycle (answer at once, finish on a timer).
+    on_result(ctx, response, status) may record side effects and return False
+    to drop a result (e.g. a payment cancelled while pending).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        route: str,
+        success,
+        failure,
+        service: Optional[str] = None,
+        label: Optional[str] = None,
+        description: str = "",
+        request_model: Optional[Type[BaseModel]] = None,
+        response_model=None,
+        success_status: str = "SUCCESS",
+        failure_status: str = "FAILURE",
+        default_response: str = "SUCCESS",
+        ids: Optional[Dict[str, Any]] = None,
+        pending=None,
+        on_result: Optional[Callable] = None
+    ):
+        self.name = name
+        self.route = route
+        self.service = service or name
+        self.label = label or self.service.upper()
+        self.description = description
+        self.request_model = request_model
+        self.response_model = response_model
+        self.success_status = success_status
+        self.failure_status = failure_status
+        self.default_response = default_response
+        self.ids = {key: build_id_generator(f"{self.name}.{key}", spec) for key, spec in (ids or {}).items()}
+        self.render_success = compile_template(success)
+        self.render_failure = compile_template(failure)
+        self.render_pending = compile_template(pending) if pending is not None else None
+        self.on_result = on_result
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MockDefinition":
+        """Tolerant-JSON mock from a config file entry"""
+        return cls(
+            name=data["name"],
+            route=data.get("route", f"/mocks/{data['name']}"),
+            success=data.get("success", {"success": True}),
+            failure=data.get("failure", {"success": False}),
+            service=data.get("service"),
+            label=data.get("label"),
+            description=data.get("description", ""),
+            success_status=data.get("success_status", "SUCCESS"),
+            failure_status=data.get("failure_status", "FAILURE"),
+            default_response=data.get("default_response", "SUCCESS"),
+            ids=data.get("ids")
+        )
+
+
+class MockRegistry:
+    def __init__(self):
+        self._definitions: Dict[str, MockDefinition] = {}
+        self._listeners: List[Callable[[MockDefinition], None]] = []
+        self._reserved: List[Tuple[Pattern[str], str]] = []  # Routes the app serves itself: (path regex, path)
+
+    def register(self, definition: MockDefinition, replace: bool = False):
+        """Add a definition; replace=True swaps an existing one of the same name in place"""
+        if definition.name in self._definitions and not replace:
+            raise ValueError(f"Mock {definition.name} is already registered")
+        # The fast path and the router look mocks up by route, so one route serves one mock
+        owner = self.route_owner(definition.route)
+        if owner is not None and owner != definition.name:
+            raise ValueError(f"Route {definition.route} is already used by mock {owner}")
+        reserved = self.reserved_by(definition.route)
+        if reserved is not None:
+            raise ValueError(f"Route {definition.route} would take over the service route {reserved}")
+        self._definitions[definition.name] = definition
+        for listener in self._listeners:
+            listener(definition)
+
+    def unregister(self, name: str) -> Optional[MockDefinition]:
+        """Remove a definition; its routes answer 404 from then on"""
+        return self._definitions.pop(name, None)
+
+    def on_register(self, listener: Callable[[MockDefinition], None]):
+        """Call listener for every registered definition, including ones registered or replaced later"""
+        self._listeners.append(listener)
+        for definition in list(self._definitions.values()):
+            listener(definition)
+
+    def reserve(self, path_regex: Pattern[str], path: str):
+        """Keep mocks off a route the app serves itself (admin API, health, webhook)"""
+        self._reserved.append((path_regex, path))
+
+    def reserved_by(self, route: str) -> Optional[str]:
+        """The reserved path that route, or its GET <route>/status, would collide with; None if there is none"""
+        for path_regex, path in self._reserved:
+            if path_regex.match(route) or path_regex.match(f"{route}/status"):
+                return path
+        return None
+
+    def route_owner(self, route: str) -> Optional[str]:
+        """Name of the mock registered on route, or None"""
+        for definition in self._definitions.values():
+            if definition.route == route:
+                return definition.name
+        return None
+
+    def get(self, name: str) -> Optional[MockDefinition]:
+        return self._definitions.get(name)
+
+    def definitions(self) -> List[MockDefinition]:
+        return list(self._definitions.values())
+
+    def services(self) -> List[MockDefinition]:
+        """Primary definition of each configurable service, in registration order"""
+        seen = {}
+        for definition in self._definitions.values():
+            seen.setdefault(definition.service, definition)
+        return list(seen.values())
+
+    def service(self, service: str) -> Optional[MockDefinition]:
+        for definition in self._definitions.values():
+            if definition.service == service:
+                return definition
+        return None
+
+
+# Global registry instance
+registry = MockRegistry()
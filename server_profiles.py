@@ -0,0 +1,58 @@
+import os
+import importlib.util
+from typing import Any, Dict, Optional
+
+# Named uvicorn preset applied by `python main.py`; see "Server Profiles" in README for benchmarks
+SERVER_PROFILE = os.getenv("SERVER_PROFILE", "default")
+
+# uvicorn settings per profile. workers stays 1 in every profile: configs, logs, pending manual
+# requests and the Telegram bot live in process memory and must not be split across processes.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # uvicorn's own defaults, as started before profiles existed
+    "default": {},
+    # Few kiosks, fast answers: C loop and parser, no access log
+    "low-latency": {
+        "loop": "uvloop",
+        "http": "httptools",
+        "access_log": False,
+        "backlog": 2048,
+        "timeout_keep_alive": 5
+    },
+    # Bursts of many short connections: deep accept backlog, C parser, no access log
+    "high-concurrency": {
+        "loop": "uvloop",
+        "http": "httptools",
+        "access_log": False,
+        "backlog": 8192,
+        "timeout_keep_alive": 2
+    },
+    # Many kiosks holding keep-alive connections between sparse requests
+    "many-idle-connections": {
+        "loop": "uvloop",
+        "http": "httptools",
+        "access_log": False,
+        "backlog": 4096,
+        "timeout_keep_alive": 120
+    }
+}
+
+# Fallbacks when the optional C implementations (uvicorn[standard]) are not installed
+_FALLBACKS = {
+    ("loop", "uvloop"): ("uvloop", "asyncio"),
+    ("http", "httptools"): ("httptools", "h11")
+}
+
+
+def server_config(profile: Optional[str] = None) -> Dict[str, Any]:
+    """uvicorn.run() keyword arguments of a profile"""
+    profile = profile or SERVER_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown server profile {profile}, expected one of: {', '.join(PROFILES)}")
+
+    config = dict(PROFILES[profile])
+    for key, value in list(config.items()):
+        fallback = _FALLBACKS.get((key, value))
+        if fallback and importlib.util.find_spec(fallback[0]) is None:
+            print(f"⚠️ {fallback[0]} is not installed, profile {profile} uses {key}={fallback[1]}")
+            config[key] = fallback[1]
+    return config
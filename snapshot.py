@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import zlib
+import signal
+import asyncio
+import tempfile
+from typing import Optional
+from storage import storage
+
+# Snapshot file: restored on startup, rewritten every SNAPSHOT_INTERVAL seconds and on shutdown
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))
+# Take snapshots in a forked child (copy-on-write); 0 serializes in the event loop instead
+SNAPSHOT_FORK = os.getenv("SNAPSHOT_FORK", "1") == "1" and hasattr(os, "fork")
+# Seconds a forked child may take before it is killed and the snapshot is taken in the event loop
+SNAPSHOT_FORK_TIMEOUT = float(os.getenv("SNAPSHOT_FORK_TIMEOUT", "30"))
+
+MAGIC = b"MOCKSNAP"
+FORMAT_VERSION = 1
+
+
+def _dumps(state: dict) -> str:
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _pack(text: str) -> bytes:
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(text.encode(), 1)
+
+
+def encode(state: dict) -> bytes:
+    """Snapshot file contents: magic, format version, zlib-compressed JSON"""
+    return _pack(_dumps(state))
+
+
+def decode(data: bytes) -> dict:
+    if not data.startswith(MAGIC) or len(data) <= len(MAGIC):
+        raise ValueError("Not a mocks snapshot")
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {version}")
+    try:
+        state = json.loads(zlib.decompress(data[len(MAGIC) + 1:]))
+    except (zlib.error, ValueError) as e:
+        raise ValueError(f"Corrupt snapshot: {e}")
+    if not isinstance(state, dict):
+        raise ValueError("Corrupt snapshot: not a state mapping")
+    return state
+
+
+def _write(path: str, data: bytes):
+    # Write to a temp file and rename, so a crash never leaves a partial snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StateSnapshots:
+    """
+    Snapshots of the full mock state (storage.dump_state()), so a restart
+    continues where the previous process stopped: ID counters, sequences in
+    progress, logs, statistics, transactions, fiscal registers and seeded
+    identifier generators.
+
+    A snapshot is taken like Redis BGSAVE: the process forks, and the child
+    serializes its copy-on-write image of the state and exits. The event loop
+    pauses only for the fork itself and keeps serving while the child works.
+    Without fork (SNAPSHOT_FORK=0 or no os.fork) the state is encoded in the
+    event loop and only compression and the write run in a thread; so is a
+    snapshot whose child fails or hangs past SNAPSHOT_FORK_TIMEOUT.
+
+    The format is zlib-compressed JSON rather than pickle, so an uploaded
+    snapshot can carry data but never code.
+    """
+
+    def __init__(self, path: Optional[str], interval: float = SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last: Optional[dict] = None  # The latest snapshot taken: time, size, duration
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _fork(self, path: str):
+        pid = os.fork()
+        if pid == 0:
+            # Child: nothing but serialize and exit, without running the parent's cleanup
+            status = 1
+            try:
+                _write(path, encode(storage.dump_state()))
+                status = 0
+            except BaseException as e:
+                print(f"❌ Snapshot failed: {e}")
+            finally:
+                os._exit(status)
+
+        # Polled rather than waited on: the process has other threads (control lane, bot, to_thread
+        # workers), and a child forked while one of them held a lock can hang on it for good
+        deadline = time.monotonic() + SNAPSHOT_FORK_TIMEOUT
+        while True:
+            done, wait_status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            if time.monotonic() >= deadline:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                raise RuntimeError(f"Snapshot process did not finish in {SNAPSHOT_FORK_TIMEOUT:g}s")
+            await asyncio.sleep(0.01)
+        if os.waitstatus_to_exitcode(wait_status) != 0:
+            raise RuntimeError("Snapshot process failed")
+
+    async def _in_process(self, path: str):
+        # The state changes as requests are served, so it is encoded before the loop moves on
+        text = _dumps(storage.dump_state())
+        await asyncio.to_thread(lambda: _write(path, _pack(text)))
+
+    async def take(self, path: Optional[str] = None) -> int:
+        """Write a snapshot to path (default: SNAPSHOT_PATH); returns its size in bytes"""
+        path = path or self.path
+        async with self._lock:
+            started = time.perf_counter()
+            if SNAPSHOT_FORK:
+                try:
+                    await self._fork(path)
+                except RuntimeError as e:
+                    print(f"⚠️ {e}, taking the snapshot in the event loop")
+                    await self._in_process(path)
+            else:
+                await self._in_process(path)
+            size = os.path.getsize(path)
+            self.last = {
+                "at": time.time(),
+                "bytes": size,
+                "ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            return size
+
+    async def download(self) -> bytes:
+        """Take a snapshot now and return its contents"""
+        fd, tmp_path = tempfile.mkstemp(suffix=".snapshot")
+        os.close(fd)
+        try:
+            await self.take(tmp_path)
+            with open(tmp_path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(tmp_path)
+
+    def restore(self, data: bytes, configs: bool = True) -> dict:
+        """Replace the state with an uploaded or saved snapshot; raises ValueError if it is not one"""
+        try:
+            return storage.load_state(decode(data), configs=configs)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Incomplete snapshot: {e}")
+
+    def restore_file(self, configs: bool = True) -> bool:
+        """Restore SNAPSHOT_PATH if it exists; False if there is nothing to restore"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        started = time.perf_counter()
+        try:
+            restored = self.restore(data, configs=configs)
+        except ValueError as e:
+            # Start fresh rather than not at all; the file is overwritten by the next snapshot
+            print(f"❌ Invalid snapshot {self.path}, starting with empty state: {e}")
+            return False
+        print(
+            f"💾 Restored {self.path} in {(time.perf_counter() - started) * 1000:.0f} ms: "
+            f"{restored['logs']} logs, {restored['transactions']} transactions, "
+            f"{restored['fiscal_registers']} fiscal registers"
+        )
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.take()
+            except Exception as e:
+                print(f"❌ Error taking snapshot to {self.path}: {e}")
+
+    async def start(self):
+        """Take snapshots every interval seconds"""
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic snapshots and take a final one"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.take()
+        except Exception as e:
+            print(f"❌ Error taking final snapshot to {self.path}: {e}")
+
+
+# Global snapshots; periodic snapshots and restore on startup need SNAPSHOT_PATH
+snapshots = StateSnapshots(SNAPSHOT_PATH)
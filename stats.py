@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+# Distinct kiosks counted separately; later ones are counted under "other"
+STATS_MAX_KIOSKS = int(os.getenv("STATS_MAX_KIOSKS", "1000"))
+
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+HORIZON = 3600  # One bucket per second, enough for the longest window
+
+SUCCESS_STATUSES = frozenset({"SUCCESS", "OK", "AUTHORIZED"})
+OTHER_KIOSKS = "other"
+
+
+class RateWindow:
+    """
+    Request and success counts over sliding windows, in a ring of per-second buckets.
+
+    Each window keeps a running sum: a new entry is added to its bucket and to
+    every sum, and a bucket leaving a window is subtracted from that window's
+    sum as time advances. Recording and reading are O(1) (amortized over the
+    seconds that passed), whatever the request rate.
+    """
+    __slots__ = ("_total", "_success", "_second", "_sums")
+
+    def __init__(self):
+        self._total = [0] * HORIZON
+        self._success = [0] * HORIZON
+        self._second: Optional[int] = None
+        self._sums = {name: [0, 0] for name in WINDOWS}
+
+    def _advance(self, second: int):
+        if self._second is None or second - self._second >= HORIZON:
+            self._total = [0] * HORIZON
+            self._success = [0] * HORIZON
+            for sums in self._sums.values():
+                sums[0] = sums[1] = 0
+            self._second = second
+            return
+
+        total, success = self._total, self._success
+        for current in range(self._second + 1, second + 1):
+            # Second current - length leaves each window; its bucket still holds its counts
+            for name, length in WINDOWS.items():
+                expired = (current - length) % HORIZON
+                sums = self._sums[name]
+                sums[0] -= total[expired]
+                sums[1] -= success[expired]
+            slot = current % HORIZON
+            total[slot] = success[slot] = 0
+        self._second = max(self._second, second)
+
+    def add(self, second: int, succeeded: bool):
+        self._advance(second)
+        slot = second % HORIZON
+        self._total[slot] += 1
+        self._success[slot] += succeeded
+        for sums in self._sums.values():
+            sums[0] += 1
+            sums[1] += succeeded
+
+    def read(self, second: int) -> Dict[str, dict]:
+        self._advance(second)
+        result = {}
+        for name, length in WINDOWS.items():
+            total, success = self._sums[name]
+            result[name] = {
+                "requests": total,
+                "success": success,
+                "success_ratio": round(success / total, 4) if total else None,
+                "rps": round(total / length, 3)
+            }
+        return result
+
+
+class LogStats:
+    """
+    Aggregates of the request log, updated once per entry as it is logged.
+
+    Counts by service, mode and kiosk, sliding-window rates per service and
+    overall, and amount totals by service and status. Reads only copy the
+    aggregates, so their cost does not depend on how many entries were logged.
+    Recording (mock loop) and reading (possibly the control lane) are serialized
+    by a lock, as reading a rate window also advances it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.total = 0
+        self.by_service: Dict[str, Dict[str, int]] = {}
+        self.by_mode: Dict[str, Dict[str, int]] = {}
+        self.by_kiosk: Dict[str, Dict[str, int]] = {}
+        self.amounts: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.rates: Dict[str, RateWindow] = {}
+        self.overall = RateWindow()
+
+    @staticmethod
+    def _count(table: Dict[str, Dict[str, int]], key: str, status: str):
+        counts = table.get(key)
+        if counts is None:
+            counts = table[key] = {}
+        counts[status] = counts.get(status, 0) + 1
+
+    def record(self, service: str, mode: str, status: str, request: dict):
+        with self._lock:
+            self._record(service, mode, status, request)
+
+    def _record(self, service: str, mode: str, status: str, request: dict):
+        self.total += 1
+        self._count(self.by_service, service, status)
+        self._count(self.by_mode, mode, status)
+
+        kiosk = request.get("kiosk_id")
+        if kiosk is not None:
+            kiosk = str(kiosk)
+            if kiosk not in self.by_kiosk and len(self.by_kiosk) >= STATS_MAX_KIOSKS:
+                kiosk = OTHER_KIOSKS
+            self._count(self.by_kiosk, kiosk, status)
+
+        amount = request.get("amount", request.get("sum"))  # Refunds send amount, payments sum
+        if isinstance(amount, int) and not isinstance(amount, bool):
+            totals = self.amounts.setdefault(service, {}).setdefault(status, {"count": 0, "amount": 0})
+            totals["count"] += 1
+            totals["amount"] += amount
+
+        second = int(time.monotonic())
+        succeeded = status in SUCCESS_STATUSES
+        window = self.rates.get(service)
+        if window is None:
+            window = self.rates[service] = RateWindow()
+        window.add(second, succeeded)
+        self.overall.add(second, succeeded)
+
+    def dump_state(self) -> dict:
+        """Counts and amounts for a state snapshot (rate windows start over on restore)"""
+        return {
+            "started_at": self.started_at,
+            "total": self.total,
+            "by_service": self.by_service,
+            "by_mode": self.by_mode,
+            "by_kiosk": self.by_kiosk,
+            "amounts": self.amounts
+        }
+
+    def load_state(self, state: dict):
+        self.started_at = state["started_at"]
+        self.total = state["total"]
+        self.by_service = state["by_service"]
+        self.by_mode = state["by_mode"]
+        self.by_kiosk = state["by_kiosk"]
+        self.amounts = state["amounts"]
+        self.rates = {service: RateWindow() for service in self.by_service}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        second = int(time.monotonic())
+        return {
+            "since": self.started_at,
+            "total": self.total,
+            "windows": self.overall.read(second),
+            "services": {
+                service: {
+                    "counts": dict(counts),
+                    "windows": self.rates[service].read(second)
+                }
+                for service, counts in self.by_service.items()
+            },
+            "modes": {mode: dict(counts) for mode, counts in self.by_mode.items()},
+            "kiosks": {kiosk: dict(counts) for kiosk, counts in self.by_kiosk.items()},
+            "payments": {
+                service: {status: dict(totals) for status, totals in by_status.items()}
+                for service, by_status in self.amounts.items()
+            }
+        }
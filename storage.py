@@ -1,42 +1,82 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from types import MappingProxyType
 from collections import deque
-import random
-from models import ServiceConfig, ServiceMode, SequenceConfig, LogEntry, PendingRequest
+from itertools import islice
+import os
+import asyncio
+import threading
+from models import ServiceConfig, ServiceMode, SequenceConfig, PendingRequest
+from log_record import LogRecord
+from idgen import ids
+from fiscal_register import FiscalRegisterBank
+from transactions import TransactionStore
+from stats import LogStats
+
+# Log entries kept in memory (GET /mocks/logs returns at most 1000; /mocks/logs/export returns all)
+LOG_CAPACITY = int(os.getenv("LOG_CAPACITY", "1000"))
+
+
+class ConfigSnapshot:
+    """
+    One published version of all service configs.
+
+    Never modified after publication: a change publishes a new snapshot with
+    the next version number. A request captures the snapshot once and uses
+    it throughout, so a change made mid-request cannot mix two configs.
+    """
+    __slots__ = ("version", "configs")
+
+    def __init__(self, version: int, configs: Mapping[str, ServiceConfig]):
+        self.version = version
+        self.configs = configs
+
+    def get(self, service: str) -> Optional[ServiceConfig]:
+        return self.configs.get(service)
+
+
+def settle_waiter(waiter: asyncio.Future, response: Optional[str]):
+    """
+    Set a manual waiter's response, or cancel it with None. Waiters belong to
+    the mock loop; from another thread (the control lane) the result is handed
+    to that loop, as futures are not thread-safe.
+    """
+    def settle():
+        if waiter.done():
+            return
+        if response is None:
+            waiter.cancel()
+        else:
+            waiter.set_result(response)
+
+    loop = waiter.get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        settle()
+    else:
+        loop.call_soon_threadsafe(settle)
 
 
 class InMemoryStorage:
     def __init__(self):
-        self.configs: Dict[str, ServiceConfig] = {
-            "payment": ServiceConfig(
-                mode=ServiceMode.AUTO_SUCCESS,
-                timeout_seconds=30,
-                default_response="SUCCESS"
-            ),
-            "qr_first_provider": ServiceConfig(
-                mode=ServiceMode.AUTO_SUCCESS,
-                timeout_seconds=30,
-                default_response="SUCCESS"
-            ),
-            "fiscal": ServiceConfig(
-                mode=ServiceMode.AUTO_SUCCESS,
-                timeout_seconds=30,
-                default_response="SUCCESS"
-            ),
-            "kds": ServiceConfig(
-                mode=ServiceMode.AUTO_SUCCESS,
-                timeout_seconds=30,
-                default_response="OK"
-            ),
-            "printer": ServiceConfig(
-                mode=ServiceMode.AUTO_SUCCESS,
-                timeout_seconds=30,
-                default_response="SUCCESS"
-            )
-        }
+        # Current config snapshot; readers take it without a lock, writers serialize on _config_lock.
+        # Filled by register_mock() for every service in the mock registry.
+        self.snapshot = ConfigSnapshot(0, MappingProxyType({}))
+        self._config_lock = threading.Lock()
+        self._config_listeners: List[Callable[[Dict[str, ServiceConfig]], None]] = []
 
-        self.logs: deque = deque(maxlen=1000)
-        self.pending_requests: Dict[str, PendingRequest] = {}
-        self.manual_responses: Dict[str, str] = {}  # Store manual responses
+        # Remaining responses of SEQUENCE services (runtime state, not part of the config)
+        self.sequences: Dict[str, List[str]] = {}
+
+        # The log is appended to by the mock loop and read by the control lane (control.py)
+        self._log_lock = threading.Lock()
+        self.logs: deque = deque(maxlen=LOG_CAPACITY)
+        self.log_count = 0  # Entries ever logged; an entry's sequence number is the count before it
+        self.stats = LogStats()  # Aggregates over every logged entry, not only the kept ones
+        self.pending_requests: Dict[str, PendingRequest] = {}  # Insertion order = oldest first
+        self.manual_waiters: Dict[str, asyncio.Future] = {}  # Resolved with the manual response
 
         # Counters for generating IDs
         self.payment_id_counter = 1809
@@ -44,39 +84,275 @@ class InMemoryStorage:
         self.fiscal_doc_counter = 1
         self.kds_ticket_counter = 1
 
-    def get_config(self, service: str) -> ServiceConfig:
-        return self.configs.get(service)
+        # Issued payments (card and QR) for status, refund and cancel lookups
+        self.transactions = TransactionStore()
+
+        # Simulated fiscal registers per kiosk (new fiscal format)
+        self.fiscal_registers = FiscalRegisterBank()
+
+    def ensure_config(self, service: str, default_response: str = "SUCCESS"):
+        """Create the default config of a newly registered service"""
+        if service not in self.snapshot.configs:
+            self._publish({service: ServiceConfig(
+                mode=ServiceMode.AUTO_SUCCESS,
+                timeout_seconds=30,
+                default_response=default_response
+            )})
+
+    def _publish(self, changes: Dict[str, ServiceConfig], restart_sequences: bool = True) -> ConfigSnapshot:
+        """
+        Publish a new snapshot with the changed configs.
+
+        SEQUENCE services start a fresh sequence; with restart_sequences=False only
+        those whose config actually changed do (a file reload keeps the others).
+        """
+        with self._config_lock:
+            current = self.snapshot
+            configs = dict(current.configs)
+            for service, config in changes.items():
+                if restart_sequences or configs.get(service) != config:
+                    if config.mode == ServiceMode.SEQUENCE and config.sequence_config:
+                        self.sequences[service] = self._build_sequence(service, config.sequence_config)
+                    else:
+                        self.sequences.pop(service, None)
+                configs[service] = config
+            self.snapshot = ConfigSnapshot(current.version + 1, MappingProxyType(configs))
+            return self.snapshot
+
+    def on_config_update(self, listener: Callable[[Dict[str, ServiceConfig]], None]):
+        """Call listener(changes) after every update_configs (API and bot changes)"""
+        self._config_listeners.append(listener)
+
+    def get_snapshot(self) -> ConfigSnapshot:
+        return self.snapshot
+
+    def get_config(self, service: str) -> Optional[ServiceConfig]:
+        return self.snapshot.configs.get(service)
+
+    def update_config(self, service: str, config: ServiceConfig) -> ConfigSnapshot:
+        return self.update_configs({service: config})
+
+    def update_configs(self, changes: Dict[str, ServiceConfig]) -> ConfigSnapshot:
+        """Apply several service configs as one new version"""
+        snapshot = self._publish(changes)
+        for listener in self._config_listeners:
+            listener(changes)
+        return snapshot
+
+    def replace_configs(self, configs: Dict[str, ServiceConfig]) -> ConfigSnapshot:
+        """Swap in configs loaded from a file in one step, without notifying listeners"""
+        return self._publish(configs, restart_sequences=False)
+
+    def get_all_configs(self) -> Mapping[str, ServiceConfig]:
+        return self.snapshot.configs
+
+    def add_log(self, log: LogRecord):
+        with self._log_lock:
+            self.logs.append(log)
+            self.log_count += 1
+        self.stats.record(log.service, log.mode, log.status, log.request)
+
+    def get_logs(self, limit: Optional[int] = 100) -> List[LogRecord]:
+        """The newest limit entries (all if None), oldest first"""
+        with self._log_lock:
+            logs = list(islice(reversed(self.logs), limit))
+        logs.reverse()
+        return logs
+
+    def get_log(self, seq: int) -> Optional[LogRecord]:
+        """The entry with sequence number seq, or None if it has been dropped"""
+        with self._log_lock:
+            index = seq - (self.log_count - len(self.logs))
+            if 0 <= index < len(self.logs):
+                return self.logs[index]
+        return None
+
+    def browse_logs(
+        self,
+        cursor: Optional[int] = None,
+        limit: int = 10,
+        service: Optional[int] = None,
+        status: Optional[int] = None,
+        newer: bool = False
+    ) -> List[Tuple[int, LogRecord]]:
+        """
+        (sequence number, entry) pairs for paging through the log by cursor.
+
+        By default the up to limit entries before cursor (the newest if None),
+        newest first; with newer, the up to limit entries after cursor, oldest
+        first. service and status are record codes to filter on. The deque is
+        walked in place from the cursor, never copied, and sequence numbers stay
+        valid as old entries are dropped. The walk holds the log lock, which an
+        append from the mock loop waits for, so it sees one consistent log.
+        """
+        with self._log_lock:
+            first = self.log_count - len(self.logs)
+            if newer:
+                start = 0 if cursor is None else max(cursor + 1 - first, 0)
+                positions = range(first + start, self.log_count)
+                entries = islice(self.logs, start, None)
+            else:
+                end = len(self.logs) if cursor is None else min(max(cursor - first, 0), len(self.logs))
+                positions = range(first + end - 1, first - 1, -1)
+                entries = islice(reversed(self.logs), len(self.logs) - end, None)
 
-    def update_config(self, service: str, config: ServiceConfig):
-        # Generate sequence if needed
-        if config.mode == ServiceMode.SEQUENCE and config.sequence_config:
-            sequence = (
-                ["SUCCESS"] * config.sequence_config.success_count +
-                ["FAILURE"] * config.sequence_config.failure_count
-            )
-            random.shuffle(sequence)
-            config.sequence_config.remaining = sequence
+            page = []
+            for seq, log in zip(positions, entries):
+                if service is not None and log.service_code != service:
+                    continue
+                if status is not None and log.status_code != status:
+                    continue
+                page.append((seq, log))
+                if len(page) >= limit:
+                    break
+            return page
 
-        self.configs[service] = config
+    def dump_state(self) -> dict:
+        """
+        Everything a restart would lose, as JSON-compatible data (see snapshot.py).
 
-    def get_all_configs(self) -> Dict[str, ServiceConfig]:
-        return self.configs
+        Reads the live structures as they are, without copying them first: it
+        runs in a forked child, whose memory is a copy-on-write image of this
+        process, or in the event loop, where nothing changes while it runs.
+        """
+        return {
+            "config_version": self.snapshot.version,
+            "configs": {service: config.model_dump(mode="json") for service, config in self.snapshot.configs.items()},
+            "sequences": self.sequences,
+            "counters": {
+                "payment_id": self.payment_id_counter,
+                "qr_payment_id": self.qr_payment_id_counter,
+                "fiscal_doc": self.fiscal_doc_counter,
+                "kds_ticket": self.kds_ticket_counter
+            },
+            "log_count": self.log_count,
+            "logs": [
+                [log.at, log.service, log.mode, log.status, log.config_version, log.duration_ms, log.request, log.response]
+                for log in self.logs
+            ],
+            "stats": self.stats.dump_state(),
+            "pending_requests": [p.model_dump(mode="json") for p in self.pending_requests.values()],
+            "transactions": self.transactions.dump_state(),
+            "fiscal_registers": self.fiscal_registers.dump_state(),
+            "ids": ids.dump_state()
+        }
+
+    def load_state(self, state: dict, configs: bool = True) -> dict:
+        """
+        Replace the state with a dump_state() result; returns what was restored.
+
+        Every field is read and rebuilt before anything is swapped in, so a
+        malformed snapshot raises and leaves the current state untouched.
+        configs=False keeps the current configs (a config file is authoritative).
+        Pending manual requests are not restored: the requests waiting for them
+        did not survive the restart.
+        """
+        saved_version = int(state["config_version"])
+        saved = {
+            service: ServiceConfig(**config)
+            for service, config in state["configs"].items() if service in self.snapshot.configs
+        } if configs else {}
+        sequences = {service: list(remaining) for service, remaining in state["sequences"].items()}
+        counters = state["counters"]
+        counters = tuple(
+            int(counters[name]) for name in ("payment_id", "qr_payment_id", "fiscal_doc", "kds_ticket")
+        )
+        log_count = int(state["log_count"])
+        logs = deque(
+            (
+                LogRecord(at, service, mode, status, request, response, config_version, duration_ms)
+                for at, service, mode, status, config_version, duration_ms, request, response in state["logs"]
+            ),
+            maxlen=LOG_CAPACITY
+        )
+        stats = LogStats()
+        stats.load_state(state["stats"])
+        transactions = TransactionStore()
+        transactions.load_state(state["transactions"])
+        fiscal_registers = FiscalRegisterBank()
+        fiscal_registers.load_state(state["fiscal_registers"])
+        pending_dropped = len(state["pending_requests"])
+        # Snapshots taken before generator states were saved have no "ids"
+        id_state = ids.parse_state(state["ids"]) if "ids" in state else None
 
-    def add_log(self, log: LogEntry):
-        self.logs.append(log)
+        if saved:
+            snapshot = self.replace_configs(saved)
+            if saved_version >= snapshot.version:
+                # Keep versions increasing across the restart, as logged entries refer to them
+                self.snapshot = ConfigSnapshot(saved_version + 1, snapshot.configs)
+        self.sequences = {
+            service: remaining for service, remaining in sequences.items() if service in self.snapshot.configs
+        }
+        (self.payment_id_counter, self.qr_payment_id_counter,
+         self.fiscal_doc_counter, self.kds_ticket_counter) = counters
+        with self._log_lock:
+            self.logs = logs
+            self.log_count = log_count
+        self.stats = stats
+        self.transactions = transactions
+        self.fiscal_registers = fiscal_registers
+        if id_state is not None:
+            ids.set_state(*id_state)
 
-    def get_logs(self, limit: int = 100) -> List[LogEntry]:
-        return list(self.logs)[-limit:]
+        return {
+            "config_version": self.snapshot.version,
+            "configs": len(saved),
+            "logs": len(logs),
+            "transactions": len(transactions),
+            "fiscal_registers": len(fiscal_registers),
+            "pending_requests_dropped": pending_dropped
+        }
 
-    def add_pending_request(self, request: PendingRequest):
+    def add_pending_request(self, request: PendingRequest) -> asyncio.Future:
+        """Register a pending request and return the future its manual response is delivered to"""
+        waiter = asyncio.get_running_loop().create_future()
         self.pending_requests[request.request_id] = request
+        self.manual_waiters[request.request_id] = waiter
+        return waiter
 
     def get_pending_request(self, request_id: str) -> Optional[PendingRequest]:
         return self.pending_requests.get(request_id)
 
+    def get_pending_requests(self, service: Optional[str] = None) -> List[PendingRequest]:
+        """Pending requests, oldest first, optionally for one service"""
+        # list() copies in one step, while the mock loop may be adding requests
+        return [p for p in list(self.pending_requests.values()) if service is None or p.service == service]
+
     def remove_pending_request(self, request_id: str):
-        if request_id in self.pending_requests:
-            del self.pending_requests[request_id]
+        self.pending_requests.pop(request_id, None)
+        waiter = self.manual_waiters.pop(request_id, None)
+        if waiter:
+            settle_waiter(waiter, None)
+
+    def resolve_pending_request(self, request_id: str, response: str) -> Optional[PendingRequest]:
+        """Deliver a manual response to the waiting request; None if it expired or was already resolved"""
+        pending = self.pending_requests.pop(request_id, None)
+        waiter = self.manual_waiters.pop(request_id, None)
+        if pending is None:
+            return None
+        if waiter:
+            settle_waiter(waiter, response)
+        return pending
+
+    def resolve_pending_requests(
+        self,
+        response: str,
+        service: Optional[str] = None,
+        oldest: Optional[int] = None
+    ) -> List[PendingRequest]:
+        """
+        Resolve many pending requests at once: all, one service's, or the oldest N.
+
+        Runs without awaiting, so every selected request is resolved in the same
+        event loop step; requests that arrive meanwhile (from the mock loop, when
+        called on the control lane) are not selected.
+        """
+        selected = self.get_pending_requests(service)
+        if oldest is not None:
+            selected = selected[:oldest]
+        for pending in selected:
+            self.resolve_pending_request(pending.request_id, response)
+        return selected
 
     def get_next_payment_id(self) -> int:
         self.payment_id_counter += 1
@@ -96,23 +372,33 @@ class InMemoryStorage:
         self.kds_ticket_counter += 1
         return ticket_id
 
-    def get_next_sequence_response(self, service: str) -> Optional[str]:
-        config = self.configs.get(service)
-        if not config or not config.sequence_config or not config.sequence_config.remaining:
-            return None
+    def _build_sequence(self, service: str, sequence_config: SequenceConfig) -> List[str]:
+        sequence = (
+            ["SUCCESS"] * sequence_config.success_count +
+            ["FAILURE"] * sequence_config.failure_count
+        )
+        for fault, count in sequence_config.fault_counts.items():
+            sequence += [fault.value] * count
+        ids.shuffle(f"sequence.{service}", sequence)
+        return sequence
 
-        response = config.sequence_config.remaining.pop(0)
+    def get_sequence_remaining(self, service: str) -> List[str]:
+        return list(self.sequences.get(service) or [])
 
-        # Regenerate sequence if empty
-        if not config.sequence_config.remaining:
-            sequence = (
-                ["SUCCESS"] * config.sequence_config.success_count +
-                ["FAILURE"] * config.sequence_config.failure_count
-            )
-            random.shuffle(sequence)
-            config.sequence_config.remaining = sequence
+    def get_next_sequence_response(self, service: str, config: Optional[ServiceConfig] = None) -> Optional[str]:
+        """Next response of a SEQUENCE service; config is the snapshot the request captured"""
+        config = config or self.get_config(service)
+        if not config or not config.sequence_config:
+            return None
+
+        remaining = self.sequences.get(service)
+        if not remaining:
+            # Generate on first use and regenerate when used up
+            remaining = self.sequences[service] = self._build_sequence(service, config.sequence_config)
+        if not remaining:
+            return None
 
-        return response
+        return remaining.pop(0)
 
 
 # Global storage instance
@@ -0,0 +1,138 @@
+import json
+import asyncio
+import string
+from typing import Dict, Iterable, Iterator
+from starlette.responses import Response
+from health import census
+
+_KEY_CACHE_SIZE = 4096
+
+
+def _escape(text: str) -> bytes:
+    """JSON string contents (no quotes), as Starlette's JSONResponse encodes them"""
+    return json.dumps(text, ensure_ascii=False)[1:-1].encode()
+
+
+class Preencoded(str):
+    """
+    A str rendered from a TextTemplate, which can produce its JSON encoding as
+    byte fragments: the template's literal parts were encoded once, when it was
+    defined, and only the substituted values are encoded, when streamed.
+    Everywhere else it is an ordinary str (logs, transactions, JSONResponse).
+    """
+
+    def fragments(self) -> Iterator[bytes]:
+        return self.template.fragments(self.values)
+
+
+class TextTemplate:
+    """Text with {name} fields, for large response fields such as receipts"""
+
+    def __init__(self, template: str):
+        parsed = list(string.Formatter().parse(template))
+        self._parts = [(_escape(literal), field) for literal, field, _, _ in parsed]
+        # %-formatting is faster than str.format, which parses the template on every call
+        self._format = "".join(
+            literal.replace("%", "%%") + (f"%({field})s" if field is not None else "")
+            for literal, field, _, _ in parsed
+        )
+
+    def render(self, **values) -> Preencoded:
+        text = Preencoded(self._format % values)
+        text.template = self
+        text.values = values
+        return text
+
+    def fragments(self, values: dict) -> Iterator[bytes]:
+        for encoded, field in self._parts:
+            if encoded:
+                yield encoded
+            if field is not None:
+                yield _escape(str(values[field]))
+
+
+_keys: Dict[str, bytes] = {}
+
+
+def json_fragments(value) -> Iterator[bytes]:
+    """
+    Compact JSON encoding of value as a sequence of byte fragments.
+
+    Produces the same bytes as JSONResponse, without building the whole body:
+    object keys are encoded once and cached, and Preencoded strings are passed
+    through as their fragments.
+    """
+    if isinstance(value, Preencoded):
+        yield b'"'
+        yield from value.fragments()
+        yield b'"'
+    elif isinstance(value, dict):
+        yield b"{"
+        first = True
+        for key, item in value.items():
+            encoded = _keys.get(key)
+            if encoded is None:
+                encoded = b'"' + _escape(str(key)) + b'":'
+                if len(_keys) < _KEY_CACHE_SIZE:
+                    _keys[key] = encoded
+            if not first:
+                yield b","
+            first = False
+            yield encoded
+            yield from json_fragments(item)
+        yield b"}"
+    elif isinstance(value, (list, tuple)):
+        yield b"["
+        for index, item in enumerate(value):
+            if index:
+                yield b","
+            yield from json_fragments(item)
+        yield b"]"
+    else:
+        yield json.dumps(value, ensure_ascii=False).encode()
+
+
+async def send_paced(send, fragments: Iterable[bytes], chunk_bytes: int, interval: float):
+    """Send fragments as body chunks of chunk_bytes, interval seconds apart; ends the body"""
+    buffer = bytearray()
+    sent = False
+    for fragment in fragments:
+        buffer += fragment
+        while len(buffer) >= chunk_bytes:
+            if sent and interval:
+                await asyncio.sleep(interval)
+            await send({"type": "http.response.body", "body": bytes(buffer[:chunk_bytes]), "more_body": True})
+            del buffer[:chunk_bytes]
+            sent = True
+    if buffer:
+        if sent and interval:
+            await asyncio.sleep(interval)
+        await send({"type": "http.response.body", "body": bytes(buffer), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class StreamedJSONResponse(Response):
+    """
+    JSON response sent with chunked transfer encoding as it is encoded.
+
+    The body is never assembled: fragments are grouped into chunks of
+    chunk_bytes, sent interval seconds apart to simulate a slow link.
+    """
+    media_type = "application/json"
+
+    def __init__(self, content, chunk_bytes: int, interval: float = 0.0, status_code: int = 200):
+        self.content = content
+        self.chunk_bytes = chunk_bytes
+        self.interval = interval
+        self.status_code = status_code
+        self.background = None
+
+    async def __call__(self, scope, receive, send):
+        # No Content-Length: the server sends the body with Transfer-Encoding: chunked
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": [(b"content-type", b"application/json")]
+        })
+        with census.track("streaming"):
+            await send_paced(send, json_fragments(self.content), self.chunk_bytes, self.interval)
@@ -1,8 +1,12 @@
 import os
+import hmac
+import json
 import asyncio
-from typing import Optional
+import secrets
+from typing import Dict, Optional
 from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -12,11 +16,23 @@ from telegram.ext import (
 )
 from models import ServiceMode, ServiceConfig, SequenceConfig
 from storage import storage
+from registry import registry
+from log_record import SERVICES, STATUSES
+from stats import SUCCESS_STATUSES
+from telegram_outbox import outbox, PRIORITY_MANUAL, TELEGRAM_SEND_CONCURRENCY
+from control import control
 
 # Environment variables
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_ADMIN_IDS = [int(id.strip()) for id in os.getenv("TELEGRAM_ADMIN_IDS", "").split(",") if id.strip()]
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Webhook mode: when set, Telegram pushes updates to the FastAPI app instead of being long-polled
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Optional Bot API base URL override (e.g. a local fake Telegram server)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+
+WEBHOOK_PATH = "/telegram/webhook"
 
 # Conversation states
 SELECT_SERVICE, SELECT_MODE, INPUT_SEQUENCE = range(3)
@@ -39,7 +55,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/status\\_detailed - Detailed status\n"
         "/config - Configure services\n"
         "/config\\_all - Configure all services\n"
-        "/logs - View recent logs\n"
+        "/logs - Browse logs\n"
+        "/stats - Request statistics\n"
+        "/pending - Pending manual requests\n"
         "/help - Help",
         parse_mode="Markdown"
     )
@@ -79,29 +97,38 @@ async def status_detailed(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status_text += f"  Delay: {config.delay_seconds}s\n"
         status_text += f"  Timeout: {config.timeout_seconds}s\n"
         status_text += f"  Default: {config.default_response}\n"
+        if config.fault:
+            fault = config.fault.value.replace("_", "\\_")
+            status_text += f"  Fault: {fault} at {config.fault_rate:.0%}\n"
 
         if config.mode == ServiceMode.SEQUENCE and config.sequence_config:
             seq = config.sequence_config
             status_text += f"  Sequence: {seq.success_count} success, {seq.failure_count} failure\n"
-            status_text += f"  Remaining: {len(seq.remaining)} responses\n"
+            for fault, count in seq.fault_counts.items():
+                name = fault.value.replace("_", "\\_")
+                status_text += f"  Fault: {count} {name}\n"
+            status_text += f"  Remaining: {len(storage.get_sequence_remaining(service_name))} responses\n"
 
         status_text += "\n"
 
     await update.message.reply_text(status_text, parse_mode="Markdown")
 
 
+def service_buttons(prefix: str) -> list:
+    """One keyboard row per configurable service, callback data <prefix><service>"""
+    return [
+        [InlineKeyboardButton(definition.label, callback_data=f"{prefix}{definition.service}")]
+        for definition in registry.services()
+    ]
+
+
 async def config_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start configuration conversation"""
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Access denied")
         return ConversationHandler.END
 
-    keyboard = [
-        [InlineKeyboardButton("💳 Payment", callback_data="service_payment")],
-        [InlineKeyboardButton("📲 QR First Provider", callback_data="service_qr_first_provider")],
-        [InlineKeyboardButton("🧾 Fiscal", callback_data="service_fiscal")],
-        [InlineKeyboardButton("🖨 Printer", callback_data="service_printer")],
-        [InlineKeyboardButton("🍽 KDS", callback_data="service_kds")],
+    keyboard = service_buttons("service_") + [
         [InlineKeyboardButton("❌ Cancel", callback_data="cancel")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -170,9 +197,9 @@ async def select_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     config = ServiceConfig(
         mode=ServiceMode(mode),
         timeout_seconds=30,
-        default_response="SUCCESS" if service in ["payment", "qr_first_provider", "fiscal", "printer"] else "OK"
+        default_response=registry.service(service).default_response
     )
-    storage.update_config(service, config)
+    await control.on_main(storage.update_config, service, config)
 
     await query.edit_message_text(
         f"✅ *{service.upper()}* configured\n\n"
@@ -193,13 +220,13 @@ async def input_sequence(update: Update, context: ContextTypes.DEFAULT_TYPE):
         config = ServiceConfig(
             mode=ServiceMode.SEQUENCE,
             timeout_seconds=30,
-            default_response="SUCCESS" if service in ["payment", "qr_first_provider", "fiscal", "printer"] else "OK",
+            default_response=registry.service(service).default_response,
             sequence_config=SequenceConfig(
                 success_count=success_count,
                 failure_count=failure_count
             )
         )
-        storage.update_config(service, config)
+        await control.on_main(storage.update_config, service, config)
 
         await update.message.reply_text(
             f"✅ *{service.upper()}* configured\n\n"
@@ -251,13 +278,14 @@ async def config_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     mode = query.data.replace("all_", "")
 
-    for service in ["payment", "qr_first_provider", "fiscal", "kds", "printer"]:
-        config = ServiceConfig(
+    await control.on_main(storage.update_configs, {
+        definition.service: ServiceConfig(
             mode=ServiceMode(mode),
             timeout_seconds=30,
-            default_response="SUCCESS" if service in ["payment", "qr_first_provider", "fiscal", "printer"] else "OK"
+            default_response=definition.default_response
         )
-        storage.update_config(service, config)
+        for definition in registry.services()
+    })
 
     await query.edit_message_text(
         f"✅ *All services configured*\n\n"
@@ -266,30 +294,229 @@ async def config_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
 
 
+LOG_PAGE_SIZE = 10
+LOG_PAGE_MAX = 25
+LOG_BODY_CHARS = 1500  # Request/response JSON shown per entry; a message holds 4096 characters
+
+
+def escape_markdown(text: str) -> str:
+    return text.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`")
+
+
+def log_filter_label(codes, code: Optional[int]) -> str:
+    return "all" if code is None else escape_markdown(codes.names[code])
+
+
+class LogView:
+    """
+    One state of the log browser: page cursor, filters and page size.
+
+    Packed into the callback data ("logs_<action>_<cursor>_<service>_<status>_<size>[_<seq>]"),
+    so the browser keeps no per-chat state. Filters are record codes, "-" meaning all.
+    """
+    __slots__ = ("cursor", "service", "status", "size")
+
+    def __init__(self, cursor: Optional[int] = None, service: Optional[int] = None,
+                 status: Optional[int] = None, size: int = LOG_PAGE_SIZE):
+        self.cursor = cursor
+        self.service = service
+        self.status = status
+        self.size = size
+
+    def data(self, action: str, *extra, **changes) -> str:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        fields = ["-" if values[name] is None else str(values[name]) for name in self.__slots__]
+        return "_".join(["logs", action, *fields, *map(str, extra)])
+
+    @classmethod
+    def parse(cls, data: str):
+        """(action, view, extra fields) from callback data"""
+        parts = data.split("_")
+        values = [None if part == "-" else int(part) for part in parts[2:6]]
+        return parts[1], cls(*values), parts[6:]
+
+
+def format_log_page(view: LogView, page: list) -> str:
+    text = (
+        f"📋 *Logs* (service: {log_filter_label(SERVICES, view.service)}, "
+        f"status: {log_filter_label(STATUSES, view.status)})\n\n"
+    )
+    if not page:
+        return text + "No matching entries"
+    for seq, log in page:
+        emoji = "✅" if log.status in ["SUCCESS", "OK"] else "❌"
+        text += (
+            f"{emoji} `#{seq} {log.time.strftime('%H:%M:%S')}` "
+            f"{escape_markdown(log.service.upper())} - {escape_markdown(log.status)}\n"
+        )
+    return text
+
+
+def build_log_page_keyboard(view: LogView, page: list) -> InlineKeyboardMarkup:
+    """Drill-down buttons per entry, older/newer pages, filters"""
+    keyboard = []
+    entries = [InlineKeyboardButton(f"#{seq}", callback_data=view.data("entry", seq)) for seq, _ in page]
+    for i in range(0, len(entries), 5):
+        keyboard.append(entries[i:i + 5])
+
+    navigation = []
+    if page and storage.browse_logs(page[-1][0], 1, view.service, view.status):
+        navigation.append(InlineKeyboardButton("⬅️ Older", callback_data=view.data("page", cursor=page[-1][0])))
+    if page and storage.browse_logs(page[0][0], 1, view.service, view.status, newer=True):
+        navigation.append(InlineKeyboardButton("Newer ➡️", callback_data=view.data("newer", cursor=page[0][0])))
+    if navigation:
+        keyboard.append(navigation)
+
+    keyboard.append([
+        InlineKeyboardButton("🔧 Service", callback_data=view.data("fsvc")),
+        InlineKeyboardButton("🔧 Status", callback_data=view.data("fst")),
+        InlineKeyboardButton("🔄 Latest", callback_data=view.data("page", cursor=None))
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def format_log_entry(seq: int, log) -> str:
+    def body(value) -> str:
+        text = json.dumps(value, ensure_ascii=False, indent=1, default=str)
+        if len(text) > LOG_BODY_CHARS:
+            text = text[:LOG_BODY_CHARS] + "\n…"
+        return text.replace("`", "'")
+
+    duration = f"{log.duration_ms} ms" if log.duration_ms is not None else "-"
+    return (
+        f"📄 *Log #{seq}*\n\n"
+        f"Time: `{log.timestamp}`\n"
+        f"Service: {escape_markdown(log.service.upper())}\n"
+        f"Mode: {escape_markdown(log.mode)}\n"
+        f"Status: {escape_markdown(log.status)}\n"
+        f"Duration: {duration}\n"
+        f"Config version: {log.config_version}\n\n"
+        f"*Request*\n```\n{body(log.request)}\n```\n"
+        f"*Response*\n```\n{body(log.response)}\n```"
+    )
+
+
+def build_log_filter_keyboard(view: LogView, field: str, codes) -> InlineKeyboardMarkup:
+    """Filter choices; choosing one goes back to the newest page"""
+    buttons = [InlineKeyboardButton("All", callback_data=view.data("page", cursor=None, **{field: None}))]
+    buttons += [
+        InlineKeyboardButton(name, callback_data=view.data("page", cursor=None, **{field: code}))
+        for code, name in enumerate(codes.names)
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton("↩️ Back", callback_data=view.data("page"))])
+    return InlineKeyboardMarkup(keyboard)
+
+
 async def logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show recent logs"""
+    """Open the log browser on the newest entries"""
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("⛔ Access denied")
         return
 
-    limit = 10
-    if context.args and context.args[0].isdigit():
-        limit = min(int(context.args[0]), 50)
+    # /logs [N] [service]: page size and service filter, in any order
+    view = LogView()
+    for arg in context.args or []:
+        if arg.isdigit():
+            view.size = max(1, min(int(arg), LOG_PAGE_MAX))
+        else:
+            view.service = SERVICES.find(arg.lower())
+            if view.service is None:
+                await update.message.reply_text(f"📋 No logs for service {arg}")
+                return
+
+    page = storage.browse_logs(None, view.size, view.service, view.status)
+    if not page and view.service is None:
+        await update.message.reply_text("📋 No logs available")
+        return
 
-    log_entries = storage.get_logs(limit)
+    await update.message.reply_text(
+        format_log_page(view, page),
+        reply_markup=build_log_page_keyboard(view, page),
+        parse_mode="Markdown"
+    )
 
-    if not log_entries:
-        await update.message.reply_text("📋 No logs available")
+
+async def logs_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Log browser navigation: every action edits the browser message in place"""
+    query = update.callback_query
+    await query.answer()
+
+    if not is_admin(query.from_user.id):
         return
 
-    logs_text = f"📋 *Last {len(log_entries)} logs*\n\n"
+    try:
+        action, view, extra = LogView.parse(query.data)
+    except (ValueError, TypeError):
+        return
 
-    for log in log_entries:
-        emoji = "✅" if log.status in ["SUCCESS", "OK"] else "❌"
-        time = datetime.fromisoformat(log.timestamp).strftime("%H:%M:%S")
-        logs_text += f"{emoji} `{time}` {log.service.upper()} - {log.status}\n"
+    if action == "entry":
+        seq = int(extra[0])
+        log = storage.get_log(seq)
+        if log is None:
+            text = f"📄 *Log #{seq}* is no longer kept"
+        else:
+            text = format_log_entry(seq, log)
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("↩️ Back", callback_data=view.data("page"))]])
+    elif action in ("fsvc", "fst"):
+        field, codes = ("service", SERVICES) if action == "fsvc" else ("status", STATUSES)
+        text = f"🔧 *Filter by {field}*"
+        reply_markup = build_log_filter_keyboard(view, field, codes)
+    else:
+        if action == "newer":
+            # The newer page ends at the size-th matching entry after the cursor
+            newer = storage.browse_logs(view.cursor, view.size, view.service, view.status, newer=True)
+            view.cursor = newer[-1][0] + 1 if len(newer) == view.size else None
+        page = storage.browse_logs(view.cursor, view.size, view.service, view.status)
+        text = format_log_page(view, page)
+        reply_markup = build_log_page_keyboard(view, page)
+
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+    except BadRequest:
+        # Refresh without changes - Telegram rejects identical edits
+        pass
+
+
+def format_stats(stats: dict) -> str:
+    """Telegram summary of storage.stats.snapshot()"""
+    def ratio(window: dict) -> str:
+        return f"{window['success_ratio'] * 100:.0f}%" if window["success_ratio"] is not None else "-"
+
+    def escape(name: str) -> str:
+        return name.replace("_", "\\_")
+
+    windows = stats["windows"]
+    text = f"📈 *Statistics* ({stats['total']} requests logged)\n\n"
+    text += "*All services*\n"
+    for name, window in windows.items():
+        text += f"  {name}: {window['requests']} req, {window['rps']}/s, {ratio(window)} success\n"
+
+    for service, data in stats["services"].items():
+        last_hour = data["windows"]["1h"]
+        counts = ", ".join(f"{escape(status)} {count}" for status, count in data["counts"].items())
+        text += f"\n*{escape(service.upper())}*\n"
+        text += f"  Total: {counts}\n"
+        text += f"  1h: {last_hour['requests']} req, {ratio(last_hour)} success\n"
+        for status, totals in stats["payments"].get(service, {}).items():
+            text += f"  Amount {escape(status)}: {totals['amount']} ({totals['count']})\n"
+
+    return text
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show aggregated request statistics"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Access denied")
+        return
+
+    stats = storage.stats.snapshot()
+    if not stats["total"]:
+        await update.message.reply_text("📈 No requests logged yet")
+        return
 
-    await update.message.reply_text(logs_text, parse_mode="Markdown")
+    await update.message.reply_text(format_stats(stats), parse_mode="Markdown")
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -302,7 +529,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/config - Configure individual service\n"
         "/config\\_all - Configure all services\n"
         "/delay - Set response delay for services\n"
-        "/logs \\[N\\] - Show last N logs (default 10, max 50)\n"
+        "/logs \\[N] \\[service] - Browse logs, N per page (default 10, max 25)\n"
+        "/stats - Success ratios and rates per service\n"
+        "/pending - Pending manual requests with bulk approve/decline\n"
         "/help - This help message\n\n"
         "*Modes:*\n"
         "✅ AUTO\\_SUCCESS - Always return success\n"
@@ -319,12 +548,7 @@ async def delay_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ Access denied")
         return
 
-    keyboard = [
-        [InlineKeyboardButton("💳 Payment", callback_data="delay_payment")],
-        [InlineKeyboardButton("📲 QR First Provider", callback_data="delay_qr_first_provider")],
-        [InlineKeyboardButton("🧾 Fiscal", callback_data="delay_fiscal")],
-        [InlineKeyboardButton("🖨 Printer", callback_data="delay_printer")],
-        [InlineKeyboardButton("🍽 KDS", callback_data="delay_kds")],
+    keyboard = service_buttons("delay_") + [
         [InlineKeyboardButton("🌐 All Services", callback_data="delay_all")],
         [InlineKeyboardButton("❌ Cancel", callback_data="delay_cancel")]
     ]
@@ -402,14 +626,14 @@ async def setdelay_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     service = context.user_data.get("delay_service", "all")
 
     if service == "all":
-        services = ["payment", "qr_first_provider", "fiscal", "kds", "printer"]
+        services = [definition.service for definition in registry.services()]
     else:
         services = [service]
 
-    for svc in services:
-        config = storage.get_config(svc)
-        config.delay_seconds = delay
-        storage.update_config(svc, config)
+    await control.on_main(storage.update_configs, {
+        svc: storage.get_config(svc).model_copy(update={"delay_seconds": delay})
+        for svc in services
+    })
 
     service_name = "All Services" if service == "all" else service.upper()
     await query.edit_message_text(
@@ -433,15 +657,12 @@ async def handle_manual_response(update: Update, context: ContextTypes.DEFAULT_T
     request_id = parts[1]
     response = parts[2]
 
-    pending = storage.get_pending_request(request_id)
+    # Deliver response to the waiting request
+    pending = storage.resolve_pending_request(request_id, response)
     if not pending:
         await query.edit_message_text("⚠️ Request expired or already processed")
         return
 
-    # Store response for the waiting request
-    response_key = f"manual_response_{request_id}"
-    storage.manual_responses[response_key] = response
-
     emoji = "✅" if response == "SUCCESS" else "❌"
     await query.edit_message_text(
         f"{emoji} *Manual Response Recorded*\n\n"
@@ -451,6 +672,176 @@ async def handle_manual_response(update: Update, context: ContextTypes.DEFAULT_T
     )
 
 
+BULK_OLDEST_COUNT = 10
+
+# Admin chat id -> id of the message showing the pending list, which bulk resolutions edit in place
+pending_messages: Dict[int, int] = {}
+
+
+def format_pending_summary() -> str:
+    """Pending manual requests grouped by service"""
+    pending = storage.get_pending_requests()
+    if not pending:
+        return "📭 *No pending manual requests*"
+
+    by_service = {}
+    for p in pending:
+        by_service[p.service] = by_service.get(p.service, 0) + 1
+
+    oldest_age = (datetime.now(timezone.utc) - pending[0].created_at).total_seconds()
+    text = f"👤 *Pending manual requests: {len(pending)}*\n"
+    text += f"Oldest: {oldest_age:.0f}s ago\n\n"
+    for service, count in by_service.items():
+        text += f"  {service.upper()}: {count}\n"
+    return text
+
+
+def format_bulk_result(resolved: list, response: str) -> str:
+    """Summary of a bulk manual resolution"""
+    emoji = "✅" if response in ["SUCCESS", "OK"] else "⚠️" if response == "UNAVAILABLE" else "❌"
+    if not resolved:
+        return "⚠️ *No pending requests matched*"
+
+    by_service = {}
+    for p in resolved:
+        by_service[p.service] = by_service.get(p.service, 0) + 1
+
+    text = f"{emoji} *Resolved {len(resolved)} requests* → {response}\n"
+    for service, count in by_service.items():
+        text += f"  {service.upper()}: {count}\n"
+    return text
+
+
+def format_notification_summary(seconds: float, counts: dict) -> str:
+    """Periodic summary of SUMMARY services: {service: {status: count}} over seconds"""
+    text = f"📊 *Summary* (last {seconds:.0f} s)\n"
+    for service, statuses in sorted(counts.items()):
+        total = sum(statuses.values())
+        success = sum(count for status, count in statuses.items() if status in SUCCESS_STATUSES)
+        breakdown = ", ".join(
+            f"{status} {count}" for status, count in sorted(statuses.items(), key=lambda item: -item[1])
+        )
+        text += (
+            f"\n*{service.upper()}*: {total} requests, "
+            f"{total / max(seconds, 1):.1f}/s, {success / total:.0%} success\n"
+            f"`{breakdown}`\n"
+        )
+    return text
+
+
+def build_pending_keyboard() -> InlineKeyboardMarkup:
+    """Bulk action buttons for the pending summary message"""
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ All Success", callback_data="bulk_SUCCESS_all"),
+            InlineKeyboardButton("❌ All Failure", callback_data="bulk_FAILURE_all")
+        ],
+        [InlineKeyboardButton("⚠️ All Unavailable", callback_data="bulk_UNAVAILABLE_all")],
+        [
+            InlineKeyboardButton(f"✅ Oldest {BULK_OLDEST_COUNT}", callback_data=f"bulk_SUCCESS_old:{BULK_OLDEST_COUNT}"),
+            InlineKeyboardButton(f"❌ Oldest {BULK_OLDEST_COUNT}", callback_data=f"bulk_FAILURE_old:{BULK_OLDEST_COUNT}")
+        ]
+    ]
+
+    services = []
+    for p in storage.get_pending_requests():
+        if p.service not in services:
+            services.append(p.service)
+    for service in services:
+        keyboard.append([
+            InlineKeyboardButton(f"✅ {service.upper()}", callback_data=f"bulk_SUCCESS_svc:{service}"),
+            InlineKeyboardButton(f"❌ {service.upper()}", callback_data=f"bulk_FAILURE_svc:{service}")
+        ])
+
+    keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data="bulk_refresh")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show pending manual requests with bulk actions"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Access denied")
+        return
+
+    message = await update.message.reply_text(
+        format_pending_summary(),
+        reply_markup=build_pending_keyboard(),
+        parse_mode="Markdown"
+    )
+    pending_messages[update.effective_chat.id] = message.message_id
+
+
+async def bulk_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Resolve many pending requests at once and edit the summary message in place"""
+    query = update.callback_query
+    await query.answer()
+
+    if not is_admin(query.from_user.id):
+        return
+    pending_messages[query.message.chat_id] = query.message.message_id
+
+    # Callback data: "bulk_<response>_<scope>" where scope is all | svc:<service> | old:<n>
+    parts = query.data.split("_", 2)
+    result_text = ""
+    if len(parts) == 3:
+        response, scope = parts[1], parts[2]
+        service = None
+        oldest = None
+        if scope.startswith("svc:"):
+            service = scope[len("svc:"):]
+        elif scope.startswith("old:"):
+            oldest = int(scope[len("old:"):])
+
+        resolved = storage.resolve_pending_requests(response, service=service, oldest=oldest)
+        result_text = format_bulk_result(resolved, response) + "\n"
+
+    try:
+        await query.edit_message_text(
+            result_text + format_pending_summary(),
+            reply_markup=build_pending_keyboard(),
+            parse_mode="Markdown"
+        )
+    except BadRequest:
+        # Refresh without changes - Telegram rejects identical edits
+        pass
+
+
+async def show_bulk_result(resolved: list, response: str):
+    """
+    Show a bulk resolution made through the API in each admin's pending list
+    message, edited in place like the bot's own bulk buttons do; an admin
+    without one (or whose message is gone) gets a new one, edited next time.
+    """
+    text = format_bulk_result(resolved, response) + "\n" + format_pending_summary()
+    reply_markup = build_pending_keyboard()
+
+    async def show(admin_id: int):
+        message_id = pending_messages.get(admin_id)
+        if message_id is not None:
+            edited = outbox.submit(
+                admin_id, "edit_message_text", priority=PRIORITY_MANUAL,
+                message_id=message_id, text=text, reply_markup=reply_markup, parse_mode="Markdown"
+            )
+            try:
+                if edited is not None:
+                    await edited
+                return
+            except BadRequest as e:
+                if "not modified" in str(e):
+                    return
+        sent = outbox.submit(
+            admin_id, "send_message", priority=PRIORITY_MANUAL,
+            text=text, reply_markup=reply_markup, parse_mode="Markdown"
+        )
+        if sent is not None:
+            pending_messages[admin_id] = (await sent).message_id
+
+    results = await asyncio.gather(*(show(admin_id) for admin_id in TELEGRAM_ADMIN_IDS), return_exceptions=True)
+    for error in results:
+        if isinstance(error, Exception):
+            print(f"❌ Error showing bulk resolution: {error}")
+
+
 async def send_manual_request_notification(service: str, request_id: str, request_data: dict):
     """Send notification to Telegram for manual handling"""
     if not TELEGRAM_CHAT_ID or not TELEGRAM_BOT_TOKEN:
@@ -480,13 +871,22 @@ def create_bot_application() -> Application:
     if not TELEGRAM_BOT_TOKEN:
         return None
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # One pooled keep-alive connection per outbox worker, plus headroom for handler replies
+    builder = Application.builder().token(TELEGRAM_BOT_TOKEN).connection_pool_size(TELEGRAM_SEND_CONCURRENCY + 4)
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(TELEGRAM_API_BASE_URL)
+    if is_webhook_mode():
+        # Updates arrive through the FastAPI route, no polling updater needed
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("status", status))
     application.add_handler(CommandHandler("status_detailed", status_detailed))
     application.add_handler(CommandHandler("logs", logs))
+    application.add_handler(CallbackQueryHandler(logs_callback, pattern="^logs_"))
+    application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("help", help_command))
 
     # Config conversation handler
@@ -516,19 +916,32 @@ def create_bot_application() -> Application:
     application.add_handler(CallbackQueryHandler(delay_callback, pattern="^delay_"))
     application.add_handler(CallbackQueryHandler(setdelay_callback, pattern="^setdelay_"))
 
-    # Manual response handler
+    # Manual response handlers
     application.add_handler(CallbackQueryHandler(handle_manual_response, pattern="^manual_"))
+    application.add_handler(CommandHandler("pending", pending_command))
+    application.add_handler(CallbackQueryHandler(bulk_callback, pattern="^bulk_"))
 
     return application
 
 
 # Global bot application
 bot_application: Optional[Application] = None
+bot_loop: Optional[asyncio.AbstractEventLoop] = None  # The loop the bot runs on (the control lane's, if enabled)
+webhook_secret: Optional[str] = None  # Secret registered with the webhook: TELEGRAM_WEBHOOK_SECRET or a generated one
+
+
+def is_webhook_mode() -> bool:
+    """Whether updates are delivered via webhook instead of long polling"""
+    return bool(TELEGRAM_WEBHOOK_URL)
+
+
+def get_webhook_url() -> str:
+    return TELEGRAM_WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
 
 
 async def start_bot():
-    """Start the bot"""
-    global bot_application
+    """Start the bot on the calling event loop"""
+    global bot_application, bot_loop, webhook_secret
 
     if not TELEGRAM_BOT_TOKEN:
         print("⚠️ TELEGRAM_BOT_TOKEN not set, bot disabled")
@@ -540,11 +953,26 @@ async def start_bot():
     print(f"🤖 Starting Telegram bot...")
     print(f"   Token: {TELEGRAM_BOT_TOKEN[:20]}...")
     print(f"   Admin IDs: {TELEGRAM_ADMIN_IDS}")
+    print(f"   Mode: {'webhook' if is_webhook_mode() else 'polling'}")
 
     bot_application = create_bot_application()
+    bot_loop = asyncio.get_running_loop()
     await bot_application.initialize()
     await bot_application.start()
-    await bot_application.updater.start_polling()
+    if is_webhook_mode():
+        # The webhook route is public and updates are trusted by sender id, so it is never left unsigned
+        webhook_secret = TELEGRAM_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        if not TELEGRAM_WEBHOOK_SECRET:
+            print("   TELEGRAM_WEBHOOK_SECRET not set, using a generated secret")
+        await bot_application.bot.set_webhook(
+            url=get_webhook_url(),
+            secret_token=webhook_secret,
+            allowed_updates=Update.ALL_TYPES
+        )
+        print(f"   Webhook: {get_webhook_url()}")
+    else:
+        await bot_application.updater.start_polling()
+    await outbox.start(bot_application.bot)
     print("✅ Telegram bot started successfully")
 
 
@@ -553,7 +981,9 @@ async def stop_bot():
     global bot_application
 
     if bot_application:
-        await bot_application.updater.stop()
+        await outbox.stop()
+        if bot_application.updater and bot_application.updater.running:
+            await bot_application.updater.stop()
         await bot_application.stop()
         await bot_application.shutdown()
 
@@ -561,3 +991,24 @@ async def stop_bot():
 def get_bot_application() -> Optional[Application]:
     """Get the current bot application instance"""
     return bot_application
+
+
+def verify_webhook_secret(token: Optional[str]) -> bool:
+    """Check the X-Telegram-Bot-Api-Secret-Token header against the secret the webhook was registered with"""
+    if not webhook_secret or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), webhook_secret.encode())
+
+
+async def process_webhook_update(data: dict) -> bool:
+    """Feed a webhook payload straight into the application, bypassing the update queue"""
+    if not bot_application:
+        return False
+
+    update = Update.de_json(data, bot_application.bot)
+    if asyncio.get_running_loop() is bot_loop:
+        await bot_application.process_update(update)
+    else:
+        # Received on the main port while the bot runs on the control lane
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(bot_application.process_update(update), bot_loop))
+    return True
@@ -0,0 +1,257 @@
+import os
+import heapq
+import asyncio
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from telegram.error import RetryAfter
+
+# Outbound delivery tuning
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # messages per second, whole bot
+TELEGRAM_PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))  # messages per second, one chat
+TELEGRAM_PER_CHAT_BURST = int(os.getenv("TELEGRAM_PER_CHAT_BURST", "3"))
+TELEGRAM_LOG_BACKLOG = int(os.getenv("TELEGRAM_LOG_BACKLOG", "500"))
+
+# Lower value is sent first
+PRIORITY_MANUAL = 0
+PRIORITY_LOG = 1
+
+MAX_RETRIES = 3
+
+
+class _TokenBucket:
+    """Token bucket that hands out send slots instead of blocking"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait before using it"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def try_take(self) -> float:
+        """Take one token if one is available now (0.0), else take nothing and return the wait for one"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate, self.paused_until - now)
+        if wait <= 0:
+            self.tokens -= 1
+        return wait
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class TelegramOutbox:
+    """
+    Concurrent, rate-aware sender for bot API calls.
+
+    Calls are queued by priority (manual prompts before informational logs) and
+    delivered by a pool of workers sharing the bot's pooled HTTP client, while
+    respecting Telegram's global and per-chat limits and RetryAfter responses.
+    A call whose chat has no token yet is set aside in that chat's deferred
+    heap, so a worker never sits on it while calls for other chats wait behind
+    it; one timer per chat hands the deferred calls back to the queue, in
+    order, as the chat's tokens come due.
+    The workers run on the loop the outbox was started on (the control lane's
+    when ADMIN_PORT is set); submit() may be called from any loop.
+    """
+
+    def __init__(self, concurrency: int = TELEGRAM_SEND_CONCURRENCY):
+        self.concurrency = concurrency
+        self._bot = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._deferred: Dict[Any, List[tuple]] = {}  # Per chat: calls waiting for its next token (a heap)
+        self._timers: Dict[Any, asyncio.TimerHandle] = {}  # Per chat with deferred calls: its release timer
+        self._released: Set[int] = set()  # Sequence numbers of released calls, whose chat token is taken
+        self._workers: list = []
+        self._seq = itertools.count()
+        self._global = _TokenBucket(TELEGRAM_GLOBAL_RATE, max(1, int(TELEGRAM_GLOBAL_RATE)))
+        self._chats: Dict[Any, _TokenBucket] = {}
+        self._queued_logs = 0
+        self._backlog_lock = threading.Lock()  # Counted by submitters and workers on different loops
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, bot):
+        if self.running:
+            return
+        self._bot = bot
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+
+        # Calls never sent: cancel their futures, so no caller waits for them
+        pending = [item for heap in self._deferred.values() for item in heap]
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+            self._queue.task_done()
+        for item in pending:
+            item[5].cancel()
+        self._deferred.clear()
+        self._released.clear()
+        with self._backlog_lock:
+            self._queued_logs = 0
+        self._workers = []
+        self._bot = None
+        self._loop = None
+
+    def submit(self, chat_id, method: str, priority: int = PRIORITY_LOG, **kwargs) -> Optional[asyncio.Future]:
+        """
+        Queue a bot API call, e.g. submit(admin_id, "send_message", text=...).
+
+        Returns a future (of the outbox's loop) with the call result, or None if
+        the outbox is not running or the informational backlog is full.
+        """
+        loop = self._loop
+        if not self.running or loop is None:
+            return None
+
+        if priority >= PRIORITY_LOG:
+            with self._backlog_lock:
+                if self._queued_logs >= TELEGRAM_LOG_BACKLOG:
+                    self.dropped += 1
+                    return None
+                self._queued_logs += 1
+
+        future = loop.create_future()
+        item = (priority, next(self._seq), chat_id, method, kwargs, future, 0)
+        try:
+            same_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            same_loop = False
+        if same_loop:
+            self._queue.put_nowait(item)
+        else:
+            loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        return future
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": (self._queue.qsize() if self._queue else 0) + sum(map(len, self._deferred.values())),
+            "queued_logs": self._queued_logs,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
+
+    def _chat_bucket(self, chat_id) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = _TokenBucket(TELEGRAM_PER_CHAT_RATE, TELEGRAM_PER_CHAT_BURST)
+        return bucket
+
+    def _defer(self, chat_id, item: tuple, delay: float):
+        """Set a call aside until its chat has a token; the chat's one timer is armed if it is not yet"""
+        heapq.heappush(self._deferred.setdefault(chat_id, []), item)
+        if chat_id not in self._timers:
+            self._timers[chat_id] = self._loop.call_later(delay, self._release, chat_id)
+
+    def _release(self, chat_id):
+        """Queue the chat's deferred calls, highest priority first, for as many tokens as it has"""
+        del self._timers[chat_id]
+        heap = self._deferred[chat_id]
+        bucket = self._chat_bucket(chat_id)
+        while heap:
+            wait = bucket.try_take()
+            if wait > 0:
+                self._timers[chat_id] = self._loop.call_later(wait, self._release, chat_id)
+                return
+            item = heapq.heappop(heap)
+            self._released.add(item[1])
+            self._queue.put_nowait(item)
+        del self._deferred[chat_id]
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            priority, seq, chat_id, method, kwargs, future, attempt = item
+            try:
+                bucket = self._chat_bucket(chat_id)
+                if seq in self._released:
+                    self._released.discard(seq)
+                elif chat_id in self._deferred:
+                    # Behind the chat's calls already waiting, which its timer releases in order
+                    self._defer(chat_id, item, 0)
+                    continue
+                else:
+                    wait = bucket.try_take()
+                    if wait > 0:
+                        # Set aside until the chat has a token, leaving this worker free for other chats
+                        self._defer(chat_id, item, wait)
+                        continue
+                # The global limit holds back every call alike, so waiting for it here delays no one else
+                wait = self._global.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+                self.in_flight += 1
+                try:
+                    result = await getattr(self._bot, method)(chat_id=chat_id, **kwargs)
+                except RetryAfter as e:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                    # A flood wait holds back the whole bot, not just this chat
+                    bucket.pause(retry_after)
+                    self._global.pause(retry_after)
+                    if attempt < MAX_RETRIES:
+                        print(f"⏳ Telegram rate limit for {chat_id}, retrying in {retry_after}s")
+                        # Same priority and sequence number keeps the original ordering
+                        self._defer(chat_id, (priority, seq, chat_id, method, kwargs, future, attempt + 1), retry_after)
+                        continue
+                    raise
+                finally:
+                    self.in_flight -= 1
+
+                self.sent += 1
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Error calling {method} for {chat_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+                    # Callers may fire-and-forget; mark the exception as retrieved
+                    future.exception()
+            finally:
+                if priority >= PRIORITY_LOG and (future.done() or future.cancelled()):
+                    with self._backlog_lock:
+                        self._queued_logs -= 1
+                self._queue.task_done()
+
+
+# Global outbox instance
+outbox = TelegramOutbox()
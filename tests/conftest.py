@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from urllib.parse import parse_qsl
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeTelegram:
+    """Local stand-in for the Bot API: answers the methods the bot uses and records every call"""
+
+    def __init__(self):
+        self.calls = []
+        self.app = FastAPI()
+        self.app.add_api_route("/bot{token}/{method}", self.handle, methods=["POST"])
+        self.port = None
+        self._server = None
+
+    async def handle(self, token: str, method: str, request: Request):
+        body = (await request.body()).decode()
+        if "json" in request.headers.get("content-type", ""):
+            data = json.loads(body)
+        else:
+            data = dict(parse_qsl(body))
+        self.calls.append((method, data))
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+        if method == "sendMessage":
+            return {"ok": True, "result": {
+                "message_id": len(self.calls), "date": int(time.time()),
+                "chat": {"id": int(data["chat_id"]), "type": "private"}, "text": data.get("text", "")
+            }}
+        return {"ok": True, "result": True}
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+    def start(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        threading.Thread(target=self._server.run, daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        self._server.should_exit = True
+
+
+@pytest.fixture
+def fake_telegram():
+    server = FakeTelegram()
+    server.start()
+    yield server
+    server.stop()
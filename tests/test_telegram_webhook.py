@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import telegram_bot
+
+ADMIN_ID = 42
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def client(fake_telegram, monkeypatch):
+    """The service in webhook mode, with the bot talking to the fake Bot API"""
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_BOT_TOKEN", "123456:TEST")
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_ADMIN_IDS", [ADMIN_ID])
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_URL", "https://mocks.example.com")
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE_URL", f"http://127.0.0.1:{fake_telegram.port}/bot")
+    with TestClient(main.app) as client:
+        yield client
+
+
+def command_update(text: str) -> dict:
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": ADMIN_ID, "type": "private"},
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        }
+    }
+
+
+def test_webhook_registered_at_startup(client, fake_telegram):
+    assert "setWebhook" in fake_telegram.methods()
+    assert "getUpdates" not in fake_telegram.methods()
+    _, data = next(call for call in fake_telegram.calls if call[0] == "setWebhook")
+    assert data["url"] == "https://mocks.example.com/telegram/webhook"
+    assert data["secret_token"] == SECRET
+
+
+def test_webhook_update_reaches_handler(client, fake_telegram):
+    response = client.post(
+        telegram_bot.WEBHOOK_PATH,
+        json=command_update("/start"),
+        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    )
+    assert response.status_code == 200
+    replies = [data for method, data in fake_telegram.calls if method == "sendMessage"]
+    assert replies and int(replies[-1]["chat_id"]) == ADMIN_ID
+    assert "Unified Mocks Service" in replies[-1]["text"]
+
+
+def test_webhook_rejects_missing_secret(client, fake_telegram):
+    response = client.post(telegram_bot.WEBHOOK_PATH, json=command_update("/start"))
+    assert response.status_code == 403
+    assert "sendMessage" not in fake_telegram.methods()
+
+
+def test_webhook_secret_generated_when_unset(fake_telegram, monkeypatch):
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_BOT_TOKEN", "123456:TEST")
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_ADMIN_IDS", [ADMIN_ID])
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_URL", "https://mocks.example.com")
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_SECRET", None)
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE_URL", f"http://127.0.0.1:{fake_telegram.port}/bot")
+    with TestClient(main.app) as client:
+        _, data = next(call for call in fake_telegram.calls if call[0] == "setWebhook")
+        assert data["secret_token"]
+
+        response = client.post(telegram_bot.WEBHOOK_PATH, json=command_update("/start"))
+        assert response.status_code == 403
+        response = client.post(
+            telegram_bot.WEBHOOK_PATH,
+            json=command_update("/start"),
+            headers={"X-Telegram-Bot-Api-Secret-Token": data["secret_token"]}
+        )
+        assert response.status_code == 200
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import random
+import asyncio
+import contextvars
+import httpx
+from typing import Any, Dict, List, Optional
+
+# Fraction of requests without a sampled parent that are traced (0 disables tracing)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Finished spans are appended to this file as OTLP/JSON, one ExportTraceServiceRequest per line
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+# Optional OTLP/HTTP collector endpoint (e.g. http://localhost:4318/v1/traces) instead of the file
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", "10000"))
+
+SERVICE_NAME = "unified-mocks"
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_rng = random.Random()
+
+
+class Span:
+    """One timed stage of a traced request; use as a context manager"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "_token")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: int = KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{_rng.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        if not self.end_ns:
+            self.end_ns = time.time_ns()
+            exporter.add(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+        self.end()
+
+
+class _NoopSpan:
+    """Returned for requests that are not sampled, so stages cost one context lookup"""
+    __slots__ = ()
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None if absent or invalid"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == "ff":
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes):
+    """
+    Root span of a request, continuing the caller's trace when it sent a traceparent.
+
+    Sampling follows the caller's sampled flag; requests without one are sampled
+    at TRACE_SAMPLE_RATE. Unsampled requests get NOOP_SPAN.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        if TRACE_SAMPLE_RATE <= 0:
+            return NOOP_SPAN
+        trace_id, parent_id = None, None
+        sampled = _rng.random() < TRACE_SAMPLE_RATE
+
+    if not sampled:
+        return NOOP_SPAN
+    return Span(trace_id or f"{_rng.getrandbits(128):032x}", parent_id, name, KIND_SERVER, attributes)
+
+
+def span(name: str, **attributes):
+    """Child span of the current span; NOOP_SPAN when the request is not traced"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace_id, parent.span_id, name, KIND_INTERNAL, attributes)
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """ExportTraceServiceRequest in the OTLP/JSON encoding"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "mocks"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": s.kind,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [_attribute(k, v) for k, v in s.attributes.items()]
+                    }
+                    for s in spans
+                ]
+            }]
+        }]
+    }
+
+
+def _append_line(path: str, payload: dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class BatchExporter:
+    """
+    Collects finished spans and exports them in batches from a background task,
+    so request handling never waits on I/O. Spans beyond TRACE_MAX_QUEUE are
+    dropped rather than growing memory.
+    """
+
+    def __init__(self):
+        self._spans: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+        self._client = None
+        self.exported = 0
+        self.dropped = 0
+
+    def add(self, s: Span):
+        if len(self._spans) >= TRACE_MAX_QUEUE:
+            self.dropped += 1
+            return
+        self._spans.append(s)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TRACE_EXPORT_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        while self._spans:
+            batch = self._spans[:TRACE_BATCH_SIZE]
+            del self._spans[:TRACE_BATCH_SIZE]
+            try:
+                await self._export(to_otlp(batch))
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"❌ Error exporting {len(batch)} spans: {e}")
+
+    async def _export(self, payload: dict):
+        if TRACE_EXPORT_URL:
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=10)
+            response = await self._client.post(TRACE_EXPORT_URL, json=payload)
+            response.raise_for_status()
+        else:
+            # The batch is built for this call only, so encoding and the write can leave the event loop
+            await asyncio.to_thread(_append_line, TRACE_EXPORT_FILE, payload)
+
+
+# Global exporter instance
+exporter = BatchExporter()
@@ -0,0 +1,165 @@
+import os
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from models import TransactionState
+
+TRANSACTION_TTL_SECONDS = int(os.getenv("TRANSACTION_TTL_SECONDS", "86400"))
+TRANSACTION_MAX = int(os.getenv("TRANSACTION_MAX", "100000"))
+
+
+class TransactionError(Exception):
+    """Requested state transition is not allowed"""
+
+
+class Transaction:
+    __slots__ = (
+        "service", "payment_id", "order_id", "rrn", "amount", "refunded_amount",
+        "state", "created_at", "updated_at", "response"
+    )
+
+    def __init__(self, service: str, payment_id: int, order_id: int, amount: int,
+                 state: TransactionState, response: Optional[dict], rrn: Optional[str] = None):
+        self.service = service
+        self.payment_id = payment_id
+        self.order_id = order_id
+        self.rrn = rrn
+        self.amount = amount
+        self.refunded_amount = 0
+        self.state = state
+        self.created_at = self.updated_at = time.time()
+        self.response = response
+
+    def to_dict(self) -> dict:
+        return {
+            "service": self.service,
+            "payment_id": self.payment_id,
+            "order_id": self.order_id,
+            "rrn": self.rrn,
+            "amount": self.amount,
+            "refunded_amount": self.refunded_amount,
+            "state": self.state.value,
+            "created_at": datetime.fromtimestamp(self.created_at, timezone.utc).isoformat(),
+            "updated_at": datetime.fromtimestamp(self.updated_at, timezone.utc).isoformat()
+        }
+
+
+class TransactionStore:
+    """
+    Issued payments indexed by payment_id, order_id and RRN, per service.
+
+    Entries are kept in creation order, so TTL and size eviction only ever
+    pop from the front; every lookup and transition is a dict access.
+    """
+
+    def __init__(self, ttl_seconds: int = TRANSACTION_TTL_SECONDS, max_size: int = TRANSACTION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._by_id: "OrderedDict[Tuple[str, int], Transaction]" = OrderedDict()
+        self._by_order: Dict[Tuple[str, int], List[int]] = {}
+        self._by_rrn: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, txn: Transaction):
+        key = (txn.service, txn.payment_id)
+        self._by_id[key] = txn
+        self._by_order.setdefault((txn.service, txn.order_id), []).append(txn.payment_id)
+        if txn.rrn:
+            self._by_rrn[(txn.service, txn.rrn)] = txn.payment_id
+        self._evict()
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._by_id:
+            key, oldest = next(iter(self._by_id.items()))
+            if len(self._by_id) <= self.max_size and oldest.created_at >= cutoff:
+                break
+            self._remove(key, oldest)
+
+    def _remove(self, key: Tuple[str, int], txn: Transaction):
+        del self._by_id[key]
+        order_key = (txn.service, txn.order_id)
+        payment_ids = self._by_order.get(order_key)
+        if payment_ids:
+            payment_ids.remove(txn.payment_id)
+            if not payment_ids:
+                del self._by_order[order_key]
+        # Only if the RRN still maps to this transaction, not to a newer one that reused it
+        rrn_key = (txn.service, txn.rrn)
+        if txn.rrn and self._by_rrn.get(rrn_key) == txn.payment_id:
+            del self._by_rrn[rrn_key]
+
+    def dump_state(self) -> List[list]:
+        """Transactions for a state snapshot, oldest first, one list of fields each"""
+        return [
+            [
+                txn.service, txn.payment_id, txn.order_id, txn.rrn, txn.amount, txn.refunded_amount,
+                txn.state.value, txn.created_at, txn.updated_at, txn.response
+            ]
+            for txn in self._by_id.values()
+        ]
+
+    def load_state(self, state: List[list]):
+        self._by_id.clear()
+        self._by_order.clear()
+        self._by_rrn.clear()
+        for service, payment_id, order_id, rrn, amount, refunded, txn_state, created, updated, response in state:
+            txn = Transaction(service, payment_id, order_id, amount, TransactionState(txn_state), response, rrn)
+            txn.refunded_amount = refunded
+            txn.created_at = created
+            txn.updated_at = updated
+            self.add(txn)
+
+    def get(self, service: str, payment_id: int) -> Optional[Transaction]:
+        txn = self._by_id.get((service, payment_id))
+        if txn is None or txn.created_at < time.time() - self.ttl_seconds:
+            return None
+        return txn
+
+    def find_by_order(self, service: str, order_id: int) -> List[Transaction]:
+        return [t for t in (self.get(service, pid) for pid in self._by_order.get((service, order_id), [])) if t]
+
+    def find_by_rrn(self, service: str, rrn: str) -> Optional[Transaction]:
+        payment_id = self._by_rrn.get((service, rrn))
+        return self.get(service, payment_id) if payment_id is not None else None
+
+    def complete(self, txn: Transaction, state: TransactionState, response: Optional[dict], rrn: Optional[str] = None) -> bool:
+        """Finish a PENDING transaction; False if it was cancelled or evicted meanwhile"""
+        if txn.state != TransactionState.PENDING or self._by_id.get((txn.service, txn.payment_id)) is not txn:
+            return False
+        txn.state = state
+        txn.response = response
+        txn.updated_at = time.time()
+        if rrn:
+            if txn.rrn and txn.rrn != rrn and self._by_rrn.get((txn.service, txn.rrn)) == txn.payment_id:
+                del self._by_rrn[(txn.service, txn.rrn)]
+            txn.rrn = rrn
+            self._by_rrn[(txn.service, rrn)] = txn.payment_id
+        return True
+
+    def refund(self, txn: Transaction, amount: Optional[int] = None) -> Transaction:
+        """Refund all or part of an authorized payment"""
+        if txn.state not in (TransactionState.AUTHORIZED, TransactionState.PARTIALLY_REFUNDED):
+            raise TransactionError(f"Cannot refund a {txn.state.value} payment")
+
+        remaining = txn.amount - txn.refunded_amount
+        amount = remaining if amount is None else amount
+        if amount <= 0 or amount > remaining:
+            raise TransactionError(f"Refund amount must be between 1 and {remaining}")
+
+        txn.refunded_amount += amount
+        txn.state = TransactionState.REFUNDED if txn.refunded_amount == txn.amount else TransactionState.PARTIALLY_REFUNDED
+        txn.updated_at = time.time()
+        return txn
+
+    def cancel(self, txn: Transaction) -> Transaction:
+        """Cancel (reverse) a pending or authorized payment that has no refunds"""
+        if txn.state not in (TransactionState.PENDING, TransactionState.AUTHORIZED):
+            raise TransactionError(f"Cannot cancel a {txn.state.value} payment")
+
+        txn.state = TransactionState.CANCELLED
+        txn.updated_at = time.time()
+        return txn